@@ -0,0 +1,77 @@
+# benchmarks/bench_async_llm.py
+#
+# Exercises AsyncLLMClient against FakeBackend: latency percentiles with and without
+# hedging under a slow tail, behaviour under failures, and how long the event loop
+# is blocked while requests are in flight.
+#
+# Usage: python benchmarks/bench_async_llm.py [--requests 200] [--slow-rate 0.1] [--failure-rate 0.1]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from companion_ai.async_llm import AsyncLLMClient, FakeBackend
+
+async def measure_loop_stall(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Returns the worst lateness of a periodic tick, i.e. the longest the loop was blocked."""
+    worst = 0.0
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - expected)
+    return worst
+
+async def run(label, client, requests, hedge, concurrency):
+    latencies, errors = [], 0
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(measure_loop_stall(stop))
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with limiter:
+            start = time.perf_counter()
+            try:
+                await client.generate("prompt", hedge=hedge)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    stop.set()
+    stall = await monitor
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (0, 0, 0)
+    print(f"{label:<28} p50 {p50:7.1f}ms  p95 {p95:7.1f}ms  p99 {p99:7.1f}ms  errors {errors:3d}  "
+          f"max loop stall {stall * 1000:5.1f}ms  {client.stats}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the async LLM client against a fake backend.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4, help="Caller-side parallelism")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    def backend(failures=0.0):
+        return FakeBackend(latency=args.latency, jitter=args.latency / 2, slow_rate=args.slow_rate,
+                           slow_latency=args.slow_latency, failure_rate=failures, seed=0)
+
+    common = dict(max_concurrency=8, timeout=5.0, backoff_base=0.02)
+    await run("slow tail, no hedging", AsyncLLMClient(backend(), **common), args.requests, False, args.concurrency)
+    await run("slow tail, hedged", AsyncLLMClient(backend(), hedge_after=args.latency * 3, **common),
+              args.requests, True, args.concurrency)
+    await run("failures, no retries", AsyncLLMClient(backend(args.failure_rate), retries=0, **common),
+              args.requests, False, args.concurrency)
+    await run("failures, 2 retries", AsyncLLMClient(backend(args.failure_rate), retries=2, **common),
+              args.requests, False, args.concurrency)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+# benchmarks/bench_compaction.py
+#
+# Memory table growth: latency of the per-turn "latest summaries" query as the
+# summaries table grows to millions of rows, on the original schema (no index on
+# timestamp) versus the migrated one, and then what one compaction pass does to
+# the migrated database (rows, file size, time taken).
+#
+# Rows are bulk-inserted with timestamps spread evenly over --days days ending now,
+# oldest first, so each checkpoint holds the oldest N rows.
+#
+# Usage: python benchmarks/bench_compaction.py [--rows 1000000] [--days 730]
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai import compaction, memory
+from companion_ai.memory import MemoryStore
+
+
+def query_latency(store, repeats=200):
+    """Median seconds for get_latest_summary(3) with the context cache off."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        store.get_latest_summary(3)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def fill(store, timestamps):
+    conn = store.connection()
+    conn.executemany(
+        "INSERT INTO conversation_summaries (timestamp, summary_text) VALUES (?, ?)",
+        ((ts, f"User and AI talked about topic {i % 97}. The user felt {('good', 'tired', 'busy')[i % 3]} today.")
+         for i, ts in enumerate(timestamps)))
+    conn.commit()
+
+
+def file_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query latency at scale and the effect of compaction.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=730, help="history the rows are spread over")
+    args = parser.parse_args()
+
+    checkpoints = [n for n in (10_000, 100_000, 1_000_000, 3_000_000, 10_000_000) if n < args.rows] + [args.rows]
+    now = datetime.now()
+    step = timedelta(days=args.days) / args.rows
+    first = now - timedelta(days=args.days)
+    timestamps = lambda lo, hi: ((first + step * i).isoformat(" ") for i in range(lo, hi))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original = MemoryStore(os.path.join(tmp, "original.db"), cache_enabled=False)
+        original.connection().executescript(memory.SCHEMA_MIGRATIONS[0])  # The schema before migrations
+        migrated_path = os.path.join(tmp, "migrated.db")
+        migrated = MemoryStore(migrated_path, cache_enabled=False)
+        migrated.init_db()
+
+        print(f"{'rows':>10} {'original schema':>16} {'migrated schema':>16}")
+        filled = 0
+        for n in checkpoints:
+            fill(original, timestamps(filled, n))
+            fill(migrated, timestamps(filled, n))
+            filled = n
+            repeats = 200 if n <= 100_000 else 20
+            print(f"{n:>10,} {query_latency(original, repeats) * 1000:14.3f}ms "
+                  f"{query_latency(migrated, repeats) * 1000:14.3f}ms")
+        original.close()
+
+        migrated.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_before = file_size(migrated_path)
+        compactor = compaction.Compactor(migrated, max_periods=None)
+        result = compactor.run_once(now)
+        migrated.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        levels = {row["level"]: row["n"] for row in migrated._read(
+            "SELECT level, count(*) AS n FROM conversation_summaries GROUP BY level")}
+
+        print(f"\nCompaction pass (keep turns {compactor.policy.turn_days} days, "
+              f"daily digests {compactor.policy.daily_days} days):")
+        print(f"  {result['rows_compacted']:,} rows rolled into {result['digests_written']:,} digests "
+              f"in {result['last_pass_seconds']:.1f}s")
+        print("  rows left: " + ", ".join(f"{count:,} {level}" for level, count in sorted(levels.items())))
+        print(f"  file size: {size_before / 1024 / 1024:.1f} MB -> {file_size(migrated_path) / 1024 / 1024:.1f} MB "
+              f"({result['pages_freed']:,} pages freed by incremental vacuum)")
+        print(f"  latest-summaries query after compaction: {query_latency(migrated) * 1000:.3f}ms")
+        migrated.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_consolidation.py
+#
+# Compares the three sequential memory calls (summary, facts, insight) with the single
+# consolidate_memory() call, against a local stub model with configurable latency.
+# No API key or network is needed.
+#
+# Usage: python benchmarks/bench_consolidation.py [--turns 20] [--latency 0.05] [--malformed 0.1]
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai import llm_interface
+
+
+class _StubUsage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+class _StubResponse:
+    def __init__(self, text, prompt):
+        self.text = text
+        self.usage_metadata = _StubUsage(len(prompt) // 4, len(text) // 4)
+
+class StubModel:
+    """Stands in for text_model: answers each prompt type with canned output after a delay."""
+
+    def __init__(self, latency, malformed_rate=0.0, seed=0):
+        self.latency = latency
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        if "exactly these keys" in prompt:
+            if self._rng.random() < self.malformed_rate:
+                return _StubResponse('{"summary": "User and AI talked', prompt)  # Truncated JSON
+            text = json.dumps({
+                "summary": "User and AI discussed the user's weekend hiking plans.",
+                "facts": {"hobby": "hiking"},
+                "insight": "The user is looking forward to time outdoors.",
+            })
+        elif "data extraction tool" in prompt:
+            text = json.dumps({"hobby": "hiking"})
+        elif "summarization tool" in prompt:
+            text = "User and AI discussed the user's weekend hiking plans."
+        else:
+            text = "The user is looking forward to time outdoors."
+        return _StubResponse(text, prompt)
+
+
+CONTEXT = {
+    "profile": {"user_name": "Alex", "likes": "dogs, coding"},
+    "summaries": [{"summary_text": "User and AI discussed a Python project."}],
+    "insights": [{"insight_text": "Alex enjoys building things."}],
+}
+USER = "I'm going hiking this weekend, I love getting out on the trails."
+AI = "That sounds wonderful! Which trail are you thinking of?"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-call memory consolidation.")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub model latency per call (s)")
+    parser.add_argument("--malformed", type=float, default=0.1, help="Fraction of malformed consolidated replies")
+    args = parser.parse_args()
+
+    stub = StubModel(args.latency, args.malformed)
+    llm_interface.set_text_model(stub)
+
+    start = time.perf_counter()
+    for _ in range(args.turns):
+        llm_interface.generate_summary(USER, AI)
+        llm_interface.extract_profile_facts(USER, AI)
+        llm_interface.generate_insight(USER, AI, CONTEXT)
+    sequential_seconds = (time.perf_counter() - start) / args.turns
+    sequential_calls = stub.calls / args.turns
+
+    stub.calls = 0
+    start = time.perf_counter()
+    for _ in range(args.turns):
+        llm_interface.consolidate_memory(USER, AI, CONTEXT)
+    consolidated_seconds = (time.perf_counter() - start) / args.turns
+    consolidated_calls = stub.calls / args.turns
+
+    report = llm_interface.consolidation_report()
+    print(f"Sequential:   {sequential_calls:.2f} calls/turn, {sequential_seconds * 1000:7.1f} ms/turn")
+    print(f"Consolidated: {consolidated_calls:.2f} calls/turn, {consolidated_seconds * 1000:7.1f} ms/turn "
+          f"(fallback rate {report['fallback_rate']:.0%})")
+    print(f"Measured wall time saved: {(sequential_seconds - consolidated_seconds) * 1000:.1f} ms/turn")
+    print(f"Reported by consolidation_report(): {report['prompt_tokens_saved_per_turn']:.0f} prompt tokens/turn, "
+          f"{report['seconds_saved_per_turn'] * 1000:.1f} ms/turn saved")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_dialogue.py
+#
+# Prompt cost of conversation history as a session grows. Compares sending the
+# whole transcript every turn with the rolling history in companion_ai/dialogue.py
+# (recent turns verbatim + a running summary, bounded by HISTORY_TOKEN_BUDGET).
+#
+# The summary fold is faked with a short sleep and the extractive fallback, so no
+# API key is needed. Reports prompt tokens and build time at several session
+# lengths, fold calls made, and checks that the previous reply is in every prompt
+# and that a restarted DialogueHistory sees the same history.
+#
+# Usage: python benchmarks/bench_dialogue.py [--turns 1000]
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai.dialogue import DialogueHistory, fallback_fold
+from companion_ai.memory import MemoryStore
+from companion_ai.prompt_builder import PromptBuilder
+
+TOPICS = ["the parser refactor", "a hiking trip", "sleep schedules", "the SDK setup", "a job interview",
+          "learning Rust", "their sister's wedding", "a flaky test", "running a 10k", "the garden"]
+
+
+def make_turn(rng, i):
+    topic = rng.choice(TOPICS)
+    user = f"Turn {i}: I keep thinking about {topic}. " + "It has been on my mind all week. " * rng.randint(0, 3)
+    ai = (f"That makes sense, {topic} is a lot to carry. What part of it feels most pressing right now? "
+          + "We can take it one step at a time. " * rng.randint(0, 4))
+    return user, ai
+
+
+async def fake_fold(summary, turns, max_tokens):
+    await asyncio.sleep(0.005)
+    return fallback_fold(summary, turns, max_tokens)
+
+
+async def main_async(args):
+    rng = random.Random(0)
+    builder = PromptBuilder(static_prefix="")
+    checkpoints = {n for n in (1, 10, 50, 100, 500, 1000, 5000) if n <= args.turns} | {args.turns}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "dialogue.db"), cache_enabled=False)
+        store.init_db()
+        history = DialogueHistory(store, fold_fn=fake_fold).load()
+        transcript = []
+        previous_reply_missing = 0
+
+        print(f"{'turn':>6} {'full transcript':>16} {'rolling history':>16} {'build (rolling)':>16}")
+        for i in range(1, args.turns + 1):
+            user, ai = make_turn(rng, i)
+            full = "".join(f"User: {u}\nAI: {a}\n" for u, a in transcript)
+            start = time.perf_counter()
+            prompt = builder.build(user, {"dialogue": history.context()})
+            build_seconds = time.perf_counter() - start
+            if transcript and transcript[-1][1] not in prompt["content"]:
+                previous_reply_missing += 1
+            if i in checkpoints:
+                print(f"{i:>6} {builder.count_tokens(full):>14,}tk {prompt['section_tokens']['history']:>14,}tk "
+                      f"{build_seconds * 1e6:>13.0f}us")
+            transcript.append((user, ai))
+            await history.add(user, ai)
+            await asyncio.sleep(0)  # Let the background fold run, as the voice loop would between turns
+        await history.stop()
+
+        print(f"\n{history.stats['folds']} fold calls for {history.stats['turns_folded']} turns folded "
+              f"({history.stats['turns']} turns), {len(history.turns)} turns kept verbatim; "
+              f"previous reply missing from {previous_reply_missing} prompts")
+
+        before = history.context()
+        store.close()
+        reopened = DialogueHistory(MemoryStore(store.db_path, cache_enabled=False), fold_fn=fake_fold).load()
+        rows = reopened.store._read("SELECT count(*) AS n FROM dialogue_turns")[0]["n"]
+        same = reopened.context() == before
+        print(f"After restart: {'same history' if same else 'HISTORY DIFFERS'}, "
+              f"{rows} turn rows in the database")
+        reopened.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt cost of full-transcript versus rolling dialogue history.")
+    parser.add_argument("--turns", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_ingest.py
+#
+# Throughput and peak memory of the bulk importer (companion_ai/ingest.py) as the
+# corpus grows, plus an interrupted-and-resumed run. Synthetic .jsonl transcripts
+# are imported with the fake LLM (no API key), each run in its own process so its
+# peak RSS can be read from the importer's final report.
+#
+# Peak memory should stay flat while the corpus grows; the resume check stops an
+# import part way with SIGINT, runs it again, and checks every chunk was written
+# exactly once.
+#
+# Usage: python benchmarks/bench_ingest.py [--sizes 2000 20000 100000] [--files 50] [--fake-latency 0.05]
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from companion_ai.ingest import INGEST_CHUNK_TURNS
+
+TOPICS = ["the parser refactor", "a hiking trip", "sleep schedules", "the SDK setup", "a job interview",
+          "learning Rust", "their sister's wedding", "a flaky test", "running a 10k", "the garden"]
+_DONE = re.compile(r"Done: .*?([\d,]+) rows in .*?\(([\d.]+) rows/s\).*peak RSS (\d+) MB")
+
+
+def make_corpus(directory: str, turns: int, files: int, seed: int = 0) -> int:
+    """Writes `turns` turns spread over `files` .jsonl files. Returns the number of chunks they make."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    chunks = 0
+    for f in range(files):
+        n = turns // files + (f < turns % files)
+        chunks += math.ceil(n / INGEST_CHUNK_TURNS)
+        with open(os.path.join(directory, f"chat-{f:05d}.jsonl"), "w") as out:
+            for i in range(n):
+                topic = rng.choice(TOPICS)
+                out.write(json.dumps({
+                    "user": f"I keep thinking about {topic}. " + "It has been on my mind all week. " * rng.randint(0, 3),
+                    "ai": f"That makes sense, {topic} is a lot to carry. What part feels most pressing?",
+                    "timestamp": f"2025-{1 + f % 12:02d}-{1 + i % 28:02d}T20:00:00",
+                }) + "\n")
+    return chunks
+
+
+def ingest_command(corpus: str, db: str, args) -> list[str]:
+    return [sys.executable, "-m", "companion_ai.ingest", corpus, "--db", db, "--llm", "fake",
+            "--fake-latency", str(args.fake_latency), "--concurrency", str(args.concurrency)]
+
+
+def run_ingest(corpus: str, db: str, args, interrupt_after: float | None = None) -> dict | None:
+    process = subprocess.Popen(ingest_command(corpus, db, args), cwd=ROOT, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True)
+    if interrupt_after is not None:
+        time.sleep(interrupt_after)
+        process.send_signal(signal.SIGINT)
+    output, _ = process.communicate()
+    match = _DONE.search(output)
+    if match is None:
+        return None
+    return {"rows": int(match.group(1).replace(",", "")), "rows_per_second": float(match.group(2)),
+            "peak_mb": int(match.group(3))}
+
+
+def count_summaries(db: str) -> int:
+    """Every chunk gets exactly one summary from the fake LLM."""
+    with sqlite3.connect(db) as conn:
+        return conn.execute("SELECT count(*) FROM conversation_summaries").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk ingestion throughput, peak memory and resume.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 20000, 100000], help="corpus sizes (turns)")
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32, help="extraction calls in flight")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="fake LLM latency (s)")
+    parser.add_argument("--resume-turns", type=int, default=20000)
+    parser.add_argument("--interrupt-after", type=float, default=3.0, help="seconds before stopping the first run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'turns':>8} {'chunks':>8} {'rows':>8} {'rows/s':>9} {'peak RSS':>9}")
+        for size in args.sizes:
+            corpus = os.path.join(tmp, f"corpus-{size}")
+            chunks = make_corpus(corpus, size, args.files)
+            result = run_ingest(corpus, os.path.join(tmp, f"{size}.db"), args)
+            if result is None:
+                print(f"{size:>8,} import failed")
+                continue
+            print(f"{size:>8,} {chunks:>8,} {result['rows']:>8,} {result['rows_per_second']:>9,.0f} "
+                  f"{result['peak_mb']:>6} MB")
+
+        corpus = os.path.join(tmp, "corpus-resume")
+        chunks = make_corpus(corpus, args.resume_turns, args.files, seed=1)
+        db = os.path.join(tmp, "resume.db")
+        first = run_ingest(corpus, db, args, interrupt_after=args.interrupt_after)
+        written = count_summaries(db)
+        second = run_ingest(corpus, db, args)
+        total = count_summaries(db)
+        print(f"\nResume: first run stopped after {args.interrupt_after:.0f}s with {written:,}/{chunks:,} chunks "
+              f"committed{'' if first else ' (no report)'}; second run added {second['rows'] if second else 0:,} rows")
+        status = "OK" if total == chunks else "MISMATCH"
+        print(f"{status}: {total:,} summaries for {chunks:,} chunks")
+
+
+if __name__ == "__main__":
+    main()
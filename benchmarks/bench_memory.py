@@ -0,0 +1,141 @@
+# benchmarks/bench_memory.py
+#
+# Micro-benchmark for the memory layer: the old "connect, run one statement, commit,
+# close" pattern versus the persistent WAL-mode MemoryStore.
+#
+# Usage: python benchmarks/bench_memory.py [--turns 500]
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai.memory import MemoryStore
+
+
+# --- Baseline: a new connection per operation (the pre-MemoryStore behaviour) ---
+
+class ConnectPerCallStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def upsert_profile_fact(self, key, value):
+        conn = self._conn()
+        conn.execute('''
+            INSERT INTO user_profile (key, value, last_updated) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, last_updated = excluded.last_updated;
+        ''', (key, value, datetime.now()))
+        conn.commit(); conn.close()
+
+    def add_summary(self, text):
+        conn = self._conn()
+        conn.execute("INSERT INTO conversation_summaries (timestamp, summary_text) VALUES (?, ?)", (datetime.now(), text))
+        conn.commit(); conn.close()
+
+    def add_insight(self, text):
+        conn = self._conn()
+        conn.execute("INSERT INTO ai_insights (timestamp, insight_text) VALUES (?, ?)", (datetime.now(), text))
+        conn.commit(); conn.close()
+
+    def get_all_profile_facts(self):
+        conn = self._conn()
+        rows = conn.execute("SELECT key, value FROM user_profile ORDER BY last_updated DESC").fetchall()
+        conn.close()
+        return {row['key']: row['value'] for row in rows}
+
+    def get_latest_summary(self, n=1):
+        conn = self._conn()
+        rows = conn.execute("SELECT timestamp, summary_text FROM conversation_summaries ORDER BY timestamp DESC LIMIT ?", (n,)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def get_latest_insights(self, n=1):
+        conn = self._conn()
+        rows = conn.execute("SELECT timestamp, insight_text FROM ai_insights ORDER BY timestamp DESC LIMIT ?", (n,)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+
+# --- Workload: one simulated conversation turn ---
+# 3 reads to build the memory context, then a summary, an insight and two facts.
+OPS_PER_TURN = 7
+
+def run_turn(store, i, batched=False):
+    store.get_all_profile_facts()
+    store.get_latest_summary()
+    store.get_latest_insights()
+
+    def writes():
+        store.add_summary(f"User and AI talked about topic number {i}.")
+        store.upsert_profile_fact("favourite_topic", f"topic {i}")
+        store.upsert_profile_fact(f"fact_{i % 20}", f"value {i}")
+        store.add_insight(f"User seems curious about topic {i}.")
+
+    if batched:
+        with store.transaction():
+            writes()
+    else:
+        writes()
+
+def bench(label, store, turns, batched=False):
+    start = time.perf_counter()
+    for i in range(turns):
+        run_turn(store, i, batched=batched)
+    elapsed = time.perf_counter() - start
+    ops_per_sec = turns * OPS_PER_TURN / elapsed
+    print(f"{label:<36} {elapsed * 1000 / turns:8.3f} ms/turn   {ops_per_sec:10.0f} ops/sec")
+    return ops_per_sec
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the companion memory layer.")
+    parser.add_argument("--turns", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Each variant gets its own file so the WAL setting does not leak into the baseline.
+        baseline_path = os.path.join(tmp, "baseline.db")
+        setup = MemoryStore(baseline_path)
+        setup.init_db()
+        setup.connection().execute("PRAGMA journal_mode = DELETE")
+        setup.close()
+
+        store_path = os.path.join(tmp, "store.db")
+        store = MemoryStore(store_path)
+        store.init_db()
+
+        batched_path = os.path.join(tmp, "batched.db")
+        batched_store = MemoryStore(batched_path)
+        batched_store.init_db()
+
+        print(f"{args.turns} turns x {OPS_PER_TURN} ops\n")
+        before = bench("connect-per-call (before)", ConnectPerCallStore(baseline_path), args.turns)
+        after = bench("MemoryStore, WAL", store, args.turns)
+        after_batched = bench("MemoryStore, WAL + batched writes", batched_store, args.turns, batched=True)
+        print(f"\nSpeed-up: {after / before:.1f}x (per-op commits), {after_batched / before:.1f}x (batched)")
+
+        # Per-turn context build with and without the write-through cache.
+        print()
+        for enabled in (False, True):
+            store.cache_enabled = enabled
+            store.invalidate_cache()
+            start = time.perf_counter()
+            for _ in range(args.turns):
+                store.get_memory_context()
+            elapsed = time.perf_counter() - start
+            print(f"get_memory_context(), cache {'on ' if enabled else 'off'}  {elapsed * 1e6 / args.turns:8.1f} us/turn   {store.cache_stats()}")
+
+        store.close()
+        batched_store.close()
+
+if __name__ == "__main__":
+    main()
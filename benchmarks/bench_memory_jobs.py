@@ -0,0 +1,143 @@
+# benchmarks/bench_memory_jobs.py
+#
+# Memory updates under rapid turns: the old fire-and-forget task per turn versus the
+# durable MemoryJobQueue. The consolidation call is faked with a random latency, and
+# every turn states a new value for one profile fact, so we can check which turn's
+# value survives.
+#
+# Reports LLM calls made, peak concurrent calls, whether the final fact is the last
+# turn's, time for everything to be written, and the queue's own metrics. Then it
+# stops a queue partway through a burst, as Ctrl-C would, and checks that a fresh
+# queue on the same database finishes every update.
+#
+# Usage: python benchmarks/bench_memory_jobs.py [--turns 40] [--gap 0.2] [--latency 0.8]
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai.memory import MemoryStore
+from companion_ai.memory_jobs import MemoryJobQueue
+
+
+class FakeConsolidator:
+    """Stands in for consolidate_memory_async: sleeps, then reports the latest turn number it saw."""
+
+    def __init__(self, latency, jitter, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, user_message, ai_response, memory_context, tasks=None):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+        finally:
+            self.in_flight -= 1
+        latest = max(int(n) for n in re.findall(r"turn (\d+)", user_message))
+        return {"summary": f"User talked through turn {latest}.", "facts": {"last_turn": str(latest)}, "insight": None}
+
+
+def new_store(tmp, name):
+    store = MemoryStore(os.path.join(tmp, f"{name}.db"), cache_enabled=False)
+    store.init_db()
+    return store
+
+
+def turn_text(i):
+    return f"This is turn {i}. My favourite number today is {i}."
+
+
+async def fire_and_forget(store, fake, args):
+    """What main.py did before: one untracked task per turn, writing when its LLM call returns."""
+    async def update(i):
+        consolidated = await fake(turn_text(i), "Nice!", {})
+        with store.transaction():
+            store.add_summary(consolidated["summary"])
+            for key, value in consolidated["facts"].items():
+                store.upsert_profile_fact(key, value)
+
+    tasks = []
+    for i in range(args.turns):
+        tasks.append(asyncio.create_task(update(i)))
+        await asyncio.sleep(args.gap)
+    await asyncio.gather(*tasks)
+
+
+async def queued(store, fake, args):
+    queue = MemoryJobQueue(store, update_fn=fake).start()
+    for i in range(args.turns):
+        await queue.enqueue(turn_text(i), "Nice!", {})
+        await asyncio.sleep(args.gap)
+    await queue.stop(timeout=60)
+    return queue
+
+
+async def interrupted(tmp, args):
+    store = new_store(tmp, "interrupted")
+    queue = MemoryJobQueue(store, update_fn=FakeConsolidator(args.latency, args.jitter)).start()
+    for i in range(args.turns):
+        await queue.enqueue(turn_text(i), "Nice!", {})
+    await asyncio.sleep(args.latency * 1.5)
+    left = await queue.stop(timeout=0)  # Ctrl-C: in-flight calls are cancelled
+    store.close()
+
+    store = MemoryStore(store.db_path, cache_enabled=False)  # "Restart"
+    resumed = MemoryJobQueue(store, update_fn=FakeConsolidator(args.latency, args.jitter)).start()
+    await resumed.stop(timeout=60)
+    remaining = store._read("SELECT count(*) AS n FROM memory_jobs")[0]["n"]
+    return left, resumed.stats["resumed"], remaining, store.get_profile_fact("last_turn")
+
+
+async def main_async(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.turns} turns, one every {args.gap * 1000:.0f} ms; "
+              f"consolidation takes {args.latency:.1f}-{args.latency + args.jitter:.1f}s\n")
+        print(f"{'':<16} {'LLM calls':>9} {'peak concurrent':>16} {'final fact':>11} {'all written':>12}")
+        for name, run in (("fire-and-forget", fire_and_forget), ("durable queue", queued)):
+            store = new_store(tmp, name.replace(" ", "_"))
+            fake = FakeConsolidator(args.latency, args.jitter)
+            start = time.perf_counter()
+            queue = await run(store, fake, args)
+            elapsed = time.perf_counter() - start
+            final = store.get_profile_fact("last_turn")
+            verdict = "ok" if final == str(args.turns - 1) else f"STALE ({final})"
+            print(f"{name:<16} {fake.calls:>9} {fake.peak:>16} {verdict:>11} {elapsed:11.1f}s")
+            store.close()
+
+        metrics = queue.metrics()
+        latency = metrics["latency"]
+        print(f"\nQueue: {metrics['completed']} jobs in {metrics['batches']} batches ({metrics['coalesced']} coalesced), "
+              f"job latency p50 {latency['job_latency']['p50']:.2f}s / p95 {latency['job_latency']['p95']:.2f}s, "
+              f"{metrics['backpressure_waits']} backpressure waits ({metrics['backpressure_seconds']:.1f}s)")
+
+        left, resumed, remaining, final = await interrupted(tmp, args)
+        print(f"\nInterrupted after {args.latency * 1.5:.1f}s: {left} jobs left in the queue; "
+              f"after restart {resumed} resumed, {remaining} still pending, final fact turn {final} "
+              f"({'ok' if final == str(args.turns - 1) and remaining == 0 else 'LOST UPDATES'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire-and-forget memory updates versus the durable job queue.")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--gap", type=float, default=0.2, help="seconds between turns")
+    parser.add_argument("--latency", type=float, default=0.8, help="minimum consolidation latency (s)")
+    parser.add_argument("--jitter", type=float, default=1.2, help="extra random consolidation latency (s)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
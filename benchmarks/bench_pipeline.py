@@ -0,0 +1,332 @@
+# benchmarks/bench_pipeline.py
+#
+# Offline replay of the whole voice pipeline, no microphone or cloud credentials:
+#
+#   WAV -> VAD endpointing (real) -> STT (real Whisper engine, or the stub)
+#       -> memory context + retrieval (real, on a scratch database)
+#       -> streamed reply (stub LLM with configurable latency) -> sentence TTS (stub)
+#       -> memory update: gate, consolidation (stub LLM), transactional write (real)
+#
+# Reports throughput, per-stage latency percentiles, WER when references exist and the
+# memory footprint, and writes everything as JSON so runs on different commits can be
+# compared (--compare).
+#
+# Corpus: a directory of 16 kHz mono 16-bit WAVs. A clip may hold several utterances
+# separated by silence; an optional clip.txt gives one reference transcript per line.
+# Without a directory, --synthetic N generates speech-like clips (use with --stt stub).
+#
+# Usage: python benchmarks/bench_pipeline.py path/to/wavs --stt-model base.en --output run.json
+#        python benchmarks/bench_pipeline.py --synthetic 40 --stt stub --compare run.json
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import wave
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from bench_stt import normalize, word_errors
+from companion_ai import gating, llm_interface, memory, retrieval, stt, tracing
+from companion_ai.async_llm import AsyncLLMClient, FakeBackend, iterate_in_thread
+from companion_ai.audio_capture import AdaptiveEnergyDetector, Endpointer, replay_endpoints
+from companion_ai.streaming import StreamingSpeechPipeline
+from companion_ai.tts import StubTTSEngine
+
+RATE = 16000
+CHUNK = 1024
+GATING_TRANSCRIPTS = os.path.join(os.path.dirname(__file__), "data", "gating_transcripts.jsonl")
+STUB_REPLY = ("That sounds like a lot to juggle, but you're handling it well. "
+              "Tell me a bit more about what you're working on today, and we can figure out the next step together.")
+STUB_MEMORY_REPLY = json.dumps({
+    "summary": "User shared an update on their day and the AI encouraged them.",
+    "facts": {"current_focus": "companion project"},
+    "insight": "The user responds well to encouragement and concrete next steps.",
+})
+
+
+# --- Corpus ---
+
+def read_clip(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit PCM")
+        return wav.readframes(wav.getnframes())
+
+
+def load_corpus(wav_dir):
+    clips = []
+    for path in sorted(glob.glob(os.path.join(wav_dir, "*.wav"))):
+        ref_path = os.path.splitext(path)[0] + ".txt"
+        references = None
+        if os.path.exists(ref_path):
+            with open(ref_path, encoding="utf-8") as f:
+                references = [line.strip() for line in f if line.strip()]
+        clips.append((os.path.basename(path), read_clip(path), references))
+    return clips
+
+
+def synthetic_corpus(n, seed=0):
+    """Clips of background noise around one harmonic, syllable-modulated 'utterance' each."""
+    with open(GATING_TRANSCRIPTS, encoding="utf-8") as f:
+        lines = [json.loads(line)["user"] for line in f if line.strip()]
+    rng = np.random.default_rng(seed)
+    clips = []
+    for i in range(n):
+        text = lines[i % len(lines)]
+        speech_seconds = 0.6 + 0.25 * len(text.split())
+        t = np.arange(int(speech_seconds * RATE)) / RATE
+        f0 = rng.uniform(110, 220)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        syllables = 0.55 + 0.45 * np.sin(2 * np.pi * rng.uniform(3, 5) * t)
+        speech = voiced * syllables * 3000
+        lead, tail = rng.normal(0, 30, int(0.6 * RATE)), rng.normal(0, 30, int(1.4 * RATE))
+        audio = np.concatenate((lead, speech + rng.normal(0, 30, len(speech)), tail))
+        clips.append((f"synthetic_{i:03d}", audio.astype(np.int16).tobytes(), [text]))
+    return clips
+
+
+# --- Stub backends ---
+
+class StubTextModel:
+    """Stands in for llm_interface.text_model (the synchronous fallback calls)."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.latency)
+        return types.SimpleNamespace(text="User and AI had a short exchange.", usage_metadata=None)
+
+
+def install_stubs(args):
+    llm_interface.set_async_client("reply", AsyncLLMClient(
+        FakeBackend(STUB_REPLY, latency=args.llm_latency, jitter=args.llm_jitter, token_delay=args.token_delay, seed=1),
+        hedge_after=None))
+    llm_interface.set_async_client("memory", AsyncLLMClient(
+        FakeBackend(STUB_MEMORY_REPLY, latency=args.memory_llm_latency, seed=2), hedge_after=None))
+    llm_interface.set_text_model(StubTextModel(args.memory_llm_latency))
+
+
+# --- Pipeline ---
+
+async def update_memory(stats, user_message, ai_message, context):
+    """Same steps as main.update_memory_async."""
+    start = time.perf_counter()
+    tasks = gating.get_gate().decide(user_message)
+    consolidated = await llm_interface.consolidate_memory_async(user_message, ai_message, context, tasks)
+    with memory.transaction():
+        if consolidated["summary"]: memory.add_summary(consolidated["summary"])
+        for key, value in (consolidated["facts"] or {}).items(): memory.upsert_profile_fact(key, value)
+        if consolidated["insight"]: memory.add_insight(consolidated["insight"])
+    stats.add("memory_update", time.perf_counter() - start)
+
+
+def speak_reply(text_chunks, tts, marks, start):
+    def on_audio():
+        marks.setdefault("tts_first_audio", time.perf_counter() - start)
+        pipeline.mark_first_audio()
+
+    pipeline = StreamingSpeechPipeline(lambda segment: tts.synthesize(segment, lambda chunk: on_audio()))
+    text = pipeline.run(text_chunks)
+    if pipeline.timings["first_token"] is not None:
+        marks["llm_first_token"] = pipeline.timings["first_token"]
+    return text
+
+
+async def run_turn(stats, engine, tts, audio, reference, errors, background):
+    loop = asyncio.get_running_loop()
+    endpoint = time.perf_counter()
+    user_message = (await asyncio.to_thread(engine.transcribe, audio))["text"].strip()
+    stats.add("stt", time.perf_counter() - endpoint)
+    if reference is not None:
+        ref_words = normalize(reference)
+        errors[0] += word_errors(ref_words, normalize(user_message))
+        errors[1] += len(ref_words)
+    if not user_message:
+        return
+
+    start = time.perf_counter()
+    context = memory.get_memory_context(n_summaries=3, n_insights=2)
+    context["relevant"] = retrieval.search_memories(user_message, k=3, memory_context=context)
+    stats.add("memory_read", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    marks = {}
+    text_chunks = iterate_in_thread(llm_interface.generate_response_stream_async(user_message, context), loop)
+    ai_message = await asyncio.to_thread(speak_reply, text_chunks, tts, marks, start)
+    stats.add("reply_total", time.perf_counter() - start)
+    for name, seconds in marks.items():
+        stats.add(name, seconds)
+    if "tts_first_audio" in marks:
+        stats.add("response_latency", start - endpoint + marks["tts_first_audio"])
+
+    background.append(asyncio.create_task(update_memory(stats, user_message, ai_message, context)))
+
+
+async def run_corpus(clips, engine, tts, args):
+    stats = tracing.RollingPercentiles(window=1_000_000)
+    errors = [0, 0]
+    background = []
+    utterances = audio_seconds = 0
+    for name, pcm, references in clips:
+        audio_seconds += len(pcm) / 2 / RATE
+        start = time.perf_counter()
+        endpointer = Endpointer(AdaptiveEnergyDetector(frame_size=CHUNK), hangover_frames=int(args.silence * RATE / CHUNK),
+                                pre_roll_samples=int(0.3 * RATE))
+        segments = replay_endpoints(pcm, endpointer, CHUNK)
+        stats.add("vad", time.perf_counter() - start)
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        for i, (seg_start, seg_end) in enumerate(segments):
+            utterances += 1
+            audio = samples[seg_start:seg_end].astype(np.float32) / 32768.0
+            reference = references[i] if references and i < len(references) else None
+            await run_turn(stats, engine, tts, audio, reference, errors, background)
+    await asyncio.gather(*background)
+    return stats, errors, utterances, audio_seconds
+
+
+# --- Results ---
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_comparison(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous_path} (commit {previous['meta'].get('commit')}):")
+    print(f"{'stage':<18} {'p50 before':>11} {'p50 now':>10} {'change':>8}")
+    for stage, now in current["stages"].items():
+        before = previous["stages"].get(stage)
+        if before and before["p50"] > 0:
+            change = now["p50"] / before["p50"] - 1
+            print(f"{stage:<18} {before['p50'] * 1000:9.1f}ms {now['p50'] * 1000:8.1f}ms {change:+7.1%}")
+    print(f"{'throughput':<18} {previous['throughput']['utterances_per_second']:9.2f}/s "
+          f"{current['throughput']['utterances_per_second']:8.2f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay benchmark of the voice pipeline.")
+    parser.add_argument("wav_dir", nargs="?")
+    parser.add_argument("--synthetic", type=int, default=0, help="generate N synthetic clips instead of reading WAVs")
+    parser.add_argument("--stt", default="whisper", choices=sorted(stt.ENGINES))
+    parser.add_argument("--stt-model", default="base.en")
+    parser.add_argument("--stub-rtf", type=float, default=0.1, help="real-time factor of the stub STT engine")
+    parser.add_argument("--silence", type=float, default=1.0, help="VAD hangover in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub LLM time to first token (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--memory-llm-latency", type=float, default=0.5)
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="stub TTS time to first audio (s)")
+    parser.add_argument("--seed-memories", type=int, default=500, help="summaries in the scratch database beforehand")
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the pipeline's own log output")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        clips = synthetic_corpus(args.synthetic)
+    elif args.wav_dir:
+        clips = load_corpus(args.wav_dir)
+    else:
+        parser.error("give a WAV directory or --synthetic N")
+    if not clips:
+        sys.exit("No clips to replay.")
+
+    # References are looked up by position when the stub engine "transcribes".
+    pending_refs = []
+    if args.stt == "stub":
+        engine = stt.load_engine("stub", rtf=args.stub_rtf, text_for=lambda audio: pending_refs.pop(0) if pending_refs else "hello")
+        pending_refs.extend(ref for _, _, refs in clips for ref in (refs or []))
+    else:
+        engine = stt.load_engine(args.stt, model_name=args.stt_model)
+    tts = StubTTSEngine(latency=args.tts_latency, speed=50.0)
+    install_stubs(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = memory.MemoryStore(os.path.join(tmp, "bench.db"))
+        memory.set_store(store)
+        log = io.StringIO()
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+            store.init_db()
+            with store.transaction():
+                for i in range(args.seed_memories):
+                    store.add_summary(f"User and AI talked about topic number {i}, including plans and feelings.")
+            retrieval.get_index()
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            start = time.perf_counter()
+            stats, errors, utterances, audio_seconds = asyncio.run(run_corpus(clips, engine, tts, args))
+            wall = time.perf_counter() - start
+        store.close()
+        db_bytes = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB on Linux
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "stt": engine.describe(),
+            "clips": len(clips),
+            "args": vars(args),
+        },
+        "throughput": {
+            "utterances": utterances,
+            "audio_seconds": audio_seconds,
+            "wall_seconds": wall,
+            "utterances_per_second": utterances / wall if wall else 0.0,
+            "audio_seconds_per_second": audio_seconds / wall if wall else 0.0,
+        },
+        "stages": stats.summary(),
+        "wer": errors[0] / errors[1] if errors[1] else None,
+        "memory": {
+            "peak_rss_mb": rss_after * rss_scale / 1024 / 1024,
+            "peak_rss_growth_mb": (rss_after - rss_before) * rss_scale / 1024 / 1024,
+            "database_mb": db_bytes / 1024 / 1024,
+        },
+        "gate": dict(gating.get_gate().stats),
+        "errors_logged": sum("error" in line.lower() for line in log.getvalue().splitlines()),
+    }
+
+    t = results["throughput"]
+    print(f"{len(clips)} clips, {utterances} utterances, {audio_seconds:.1f}s of audio in {wall:.1f}s "
+          f"({t['utterances_per_second']:.2f} utterances/s, {t['audio_seconds_per_second']:.2f}x real time)")
+    print(f"STT: {engine.describe()}" + (f", WER {results['wer']:.1%}" if results["wer"] is not None else ""))
+    print()
+    print(tracing.format_summary(results["stages"]))
+    m = results["memory"]
+    print(f"\nPeak RSS {m['peak_rss_mb']:.0f} MB (+{m['peak_rss_growth_mb']:.1f} MB during replay), "
+          f"database {m['database_mb']:.2f} MB")
+    if results["errors_logged"]:
+        print(f"WARNING: {results['errors_logged']} error lines were logged (rerun with -v to see them)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_playback.py
+#
+# Compares the old playback pattern (a coroutine calling the blocking stream.write()
+# for every TTS chunk) with PlaybackEngine's dedicated thread, using a fake output
+# stream whose write() blocks for as long as the audio would take to play.
+#
+# Reports event-loop stalls while speech plays and the latency from "stop speaking"
+# to the output going quiet.
+#
+# Usage: python benchmarks/bench_playback.py [--seconds 3] [--chunk-ms 100] [--period 1024]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai.playback import LoopStallMonitor, PlaybackEngine
+
+RATE = 48000
+
+
+class FakeOutputStream:
+    """Blocks in write() for the duration of the audio, like a real device with a small buffer."""
+
+    def __init__(self, rate: int = RATE):
+        self.rate = rate
+        self.last_write_end = 0.0
+
+    def write(self, data: bytes):
+        time.sleep(len(data) / 2 / self.rate)
+        self.last_write_end = time.perf_counter()
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def legacy_player(chunks, stream, cancel_after):
+    """The previous AudioPlayer: blocking write() on the event loop, no way to cancel."""
+    queue = asyncio.Queue()
+    for chunk in chunks:
+        queue.put_nowait(chunk)
+
+    async def run():
+        while not queue.empty():
+            stream.write(await queue.get())
+
+    async def cancel():
+        await asyncio.sleep(cancel_after)
+        # Best the old code could do: empty the queue. It only gets to run once the
+        # loop is free, and the write in progress still finishes.
+        while not queue.empty():
+            queue.get_nowait()
+
+    # Latency is measured from when the cancel was due, since the stalled loop
+    # delays the cancel itself.
+    requested = time.perf_counter() + cancel_after
+    player_task = asyncio.create_task(run())
+    await cancel()
+    await player_task
+    return stream.last_write_end - requested
+
+
+async def engine_player(chunks, stream, cancel_after, period):
+    engine = PlaybackEngine(stream, rate=RATE, period_frames=period, buffer_seconds=len(chunks) * 1.0).start()
+    generation = engine.generation
+    # TTS callbacks arrive on another thread; play() may block when the buffer is full.
+    feeder = asyncio.create_task(asyncio.to_thread(lambda: [engine.play(c, generation) for c in chunks]))
+    await asyncio.sleep(cancel_after)
+    requested = time.perf_counter()
+    engine.cancel()
+    await feeder
+    while engine.is_speaking():
+        await asyncio.sleep(0.001)
+    latency = stream.last_write_end - requested
+    engine.close()
+    return max(0.0, latency)
+
+
+async def run_case(name, player, chunks, cancel_after, **kwargs):
+    monitor = LoopStallMonitor(interval=0.005).start()
+    latency = await player(chunks, FakeOutputStream(), cancel_after, **kwargs)
+    await monitor.stop()
+    stalls = monitor.summary()
+    print(f"{name:<26} {stalls['p99'] * 1000:9.1f}ms {stalls['max'] * 1000:9.1f}ms {latency * 1000:12.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event-loop stalls and cancel latency of audio playback.")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Audio queued per run")
+    parser.add_argument("--chunk-ms", type=float, default=100.0, help="Size of each TTS audio chunk")
+    parser.add_argument("--cancel-after", type=float, default=1.0, help="Seconds of playback before cancelling")
+    parser.add_argument("--period", type=int, default=1024, help="PlaybackEngine period in frames")
+    args = parser.parse_args()
+
+    chunk = bytes(int(RATE * args.chunk_ms / 1000) * 2)
+    chunks = [chunk] * int(args.seconds * 1000 / args.chunk_ms)
+
+    print(f"{'':<26} {'loop p99':>11} {'loop max':>11} {'cancel latency':>14}")
+    asyncio.run(run_case("blocking write on loop", legacy_player, chunks, args.cancel_after))
+    asyncio.run(run_case(f"playback thread ({args.period})", engine_player, chunks, args.cancel_after,
+                         period=args.period))
+    print(f"\nOne playback period is {args.period / RATE * 1000:.1f} ms; one TTS chunk is {args.chunk_ms:.0f} ms.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_retrieval.py
+#
+# Query latency of the local retrieval index at 10k / 100k / 1M memories, plus
+# embedding throughput. Large indexes reuse a pool of embedded texts, since search
+# cost depends only on the number of rows. --persist also measures writing vectors
+# to SQLite and reloading them.
+#
+# Usage: python benchmarks/bench_retrieval.py [--sizes 10000 100000 1000000] [--persist]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from companion_ai.memory import MemoryStore
+from companion_ai.retrieval import HashingEmbedder, VectorIndex
+
+TOPICS = ["hiking", "python", "cooking", "guitar", "exam", "sleep", "dog", "travel", "movie", "job",
+          "gym", "painting", "chess", "garden", "budget", "family", "coffee", "rain", "novel", "startup"]
+VERBS = ["discussed", "planned", "worried about", "celebrated", "asked about", "reflected on"]
+DETAILS = ["with friends", "for the weekend", "after work", "late at night", "for the first time", "again"]
+
+def make_text(rng):
+    a, b = rng.sample(TOPICS, 2)
+    return f"User and AI {rng.choice(VERBS)} {a} and {b} {rng.choice(DETAILS)}."
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local memory retrieval index.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pool", type=int, default=20_000, help="Distinct texts to embed")
+    parser.add_argument("--persist", action="store_true", help="Also time SQLite persistence (sizes <= 100k)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    embedder = HashingEmbedder()
+    texts = [make_text(rng) for _ in range(args.pool)]
+    start = time.perf_counter()
+    vectors = [embedder.embed(t) for t in texts]
+    embed_seconds = time.perf_counter() - start
+    print(f"Embedding: {args.pool / embed_seconds:,.0f} texts/sec ({embed_seconds * 1e6 / args.pool:.0f} us each)\n")
+
+    queries = [f"remember when we talked about {rng.choice(TOPICS)}?" for _ in range(args.queries)]
+    print(f"{'memories':>10} {'p50 query':>11} {'p95 query':>11} {'matrix MB':>10}")
+    for size in args.sizes:
+        index = VectorIndex(embedder=embedder, initial_capacity=size)
+        for i in range(size):
+            j = i % args.pool
+            index._put("summary", str(i), texts[j], vectors[j])
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, k=5)
+            latencies.append(time.perf_counter() - start)
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+        print(f"{size:>10,} {p50:9.2f}ms {p95:9.2f}ms {index._matrix.nbytes / 2**20:10.1f}")
+
+    if args.persist:
+        print()
+        for size in [s for s in args.sizes if s <= 100_000]:
+            with tempfile.TemporaryDirectory() as tmp:
+                store = MemoryStore(os.path.join(tmp, "bench.db"), cache_enabled=False)
+                store.init_db()
+                index = VectorIndex(store, embedder)
+                start = time.perf_counter()
+                with store.transaction():
+                    for i in range(size):
+                        index.add("summary", i, texts[i % args.pool])
+                insert_seconds = time.perf_counter() - start
+                store.close()
+
+                store = MemoryStore(os.path.join(tmp, "bench.db"), cache_enabled=False)
+                start = time.perf_counter()
+                VectorIndex(store, embedder)
+                load_seconds = time.perf_counter() - start
+                store.close()
+                print(f"{size:>10,} memories: indexed+persisted at {size / insert_seconds:,.0f}/sec, reloaded in {load_seconds:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# benchmarks/bench_server.py
+#
+# Load test for the multi-session server (companion_ai/server.py). Starts the server
+# in a subprocess with the fake LLM (or connects to a running one with --connect),
+# then runs increasing numbers of concurrent sessions. Each session sends --turns
+# text turns with a think time between them and measures, client-side, the time to
+# the first reply chunk and to the end of the reply.
+#
+# For every level it prints throughput, latency percentiles, refused turns and the
+# CPU the server used (from its own "stats" message). The result is the largest
+# level whose p95 time-to-first-chunk meets --target-p95, and sessions per core at
+# that level (sessions / cores the server process actually used).
+#
+# Usage: python benchmarks/bench_server.py [--levels 10 50 100 200 400] [--target-p95 1.0]
+#        python benchmarks/bench_server.py --connect 127.0.0.1:8765
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai import tracing
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GATING_TRANSCRIPTS = os.path.join(os.path.dirname(__file__), "data", "gating_transcripts.jsonl")
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=1024 * 1024)
+        return cls(reader, writer)
+
+    async def send(self, message):
+        self.writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        await self.writer.drain()
+
+    async def recv(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def server_stats(host, port):
+    client = await Client.connect(host, port)
+    await client.send({"type": "hello", "user": "loadtest-stats"})
+    await client.recv()
+    await client.send({"type": "stats"})
+    stats = await client.recv()
+    await client.send({"type": "bye"})
+    await client.close()
+    return stats
+
+
+async def run_session(host, port, user, messages, turns, think, results, rng):
+    try:
+        client = await Client.connect(host, port)
+    except OSError:
+        results["connect_errors"] += 1
+        return
+    try:
+        await client.send({"type": "hello", "user": user})
+        if (await client.recv())["type"] != "ready":
+            results["sessions_refused"] += 1
+            return
+        for _ in range(turns):
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * think)
+            start = time.perf_counter()
+            await client.send({"type": "text", "text": rng.choice(messages)})
+            first = None
+            while True:
+                message = await client.recv()
+                if message["type"] == "reply_chunk" and first is None:
+                    first = time.perf_counter() - start
+                elif message["type"] == "reply_done":
+                    results["latency"].add("first_chunk", first if first is not None else time.perf_counter() - start)
+                    results["latency"].add("reply_total", time.perf_counter() - start)
+                    results["turns"] += 1
+                    break
+                elif message["type"] == "error":
+                    results["turns_refused"] += 1
+                    break
+        await client.send({"type": "bye"})
+    except ConnectionError:
+        results["connect_errors"] += 1
+    finally:
+        await client.close()
+
+
+async def run_level(host, port, sessions, args, messages):
+    results = {"latency": tracing.RollingPercentiles(window=1_000_000), "turns": 0, "turns_refused": 0,
+               "sessions_refused": 0, "connect_errors": 0}
+    before = await server_stats(host, port)
+    start = time.perf_counter()
+    rng = random.Random(sessions)
+    # Sessions arrive spread over one think time rather than all at once.
+    tasks = []
+    for i in range(sessions):
+        tasks.append(asyncio.create_task(run_session(
+            host, port, f"user{i:04d}", messages, args.turns, args.think, results, random.Random(rng.random()))))
+        await asyncio.sleep(args.think / sessions)
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - start
+    after = await server_stats(host, port)
+    results["wall"] = wall
+    results["cpu_cores"] = (after["cpu_seconds"] - before["cpu_seconds"]) / wall
+    return results
+
+
+async def start_server(args, data_dir):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "companion_ai.server", "--port", "0", "--llm", "fake",
+        "--fake-latency", str(args.llm_latency), "--llm-concurrency", str(args.llm_concurrency),
+        "--max-sessions", str(max(args.levels) + 10), "--max-active-turns", str(args.max_active_turns),
+        "--data-dir", data_dir,
+        cwd=PROJECT_ROOT, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    while True:
+        line = await process.stdout.readline()
+        if not line:
+            raise RuntimeError("server exited before listening")
+        match = re.search(rb"Listening on tcp://([\d.]+):(\d+)", line)
+        if match:
+            break
+
+    async def drain():  # The server logs every turn; keep its pipe from filling up.
+        while await process.stdout.readline():
+            pass
+
+    asyncio.create_task(drain())
+    return process, match.group(1).decode(), int(match.group(2))
+
+
+async def main_async(args):
+    with open(GATING_TRANSCRIPTS, encoding="utf-8") as f:
+        messages = [json.loads(line)["user"] for line in f if line.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        if args.connect:
+            host, port = args.connect.rsplit(":", 1)
+            port = int(port)
+        else:
+            process, host, port = await start_server(args, tmp)
+        try:
+            print(f"{'sessions':>8} {'turns/s':>8} {'first p50':>10} {'first p95':>10} {'total p95':>10} "
+                  f"{'refused':>8} {'server cpu':>11}")
+            rows = []
+            for sessions in args.levels:
+                r = await run_level(host, port, sessions, args, messages)
+                summary = r["latency"].summary()
+                first = summary.get("first_chunk", {"p50": float("nan"), "p95": float("nan")})
+                total = summary.get("reply_total", {"p95": float("nan")})
+                refused = r["turns_refused"] + r["sessions_refused"] + r["connect_errors"]
+                rows.append({"sessions": sessions, "first_p95": first["p95"], "refused": refused,
+                             "cpu_cores": r["cpu_cores"]})
+                print(f"{sessions:>8} {r['turns'] / r['wall']:8.1f} {first['p50'] * 1000:8.0f}ms "
+                      f"{first['p95'] * 1000:8.0f}ms {total['p95'] * 1000:8.0f}ms {refused:>8} "
+                      f"{r['cpu_cores']:9.2f} cores")
+        finally:
+            if process is not None:
+                process.terminate()
+                await process.wait()
+
+    passing = [row for row in rows if row["first_p95"] <= args.target_p95 and row["refused"] == 0]
+    if not passing:
+        print(f"\nNo level met p95 time-to-first-chunk <= {args.target_p95 * 1000:.0f} ms.")
+        return
+    best = max(passing, key=lambda row: row["sessions"])
+    cores = max(best["cpu_cores"], 1e-3)
+    print(f"\nLargest level meeting p95 time-to-first-chunk <= {args.target_p95 * 1000:.0f} ms: "
+          f"{best['sessions']} sessions, using {best['cpu_cores']:.2f} cores "
+          f"-> {best['sessions'] / cores:.0f} sessions per core")
+    if best is rows[-1]:
+        print("(the largest level tested; raise --levels to find the limit)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the multi-session server.")
+    parser.add_argument("--levels", type=int, nargs="+", default=[10, 50, 100, 200, 400])
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--think", type=float, default=2.0, help="mean seconds between a session's turns")
+    parser.add_argument("--target-p95", type=float, default=1.0, help="target p95 time to first chunk (s)")
+    parser.add_argument("--connect", help="host:port of a running server instead of starting one")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-concurrency", type=int, default=256)
+    parser.add_argument("--max-active-turns", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# benchmarks/bench_speculation.py
+#
+# Perceived latency (VAD endpoint -> first reply audio) of the sequential pipeline
+# versus speculative replies (companion_ai/speculation.py), with stubbed backends:
+#
+#   synthetic speech, fed in real time -> Endpointer (real) -> stub STT (fixed time
+#   per pass, returns the words spoken so far) -> stub LLM (FakeBackend) -> stub TTS
+#
+# Utterances come in one or more stretches of words; stretches are separated by a
+# pause longer than --pause (so a speculation starts, then is cancelled when the
+# user carries on) but shorter than the silence window. --revise is the chance that
+# the final STT pass changes a word, so the speculation can't be used.
+#
+# Usage: python benchmarks/bench_speculation.py [--utterances 12] [--silence 1.0] [--pause 0.35]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from companion_ai import llm_interface, tracing
+from companion_ai.async_llm import AsyncLLMClient, FakeBackend, iterate_in_thread
+from companion_ai.audio_capture import AdaptiveEnergyDetector, Endpointer
+from companion_ai.speculation import SpeculativeResponder
+from companion_ai.streaming import StreamingSpeechPipeline
+from companion_ai.tts import StubTTSEngine
+
+RATE = 16000
+CHUNK = 1024
+WORD_SECONDS = 0.3
+REPLY = ("That sounds like a lot to juggle, but you're handling it well. "
+         "Tell me a bit more about what you're working on today, and we can figure out the next step together.")
+WORDS = ("i have been thinking about the project again and i am not sure the memory part works "
+         "the way we wanted maybe we should try a smaller model first and see how it feels").split()
+
+
+def make_utterance(rng, args):
+    """Returns (pcm bytes, [(end sample, words spoken by then)], full text, final text)."""
+    stretches = 1 + (rng.random() < args.mid_pause_rate)
+    audio, marks, words = [rng.normal(0, 30, int(0.5 * RATE))], [], []
+    samples = len(audio[0])
+    for s in range(stretches):
+        n = rng.integers(3, 9)
+        t = np.arange(int(n * WORD_SECONDS * RATE)) / RATE
+        f0 = rng.uniform(110, 220)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        speech = voiced * (0.55 + 0.45 * np.sin(2 * np.pi * 4 * t)) * 3000 + rng.normal(0, 30, len(t))
+        start = int(rng.integers(0, len(WORDS) - n))
+        words += WORDS[start:start + n]
+        audio.append(speech)
+        samples += len(speech)
+        marks.append((samples, len(words)))
+        gap = args.mid_pause if s < stretches - 1 else args.silence + 0.5
+        audio.append(rng.normal(0, 30, int(gap * RATE)))
+        samples += len(audio[-1])
+    text = " ".join(words)
+    final = text
+    if rng.random() < args.revise:
+        final = " ".join(words[:-1] + ["maybe"])  # The last pass hears the last word differently
+    return np.concatenate(audio).astype(np.int16).tobytes(), marks, text, final
+
+
+class StubTranscriber:
+    """Returns the words spoken up to the audio fed so far, after `seconds` per pass."""
+
+    def __init__(self, marks, text, final_text, seconds):
+        self.marks = marks
+        self.words = text.split()
+        self.final_text = final_text
+        self.seconds = seconds
+        self.fed = 0  # Samples
+
+    def peek(self):
+        time.sleep(self.seconds)
+        count = max((n for end, n in self.marks if end <= self.fed), default=0)
+        return " ".join(self.words[:count])
+
+    def finalize(self):
+        time.sleep(self.seconds)
+        return self.final_text
+
+
+def speak(text_chunks, tts, first_audio):
+    def on_audio():
+        if not first_audio:
+            first_audio.append(time.perf_counter())
+
+    pipeline = StreamingSpeechPipeline(lambda segment: tts.synthesize(segment, lambda chunk: on_audio()))
+    return pipeline.run(text_chunks)
+
+
+def capture(pcm, endpointer, transcriber, speculator):
+    """Feeds the clip frame by frame in real time, as the microphone would. Returns the endpoint time."""
+    start = time.perf_counter()
+    for i, offset in enumerate(range(0, len(pcm) - CHUNK * 2 + 1, CHUNK * 2)):
+        delay = start + i * CHUNK / RATE - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        event = endpointer.process(pcm[offset:offset + CHUNK * 2])
+        transcriber.fed = (offset + CHUNK * 2) // 2
+        if event == "pause" and speculator is not None:
+            speculator.pause(transcriber.peek)
+        elif event == "resume" and speculator is not None:
+            speculator.resume()
+        elif event == "end":
+            return time.perf_counter()
+    return time.perf_counter()
+
+
+async def run(clips, args, speculative):
+    loop = asyncio.get_running_loop()
+    tts = StubTTSEngine(latency=args.tts_latency, speed=50.0)
+    stats = tracing.RollingPercentiles(window=100_000)
+
+    def start_fn(partial_text):
+        context = {}
+        prompt_tokens = llm_interface.prompt_builder.build(partial_text, context)["total_tokens"]
+        return llm_interface.generate_response_stream_async(partial_text, context), context, prompt_tokens
+
+    speculator = SpeculativeResponder(start_fn) if speculative else None
+    for pcm, marks, text, final in clips:
+        endpointer = Endpointer(AdaptiveEnergyDetector(frame_size=CHUNK), hangover_frames=int(args.silence * RATE / CHUNK),
+                                pre_roll_samples=int(0.3 * RATE),
+                                pause_frames=max(1, int(args.pause * RATE / CHUNK)) if speculative else None)
+        transcriber = StubTranscriber(marks, text, final, args.stt_seconds)
+        endpoint = await asyncio.to_thread(capture, pcm, endpointer, transcriber, speculator)
+        user_message = await asyncio.to_thread(transcriber.finalize)
+        speculation = speculator.take(user_message) if speculator is not None else None
+        stream = (speculation.replay() if speculation is not None
+                  else llm_interface.generate_response_stream_async(user_message, {}))
+        first_audio = []
+        await asyncio.to_thread(speak, iterate_in_thread(stream, loop), tts, first_audio)
+        if speculation is not None:
+            speculation.close()
+        stats.add("perceived_latency", first_audio[0] - endpoint)
+    return stats.summary()["perceived_latency"], speculator.metrics() if speculator else None
+
+
+def install_stub_llm(args):
+    llm_interface.set_async_client("reply", AsyncLLMClient(
+        FakeBackend(REPLY, latency=args.llm_latency, jitter=args.llm_latency / 3, token_delay=args.token_delay, seed=1),
+        hedge_after=None))
+
+
+async def main_async(args):
+    rng = np.random.default_rng(args.seed)
+    clips = [make_utterance(rng, args) for _ in range(args.utterances)]
+    install_stub_llm(args)
+    print(f"{args.utterances} utterances, silence window {args.silence:.2f}s, pause {args.pause:.2f}s, "
+          f"LLM first token {args.llm_latency:.2f}s, STT pass {args.stt_seconds:.2f}s, TTS first audio {args.tts_latency:.2f}s\n")
+    print(f"{'pipeline':<12} {'p50':>8} {'p95':>8} {'p99':>8}   (VAD endpoint -> first reply audio)")
+    results = {}
+    for name, speculative in (("sequential", False), ("speculative", True)):
+        latency, metrics = await run(clips, args, speculative)
+        results[name] = latency
+        print(f"{name:<12} {latency['p50'] * 1000:6.0f}ms {latency['p95'] * 1000:6.0f}ms {latency['p99'] * 1000:6.0f}ms")
+    saved = results["sequential"]["p50"] - results["speculative"]["p50"]
+    print(f"\nSpeculation: {metrics['started']} started, {metrics['hits']} used, {metrics['misses']} misses "
+          f"(final transcript differed), {metrics['cancelled']} cancelled (user kept talking), "
+          f"{metrics['not_ready']} endpoints without one")
+    print(f"Hit rate {metrics['hit_rate']:.0%}; wasted {metrics['wasted_prompt_tokens']} prompt + "
+          f"{metrics['wasted_output_tokens']} output tokens; p50 saved {saved * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perceived latency: sequential versus speculative replies.")
+    parser.add_argument("--utterances", type=int, default=12)
+    parser.add_argument("--silence", type=float, default=1.0, help="VAD silence window (s)")
+    parser.add_argument("--pause", type=float, default=0.35, help="pause that starts a speculation (s)")
+    parser.add_argument("--mid-pause", type=float, default=0.6, help="length of pauses within an utterance (s)")
+    parser.add_argument("--mid-pause-rate", type=float, default=0.4, help="share of utterances with such a pause")
+    parser.add_argument("--revise", type=float, default=0.1, help="chance the final STT pass changes a word")
+    parser.add_argument("--stt-seconds", type=float, default=0.15, help="stub STT time per pass (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.6, help="stub LLM time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="stub TTS time to first audio (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
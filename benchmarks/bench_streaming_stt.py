@@ -0,0 +1,77 @@
+# benchmarks/bench_streaming_stt.py
+#
+# Replays WAV files (16 kHz, mono, 16-bit) through the batch and incremental Whisper
+# paths and reports the post-silence latency of each: the time between the end of
+# the utterance (when endpointing would fire) and a finished transcript.
+#
+# The incremental path is fed at real-time pace so its background decoding overlaps
+# "speaking" the way it does live.
+#
+# Usage: python benchmarks/bench_streaming_stt.py path/to/wavs [--model base.en] [--step 1.0]
+
+import argparse
+import glob
+import os
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import torch
+import whisper
+
+from companion_ai.streaming_stt import IncrementalTranscriber, replay_pcm
+
+RATE = 16000
+
+def read_wav(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit PCM")
+        return wav.readframes(wav.getnframes())
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay WAVs through batch vs incremental STT.")
+    parser.add_argument("wav_dir")
+    parser.add_argument("--model", default="base.en")
+    parser.add_argument("--step", type=float, default=1.0, help="Seconds of new audio between incremental passes")
+    args = parser.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = whisper.load_model(args.model, device=device)
+    fp16 = device == "cuda"
+
+    def transcribe_window(audio, prompt):
+        return model.transcribe(audio, fp16=fp16, word_timestamps=True,
+                                initial_prompt=prompt or None, condition_on_previous_text=False)
+
+    paths = sorted(glob.glob(os.path.join(args.wav_dir, "*.wav")))
+    if not paths:
+        sys.exit(f"No .wav files found in {args.wav_dir}")
+
+    batch_latencies, stream_latencies = [], []
+    print(f"{'file':<32} {'secs':>5} {'batch':>9} {'stream':>9}  passes")
+    for path in paths:
+        pcm = read_wav(path)
+        duration = len(pcm) / 2 / RATE
+
+        start = time.perf_counter()
+        batch_text = model.transcribe(np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0, fp16=fp16)["text"].strip()
+        batch_latency = time.perf_counter() - start
+
+        transcriber = IncrementalTranscriber(transcribe_window, sample_rate=RATE, step_seconds=args.step)
+        stream_text, stream_latency = replay_pcm(transcriber, pcm)
+
+        batch_latencies.append(batch_latency)
+        stream_latencies.append(stream_latency)
+        print(f"{os.path.basename(path):<32} {duration:5.1f} {batch_latency * 1000:7.0f}ms {stream_latency * 1000:7.0f}ms  {transcriber.decode_passes}")
+        if batch_text.lower() != stream_text.lower():
+            print(f"    batch:  {batch_text}\n    stream: {stream_text}")
+
+    print(f"\nMedian post-silence latency: batch {np.median(batch_latencies) * 1000:.0f} ms, "
+          f"incremental {np.median(stream_latencies) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_streaming_tts.py
+#
+# Time-to-first-audio for the sequential path (full reply, then TTS) versus the
+# streaming sentence pipeline, with stubbed LLM and TTS backends.
+#
+# Usage: python benchmarks/bench_streaming_tts.py [--token-delay 0.02] [--tts-startup 0.15]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai.streaming import StreamingSpeechPipeline
+
+REPLY = (
+    "That sounds like a really fun weekend! Hiking is such a great way to clear your head, "
+    "and the weather should be perfect for it. Do you already know which trail you want to take, "
+    "or are you still deciding? If you want, we could look at a few options together. "
+    "I'd love to hear how it goes afterwards."
+)
+
+def stub_llm_stream(text, token_delay, first_token_delay):
+    """Yields the reply a few characters at a time, like a streaming model."""
+    time.sleep(first_token_delay)
+    words = text.split(" ")
+    for i, word in enumerate(words):
+        time.sleep(token_delay)
+        yield word + (" " if i < len(words) - 1 else "")
+
+class StubTTS:
+    """Synthesizes at a fixed startup cost plus a per-character cost."""
+
+    def __init__(self, startup, per_char, on_audio=None):
+        self.startup = startup
+        self.per_char = per_char
+        self.on_audio = on_audio
+
+    def speak(self, text):
+        time.sleep(self.startup)
+        if self.on_audio: self.on_audio()
+        time.sleep(self.per_char * len(text))
+
+def run_sequential(args):
+    start = time.perf_counter()
+    text = "".join(stub_llm_stream(REPLY, args.token_delay, args.first_token_delay))
+    first_audio = {}
+    tts = StubTTS(args.tts_startup, args.tts_per_char, on_audio=lambda: first_audio.setdefault("t", time.perf_counter() - start))
+    tts.speak(text)
+    return first_audio["t"], time.perf_counter() - start
+
+def run_streaming(args):
+    tts = StubTTS(args.tts_startup, args.tts_per_char)
+    pipeline = StreamingSpeechPipeline(tts.speak)
+    tts.on_audio = pipeline.mark_first_audio
+    pipeline.run(stub_llm_stream(REPLY, args.token_delay, args.first_token_delay))
+    return pipeline.timings["first_audio"], pipeline.timings["tts_done"], len(pipeline.segments)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming LLM-to-TTS time-to-first-audio.")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Stub LLM delay per word (s)")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="Stub LLM delay before the first word (s)")
+    parser.add_argument("--tts-startup", type=float, default=0.15, help="Stub TTS startup per request (s)")
+    parser.add_argument("--tts-per-char", type=float, default=0.0005, help="Stub TTS synthesis cost per character (s)")
+    args = parser.parse_args()
+
+    seq_first, seq_total = run_sequential(args)
+    stream_first, stream_total, segments = run_streaming(args)
+    print(f"Sequential: first audio at {seq_first * 1000:7.1f} ms, done at {seq_total * 1000:7.1f} ms")
+    print(f"Streaming:  first audio at {stream_first * 1000:7.1f} ms, done at {stream_total * 1000:7.1f} ms ({segments} segments)")
+    print(f"Time to first audio improved by {(seq_first - stream_first) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_stt.py
+#
+# Compares STT engine configurations on a set of recorded samples: real-time factor
+# (decode seconds / audio seconds, lower is faster) and word error rate against
+# reference transcripts.
+#
+# The sample directory holds 16 kHz mono 16-bit WAV files, each with a reference
+# transcript next to it (clip01.wav + clip01.txt). Each configuration is loaded and
+# warmed up once before timing.
+#
+# A configuration is "model[:option...]", options being int8, fp32 (no quantization),
+# threads=N and fallback (temperature-fallback decoding instead of greedy).
+#
+# Usage: python benchmarks/bench_stt.py path/to/samples \
+#            --configs base.en:fp32 base.en:int8 base.en:int8:threads=4 medium.en:int8
+
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from companion_ai import stt
+
+RATE = 16000
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit PCM")
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def normalize(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+def word_errors(reference: list[str], hypothesis: list[str]) -> int:
+    """Levenshtein distance over words (substitutions + insertions + deletions)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+
+def parse_config(spec: str) -> dict:
+    model_name, *flags = spec.split(":")
+    options = {"model_name": model_name, "quantize": None, "threads": None, "fast_decode": True}
+    for flag in flags:
+        if flag == "int8":
+            options["quantize"] = True
+        elif flag == "fp32":
+            options["quantize"] = False
+        elif flag == "fallback":
+            options["fast_decode"] = False
+        elif flag.startswith("threads="):
+            options["threads"] = int(flag.split("=", 1)[1])
+        else:
+            raise ValueError(f"Unknown option '{flag}' in '{spec}'")
+    return options
+
+
+def load_samples(sample_dir):
+    samples = []
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.wav"))):
+        ref_path = os.path.splitext(path)[0] + ".txt"
+        if not os.path.exists(ref_path):
+            print(f"Skipping {os.path.basename(path)}: no reference transcript")
+            continue
+        with open(ref_path, encoding="utf-8") as f:
+            samples.append((os.path.basename(path), read_wav(path), normalize(f.read())))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare RTF and WER across STT engine configurations.")
+    parser.add_argument("sample_dir")
+    parser.add_argument("--engine", default="whisper", choices=sorted(set(stt.ENGINES) - {"stub"}))
+    parser.add_argument("--configs", nargs="+", default=["base.en:fp32", "base.en:int8"])
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every transcript")
+    args = parser.parse_args()
+
+    samples = load_samples(args.sample_dir)
+    if not samples:
+        sys.exit(f"No .wav/.txt pairs found in {args.sample_dir}")
+    audio_seconds = sum(len(audio) for _, audio, _ in samples) / RATE
+    print(f"{len(samples)} samples, {audio_seconds:.1f}s of audio\n")
+
+    rows = []
+    for spec in args.configs:
+        start = time.perf_counter()
+        engine = stt.load_engine(args.engine, device=args.device, **parse_config(spec))
+        load_seconds = time.perf_counter() - start
+
+        decode_seconds, errors, ref_words = 0.0, 0, 0
+        for name, audio, reference in samples:
+            start = time.perf_counter()
+            text = engine.transcribe(audio)["text"]
+            decode_seconds += time.perf_counter() - start
+            errors += word_errors(reference, normalize(text))
+            ref_words += len(reference)
+            if args.verbose:
+                print(f"  [{spec}] {name}: {text.strip()}")
+        rows.append((engine.describe(), load_seconds, decode_seconds / audio_seconds, errors / max(1, ref_words)))
+
+    print(f"{'configuration':<40} {'load':>7} {'RTF':>7} {'WER':>7}")
+    for describe, load_seconds, rtf, wer in rows:
+        print(f"{describe:<40} {load_seconds:6.1f}s {rtf:7.3f} {wer:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
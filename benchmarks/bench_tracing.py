@@ -0,0 +1,80 @@
+# benchmarks/bench_tracing.py
+#
+# Cost of per-turn tracing: a turn's worth of marks and spans (as main.py records
+# them) with tracing disabled, enabled in memory only, and enabled with JSONL and
+# SQLite export. Also writes a small synthetic session and summarizes it the way
+# `python -m companion_ai.tracing` does.
+#
+# Usage: python benchmarks/bench_tracing.py [--turns 20000]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai import tracing
+
+
+def traced_turn(tracer):
+    turn = tracer.start_turn()
+    for name in tracing.MARKS[:5]:
+        turn.mark(name)
+    for _ in range(20):  # One per streamed LLM chunk
+        turn.mark("llm_first_token")
+    for name in tracing.MARKS[5:]:
+        turn.mark(name)
+    turn.hold()
+    with turn.span("memory.consolidate"):
+        pass
+    with turn.span("memory.write"):
+        pass
+    turn.release()
+    turn.release()
+
+
+def cost_per_turn(tracer, turns):
+    start = time.perf_counter()
+    for _ in range(turns):
+        traced_turn(tracer)
+    return (time.perf_counter() - start) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of per-turn tracing.")
+    parser.add_argument("--turns", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("disabled", tracing.Tracer(enabled=False)),
+            ("enabled, in memory", tracing.Tracer(enabled=True)),
+            ("enabled, JSONL export", tracing.Tracer(enabled=True, sink=tracing.open_sink(os.path.join(tmp, "t.jsonl")))),
+            ("enabled, SQLite export", tracing.Tracer(enabled=True, sink=tracing.open_sink(os.path.join(tmp, "t.db")))),
+        ]
+        print(f"{'':<24} {'per turn':>12}")
+        for name, tracer in cases:
+            turns = args.turns if tracer.sink is None else max(1, args.turns // 20)
+            print(f"{name:<24} {cost_per_turn(tracer, turns) * 1e6:10.2f}us")
+
+        # A synthetic session with realistic gaps between marks, summarized from disk.
+        path = os.path.join(tmp, "session.jsonl")
+        tracer = tracing.Tracer(enabled=True, sink=tracing.open_sink(path), session="synthetic")
+        rng = random.Random(0)
+        for _ in range(50):
+            turn = tracer.start_turn()
+            t = 0.0
+            for name in tracing.MARKS:
+                t += rng.uniform(0.05, 0.6)
+                turn.marks[name] = t
+            turn.spans.append(("memory.consolidate", t, t + rng.uniform(0.4, 1.5)))
+            turn.release()
+        print(f"\nSummary of a synthetic 50-turn session read back from {os.path.basename(path)}:\n")
+        print(tracing.format_summary(tracing.summarize_records(tracing.load_records(path))))
+
+
+if __name__ == "__main__":
+    main()
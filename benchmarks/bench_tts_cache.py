@@ -0,0 +1,100 @@
+# benchmarks/bench_tts_cache.py
+#
+# Time to first audio for a TTS engine alone versus behind the PhraseCache, using the
+# local stub engine (fixed connection/synthesis latency, no cloud service). Replays a
+# phrase mix where a share of phrases repeat (greetings, acknowledgements, the error
+# fallback), then reports hit rates, first-audio latency for hits and misses, and how
+# quickly a fresh process recovers the cache from disk.
+#
+# Usage: python benchmarks/bench_tts_cache.py [--latency 0.15] [--turns 200] [--repeat 0.3]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from companion_ai.tts import CachedTTS, PhraseCache, StubTTSEngine
+
+COMMON_PHRASES = [
+    "I encountered an error trying to process that. Please try again.",
+    "Hey! Good to hear from you.",
+    "Of course.",
+    "Sure, let's do it.",
+    "Good night, sleep well!",
+    "That's great to hear!",
+    "Hmm, let me think about that.",
+    "I'm here for you.",
+]
+
+
+def phrase_mix(turns: int, repeat: float, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(COMMON_PHRASES) if rng.random() < repeat else f"Here is unique sentence number {i} for this run."
+            for i in range(turns)]
+
+
+def first_audio_latency(tts, text: str) -> float:
+    start = time.perf_counter()
+    first = []
+    tts.synthesize(text, lambda chunk: first or first.append(time.perf_counter() - start))
+    return first[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PhraseCache hit latency vs. uncached synthesis.")
+    parser.add_argument("--latency", type=float, default=0.15, help="Stub engine startup latency per call (s)")
+    parser.add_argument("--speed", type=float, default=20.0, help="Stub synthesis speed (x real time)")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--repeat", type=float, default=0.3, help="Share of segments that are common phrases")
+    parser.add_argument("--memory-mb", type=float, default=16)
+    parser.add_argument("--disk-mb", type=float, default=64)
+    args = parser.parse_args()
+
+    phrases = phrase_mix(args.turns, args.repeat)
+    engine = StubTTSEngine(latency=args.latency, speed=args.speed)
+
+    uncached = [first_audio_latency(engine, text) for text in phrases]
+
+    with tempfile.TemporaryDirectory() as disk_dir:
+        def make_cache():
+            return PhraseCache(max_memory_bytes=int(args.memory_mb * 1024 * 1024), disk_dir=disk_dir,
+                               max_disk_bytes=int(args.disk_mb * 1024 * 1024))
+
+        cached_tts = CachedTTS(engine, make_cache())
+        hits, misses = [], []
+        for text in phrases:
+            before = engine.calls
+            latency = first_audio_latency(cached_tts, text)
+            (misses if engine.calls > before else hits).append(latency)
+        stats = cached_tts.cache.stats
+
+        # A new process: empty memory tier, warm disk tier.
+        restarted = CachedTTS(engine, make_cache())
+        disk_latencies = [first_audio_latency(restarted, text) for text in COMMON_PHRASES]
+        disk_files = [f for f in os.listdir(disk_dir) if f.endswith(".pcm")]
+        disk_bytes = sum(os.path.getsize(os.path.join(disk_dir, f)) for f in disk_files)
+
+    def ms(values):
+        if not values:
+            return "n/a"
+        return f"p50 {np.median(values) * 1000:7.2f} ms  p95 {np.percentile(values, 95) * 1000:7.2f} ms"
+
+    print(f"{len(phrases)} segments, {args.repeat:.0%} common phrases, stub latency {args.latency * 1000:.0f} ms\n")
+    print(f"Uncached first audio:      {ms(uncached)}")
+    print(f"Cached, misses ({len(misses):>3}):     {ms(misses)}")
+    print(f"Cached, hits ({len(hits):>3}):       {ms(hits)}")
+    print(f"After restart (disk tier): {ms(disk_latencies)}")
+    print(f"\nCache stats: {stats}")
+    print(f"Disk tier: {len(disk_files)} files, {disk_bytes / 1024 / 1024:.1f} MB")
+    print(f"Mean first-audio latency: {np.mean(uncached) * 1000:.1f} ms -> "
+          f"{np.mean(hits + misses) * 1000:.1f} ms with the cache")
+
+
+if __name__ == "__main__":
+    main()
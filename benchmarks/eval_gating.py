@@ -0,0 +1,109 @@
+# benchmarks/eval_gating.py
+#
+# Evaluates companion_ai.gating on a labelled transcript set: how many fact-extraction
+# and insight calls the gate skips, and how many turns that really had a fact (or
+# deserved an insight) it wrongly skipped. The model is scored with k-fold
+# cross-validation so it is never tested on turns it was trained on.
+#
+# The heuristic cues in gating.py were tuned on this same transcript set, so the
+# heuristic figures (and the heuristic part of the heuristics+model line) are
+# training-set numbers: expect lower recall on conversations it hasn't seen.
+#
+# Each line of the transcript file is {"user", "ai", "has_fact", "insight_worthy"}.
+#
+# Usage: python benchmarks/eval_gating.py [--data benchmarks/data/gating_transcripts.jsonl]
+#                                         [--folds 5] [--save]
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from companion_ai import gating
+
+DEFAULT_DATA = os.path.join(os.path.dirname(__file__), "data", "gating_transcripts.jsonl")
+
+
+def load_examples(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def score(decisions: list[dict], examples: list[dict]) -> dict:
+    """Recall on positive turns and share of calls skipped, per task."""
+    report = {}
+    for task, label in (("facts", "has_fact"), ("insight", "insight_worthy")):
+        positives = [d[task] for d, ex in zip(decisions, examples) if ex[label]]
+        skipped = sum(not d[task] for d in decisions)
+        report[task] = {
+            "recall": sum(positives) / len(positives) if positives else 1.0,
+            "missed": len(positives) - sum(positives),
+            "skipped": skipped / len(decisions),
+        }
+    return report
+
+
+def cross_validate(examples: list[dict], folds: int, seed: int = 0) -> list[dict]:
+    """Decisions for every example from a gate trained on the other folds."""
+    order = list(range(len(examples)))
+    random.Random(seed).shuffle(order)
+    decisions = [None] * len(examples)
+    for fold in range(folds):
+        test = order[fold::folds]
+        held_out = set(test)
+        train = [examples[i] for i in order if i not in held_out]
+        gate = gating.TurnGate(gating.LogisticGate.fit(train))
+        for i in test:
+            decisions[i] = gate.decide(examples[i]["user"])
+    return decisions
+
+
+def print_report(name: str, report: dict):
+    for task in ("facts", "insight"):
+        r = report[task]
+        print(f"{name:<22} {task:<8} recall {r['recall']:6.1%} ({r['missed']} missed)   "
+              f"calls skipped {r['skipped']:6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calls skipped and recall of the fact/insight gate on labelled turns.")
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--save", action="store_true",
+                        help=f"train on the full set and write weights to {gating.GATE_WEIGHTS_PATH}")
+    args = parser.parse_args()
+
+    examples = load_examples(args.data)
+    n_fact = sum(ex["has_fact"] for ex in examples)
+    n_insight = sum(ex["insight_worthy"] for ex in examples)
+    print(f"{len(examples)} turns ({n_fact} with facts, {n_insight} insight-worthy)\n")
+
+    always = [{"facts": True, "insight": True} for _ in examples]
+    print_report("no gate", score(always, examples))
+
+    heuristic_gate = gating.TurnGate()
+    heuristic = [heuristic_gate.decide(ex["user"]) for ex in examples]
+    print_report("heuristics (in-sample)", score(heuristic, examples))
+
+    print_report(f"heuristics+model (cv{args.folds})", score(cross_validate(examples, args.folds), examples))
+    print("\nThe heuristic cues were tuned on this set, so heuristic recall is a training-set figure;\n"
+          "only the model part of the last line is cross-validated.")
+
+    # LLM calls per turn under the consolidated path: the summary is always requested,
+    # facts and insight only when the gate lets them through. A turn with neither is a
+    # plain summary call.
+    keys = sum(d["facts"] + d["insight"] for d in heuristic) / len(examples)
+    print(f"\nHeuristic gate: {keys:.2f} of 2 optional parts requested per turn, "
+          f"{sum(not d['facts'] and not d['insight'] for d in heuristic)} summary-only turns")
+
+    if args.save:
+        os.makedirs(os.path.dirname(gating.GATE_WEIGHTS_PATH), exist_ok=True)
+        gating.LogisticGate.fit(examples).save()
+        print(f"Saved weights to {gating.GATE_WEIGHTS_PATH}")
+
+
+if __name__ == '__main__':
+    main()
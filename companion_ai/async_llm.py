@@ -0,0 +1,250 @@
+# companion_ai/async_llm.py
+#
+# Asyncio client for the LLM: awaitable generate/stream calls with per-call
+# deadlines, bounded concurrency, retries with jittered exponential backoff and
+# optional hedged requests. Backends are small adapters, so the same client runs
+# against Gemini or against FakeBackend for testing slow or failing responses.
+
+import asyncio
+import random
+import time
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when a call (including its retries) runs past its deadline."""
+
+
+# --- Backends ---
+
+class GeminiBackend:
+    """Adapter over a google.generativeai GenerativeModel's async API.
+
+    `model_getter` is called per request so callers can rotate the model (e.g. when
+    cached content expires). `generation_config` is passed through unchanged.
+    """
+
+    def __init__(self, model_getter, generation_config=None):
+        self.model_getter = model_getter
+        self.generation_config = generation_config
+
+    async def generate(self, prompt) -> str:
+        response = await self.model_getter().generate_content_async(prompt, generation_config=self.generation_config)
+        return response.text
+
+    async def stream(self, prompt):
+        response = await self.model_getter().generate_content_async(
+            prompt, generation_config=self.generation_config, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend:
+    """Local stand-in with configurable latency and failures.
+
+    - `latency` (+ uniform `jitter`) before a reply; for streams, before the first chunk
+    - `token_delay` between streamed chunks
+    - `failure_rate` chance that a call raises `ConnectionError`
+    - `slow_rate` chance that a call takes `slow_latency` instead (tail latency)
+    """
+
+    def __init__(self, reply: str = "Hello there! It's good to hear from you.", latency: float = 0.05,
+                 jitter: float = 0.0, token_delay: float = 0.01, failure_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 2.0, seed: int | None = None):
+        self.reply = reply
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    async def _wait_first(self):
+        self.calls += 1
+        delay = self.slow_latency if self._rng.random() < self.slow_rate else self.latency
+        await asyncio.sleep(delay + self._rng.uniform(0, self.jitter))
+        if self._rng.random() < self.failure_rate:
+            raise ConnectionError("FakeBackend: simulated failure")
+
+    async def generate(self, prompt) -> str:
+        await self._wait_first()
+        return self.reply
+
+    async def stream(self, prompt):
+        await self._wait_first()
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+
+def _discard(result):
+    """Releases the result of a losing hedged attempt (an opened stream needs closing)."""
+    if isinstance(result, tuple) and result and hasattr(result[0], "aclose"):
+        asyncio.ensure_future(result[0].aclose())
+
+
+# --- Client ---
+
+class AsyncLLMClient:
+    """Deadlines, retries, concurrency limits and hedging around an LLM backend.
+
+    - At most `max_concurrency` requests are in flight; extra calls wait their turn.
+    - Each call has a deadline (`timeout`, overridable per call) covering all attempts.
+    - Failed attempts are retried up to `retries` times, sleeping a random time in
+      [0, min(backoff_max, backoff_base * 2**attempt)] ("full jitter") in between.
+    - With `hedge=True`, a second identical request is started if the first hasn't
+      answered (or, for streams, produced its first chunk) after `hedge_after`
+      seconds; whichever answers first wins and the other is cancelled.
+    """
+
+    def __init__(self, backend, max_concurrency: int = 4, timeout: float = 30.0, retries: int = 2,
+                 backoff_base: float = 0.25, backoff_max: float = 4.0, hedge_after: float = 1.5,
+                 retry_on: tuple = (ConnectionError, TimeoutError, OSError)):
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.retry_on = retry_on
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "timeouts": 0,
+                      "hedges_started": 0, "hedges_won": 0}
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _with_retries(self, attempt_fn, deadline: float, hedge: bool):
+        """Runs `attempt_fn()` (optionally hedged) until it succeeds, retries run out or the deadline passes."""
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stats["timeouts"] += 1
+                raise LLMTimeoutError("LLM call exceeded its deadline")
+            try:
+                try:
+                    if hedge:
+                        return await asyncio.wait_for(self._hedged(attempt_fn), remaining)
+                    return await asyncio.wait_for(self._attempt(attempt_fn), remaining)
+                except asyncio.TimeoutError:
+                    # asyncio.TimeoutError is the builtin TimeoutError, so this also catches
+                    # timeouts raised by the backend; only the deadline passing ends the call.
+                    if time.monotonic() < deadline:
+                        raise
+                    self.stats["timeouts"] += 1
+                    raise LLMTimeoutError("LLM call exceeded its deadline") from None
+            except LLMTimeoutError:
+                raise
+            except self.retry_on as e:
+                if attempt >= self.retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                delay = min(self._backoff(attempt), max(0.0, deadline - time.monotonic()))
+                print(f"WARN: LLM call failed ({e}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _attempt(self, attempt_fn):
+        async with self._semaphore:
+            self.stats["attempts"] += 1
+            return await attempt_fn()
+
+    async def _hedged(self, attempt_fn):
+        primary = asyncio.create_task(self._attempt(attempt_fn))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done or self._semaphore.locked():
+            # Answered in time, or no free slot to hedge with.
+            return await primary
+
+        self.stats["hedges_started"] += 1
+        backup = asyncio.create_task(self._attempt(attempt_fn))
+        pending, winner, error = {primary, backup}, None, None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and winner is None:
+                        winner = task
+                    elif task.exception() is not None:
+                        error = task.exception()
+            if winner is None:
+                raise error
+            if winner is backup:
+                self.stats["hedges_won"] += 1
+            return winner.result()
+        finally:
+            for task in (primary, backup):
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    _discard(task.result())
+
+    async def generate(self, prompt, timeout: float | None = None, hedge: bool = False) -> str:
+        """Returns the full reply text."""
+        self.stats["calls"] += 1
+        deadline = time.monotonic() + (timeout or self.timeout)
+        return await self._with_retries(lambda: self.backend.generate(prompt), deadline, hedge)
+
+    async def stream(self, prompt, timeout: float | None = None, hedge: bool = False):
+        """Yields the reply as it is generated.
+
+        Retries and hedging only apply until the first chunk arrives; after that a
+        failure ends the stream (the caller may already have spoken part of it).
+        """
+        self.stats["calls"] += 1
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        async def open_stream():
+            agen = self.backend.stream(prompt)
+            try:
+                first = await agen.__anext__()
+            except BaseException:
+                await agen.aclose()
+                raise
+            return agen, first
+
+        agen, first = await self._with_retries(open_stream, deadline, hedge)
+        try:
+            yield first
+            async with self._semaphore:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["timeouts"] += 1
+                        raise LLMTimeoutError("LLM stream exceeded its deadline")
+                    try:
+                        chunk = await asyncio.wait_for(agen.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        if time.monotonic() < deadline:
+                            raise  # The backend's own timeout, not the deadline
+                        self.stats["timeouts"] += 1
+                        raise LLMTimeoutError("LLM stream exceeded its deadline") from None
+                    yield chunk
+        finally:
+            await agen.aclose()
+
+
+# --- Bridging ---
+
+def iterate_in_thread(async_iterable, loop: asyncio.AbstractEventLoop):
+    """Consumes an async iterable from a worker thread, one item at a time.
+
+    Lets thread-based consumers (like StreamingSpeechPipeline) read a stream that
+    lives on the event loop without blocking the loop.
+    """
+    iterator = async_iterable.__aiter__()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(iterator.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
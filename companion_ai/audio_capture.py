@@ -0,0 +1,334 @@
+# companion_ai/audio_capture.py
+#
+# Microphone capture and endpointing.
+#
+# - CaptureEngine keeps one PyAudio input stream open for the whole session instead
+#   of reopening it every turn.
+# - A preallocated ring buffer holds the last fraction of a second of audio, so the
+#   start of an utterance (the "pre-roll") isn't clipped by the detector's reaction time.
+# - The default detector adapts its threshold to the measured noise floor and uses
+#   separate on/off thresholds plus a hangover period, without per-chunk allocations.
+# - Endpointing is a pure function of the PCM it is fed, so any decision can be
+#   reproduced offline with `replay_endpoints()` / `python -m companion_ai.audio_capture file.wav`.
+
+import sys
+import wave
+
+import numpy as np
+
+
+class PcmRingBuffer:
+    """Fixed-size ring of int16 samples. Writing never allocates."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self._pos = 0
+        self._filled = 0
+
+    def write(self, samples: np.ndarray):
+        n = len(samples)
+        if n >= self.capacity:
+            self._data[:] = samples[-self.capacity:]
+            self._pos, self._filled = 0, self.capacity
+            return
+        first = min(n, self.capacity - self._pos)
+        self._data[self._pos:self._pos + first] = samples[:first]
+        self._data[:n - first] = samples[first:]
+        self._pos = (self._pos + n) % self.capacity
+        self._filled = min(self.capacity, self._filled + n)
+
+    def read_all(self) -> np.ndarray:
+        """Returns a copy of the buffered samples, oldest first."""
+        if self._filled < self.capacity:
+            return self._data[:self._filled].copy()
+        return np.concatenate((self._data[self._pos:], self._data[:self._pos]))
+
+    def clear(self):
+        self._pos = self._filled = 0
+
+
+# --- Voice Activity Detectors ---
+
+class VoiceDetector:
+    """Interface for frame-level speech detectors used by the Endpointer.
+
+    `is_speech(samples, in_speech)` gets one frame of int16 samples and whether the
+    endpointer currently considers the user to be talking (for hysteresis).
+    """
+
+    def is_speech(self, samples: np.ndarray, in_speech: bool) -> bool:
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class AdaptiveEnergyDetector(VoiceDetector):
+    """RMS energy detector whose threshold follows the background noise level.
+
+    The noise floor is tracked with minimum statistics: the quietest frame of the
+    last `floor_window` frames, smoothed. Pauses between words keep it honest during
+    speech, and it catches up with a noisier room within one window. Speech starts
+    above `floor * on_ratio` and, once started, continues until energy drops below
+    `floor * off_ratio`. `min_threshold` stops a near-silent room from making the
+    detector trigger on breathing.
+    """
+
+    def __init__(self, frame_size: int = 1024, min_threshold: float = 150.0,
+                 on_ratio: float = 3.0, off_ratio: float = 2.0,
+                 floor_window: int = 48, floor_smoothing: float = 0.2):
+        self.min_threshold = min_threshold
+        self.on_ratio = on_ratio
+        self.off_ratio = off_ratio
+        self.floor_smoothing = floor_smoothing
+        self.noise_floor = 0.0
+        self.last_rms = 0.0
+        self._scratch = np.zeros(frame_size, dtype=np.float32)
+        self._history = np.full(max(1, floor_window), np.inf, dtype=np.float32)
+        self._history_pos = 0
+
+    def reset(self):
+        self.noise_floor = 0.0
+        self._history.fill(np.inf)
+        self._history_pos = 0
+
+    def rms(self, samples: np.ndarray) -> float:
+        n = len(samples)
+        if n == 0:
+            return 0.0
+        if n > len(self._scratch):
+            self._scratch = np.zeros(n, dtype=np.float32)
+        scratch = self._scratch[:n]
+        np.copyto(scratch, samples, casting="unsafe")
+        return float(np.sqrt(np.dot(scratch, scratch) / n))
+
+    def threshold(self, in_speech: bool) -> float:
+        ratio = self.off_ratio if in_speech else self.on_ratio
+        return max(self.min_threshold, self.noise_floor * ratio)
+
+    def is_speech(self, samples: np.ndarray, in_speech: bool) -> bool:
+        self.last_rms = level = self.rms(samples)
+        self._history[self._history_pos] = level
+        self._history_pos = (self._history_pos + 1) % len(self._history)
+        target = float(self._history.min())
+        if self.noise_floor == 0.0:
+            self.noise_floor = target
+        else:
+            self.noise_floor += self.floor_smoothing * (target - self.noise_floor)
+        return level > self.threshold(in_speech)
+
+
+# --- Endpointing ---
+
+class Endpointer:
+    """Turns a stream of frames into utterances.
+
+    - `start_frames` consecutive speech frames are needed to start an utterance.
+    - `pre_roll_samples` of audio from before the start are prepended to it.
+    - The utterance ends after `hangover_frames` consecutive non-speech frames.
+    - With `pause_frames` set (fewer than `hangover_frames`), that many non-speech
+      frames report a "pause", and speech after a pause reports "resume".
+
+    `process()` returns "start", "pause", "resume", "end" or None for every frame.
+    After "end", `utterance()` holds the audio.
+    """
+
+    def __init__(self, detector: VoiceDetector, start_frames: int = 2,
+                 hangover_frames: int = 15, pre_roll_samples: int = 8000, pause_frames: int | None = None):
+        self.detector = detector
+        self.start_frames = start_frames
+        self.hangover_frames = hangover_frames
+        self.pause_frames = pause_frames
+        self.paused = False
+        self.pre_roll = PcmRingBuffer(max(1, pre_roll_samples))
+        self.in_speech = False
+        self._speech_run = 0
+        self._silence_run = 0
+        self._utterance = bytearray()
+        self._pending = bytearray()  # Frames between the first speech frame and the start decision
+        self.samples_seen = 0
+        self.start_sample = None
+
+    def reset(self):
+        self.in_speech = False
+        self.paused = False
+        self._speech_run = self._silence_run = 0
+        self._utterance = bytearray()
+        self._pending = bytearray()
+        self.pre_roll.clear()
+        self.start_sample = None
+
+    def utterance(self) -> bytes:
+        return bytes(self._utterance)
+
+    def process(self, frame: bytes) -> str | None:
+        samples = np.frombuffer(frame, dtype=np.int16)
+        self.samples_seen += len(samples)
+        speech = self.detector.is_speech(samples, self.in_speech)
+
+        if not self.in_speech:
+            if speech:
+                self._speech_run += 1
+                self._pending += frame
+                if self._speech_run >= self.start_frames:
+                    self.in_speech = True
+                    self._silence_run = 0
+                    pre_roll = self.pre_roll.read_all()
+                    self.start_sample = self.samples_seen - len(self._pending) // 2 - len(pre_roll)
+                    self._utterance = bytearray(pre_roll.tobytes())
+                    self._utterance += self._pending
+                    self._pending = bytearray()
+                    return "start"
+                return None
+            # A blip that didn't last long enough: it becomes part of the pre-roll.
+            if self._pending:
+                self.pre_roll.write(np.frombuffer(bytes(self._pending), dtype=np.int16))
+                self._pending = bytearray()
+            self._speech_run = 0
+            self.pre_roll.write(samples)
+            return None
+
+        self._utterance += frame
+        if speech:
+            self._silence_run = 0
+            if self.paused:
+                self.paused = False
+                return "resume"
+        else:
+            self._silence_run += 1
+            if self._silence_run > self.hangover_frames:
+                self.in_speech = False
+                self.paused = False
+                self._speech_run = 0
+                self.pre_roll.clear()
+                return "end"
+            if self._silence_run == self.pause_frames:
+                self.paused = True
+                return "pause"
+        return None
+
+
+class CaptureEngine:
+    """Long-lived microphone capture that yields one utterance per `read_utterance()` call.
+
+    The input stream is opened once and kept open, so a turn doesn't pay for opening
+    the device, and the detector's noise floor carries over from turn to turn. Nothing
+    reads the stream between read_utterance() calls; audio buffered in the meantime
+    (which may include the companion's own reply) is dropped when the next call starts.
+
+    Barge-in: while the companion is speaking the microphone also hears the speaker,
+    so an utterance must last `barge_in_frames` speech frames (instead of
+    `start_frames`) before it interrupts playback.
+
+    `pause_seconds`, if set, is the shorter silence after which read_utterance()
+    reports a pause (used to start speculative replies).
+    """
+
+    def __init__(self, pya, rate: int = 16000, chunk: int = 1024, detector: VoiceDetector | None = None,
+                 pre_roll_seconds: float = 0.3, silence_seconds: float = 1.0, start_frames: int = 2,
+                 barge_in_frames: int = 6, pause_seconds: float | None = None):
+        self.pya = pya
+        self.rate = rate
+        self.chunk = chunk
+        self.start_frames = start_frames
+        self.barge_in_frames = barge_in_frames
+        self.detector = detector or AdaptiveEnergyDetector(frame_size=chunk)
+        self.endpointer = Endpointer(
+            self.detector,
+            start_frames=start_frames,
+            hangover_frames=int(silence_seconds * rate / chunk),
+            pre_roll_samples=int(pre_roll_seconds * rate),
+            pause_frames=max(1, int(pause_seconds * rate / chunk)) if pause_seconds else None,
+        )
+        self._stream = None
+
+    def open(self):
+        if self._stream is None:
+            import pyaudio
+            self._stream = self.pya.open(format=pyaudio.paInt16, channels=1, rate=self.rate,
+                                         input=True, frames_per_buffer=self.chunk)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+
+    def _drain(self):
+        """Drops whatever the input stream buffered since the last read."""
+        available = self._stream.get_read_available()
+        while available >= self.chunk:
+            self._stream.read(self.chunk, exception_on_overflow=False)
+            available -= self.chunk
+        if available > 0:
+            self._stream.read(available, exception_on_overflow=False)
+
+    def read_utterance(self, stop_event=None, discard=None, on_start=None, on_frame=None,
+                       on_barge_in=None, on_pause=None, on_resume=None) -> bytes:
+        """Blocks until an utterance has been captured and returns its 16-bit PCM.
+
+        - `stop_event` (threading/asyncio Event): return b"" once it is set.
+        - `discard()`: while it returns True (e.g. while the companion is speaking),
+          frames are thrown away and any utterance in progress is dropped, unless
+          `on_barge_in` is given.
+        - `on_barge_in()`: with this set, speech that starts while `discard()` is True
+          calls it (the caller stops playback) and is captured as the next utterance.
+        - `on_start()` is called when speech starts; `on_frame(bytes)` for every frame
+          that becomes part of the utterance, including the pre-roll.
+        - `on_pause()` / `on_resume()` are called when the user pauses for
+          `pause_seconds` within the utterance and when they carry on talking.
+        """
+        self.open()
+        self._drain()
+        self.endpointer.reset()
+        while not (stop_event and stop_event.is_set()):
+            data = self._stream.read(self.chunk, exception_on_overflow=False)
+            barging = bool(discard and discard())
+            if barging and on_barge_in is None:
+                self.endpointer.reset()
+                continue
+            self.endpointer.start_frames = self.barge_in_frames if barging else self.start_frames
+            event = self.endpointer.process(data)
+            if event == "start":
+                if barging: on_barge_in()
+                if on_start: on_start()
+                if on_frame: on_frame(self.endpointer.utterance())
+            elif event == "end":
+                if on_frame: on_frame(data)
+                return self.endpointer.utterance()
+            else:
+                if self.endpointer.in_speech and on_frame:
+                    on_frame(data)
+                if event == "pause" and on_pause: on_pause()
+                elif event == "resume" and on_resume: on_resume()
+        return b""
+
+
+# --- Offline Replay ---
+
+def replay_endpoints(pcm_bytes: bytes, endpointer: Endpointer, chunk: int = 1024) -> list[tuple[int, int]]:
+    """Runs recorded PCM through an endpointer and returns (start, end) sample offsets of each utterance."""
+    utterances = []
+    chunk_bytes = chunk * 2
+    for offset in range(0, len(pcm_bytes) - chunk_bytes + 1, chunk_bytes):
+        event = endpointer.process(pcm_bytes[offset:offset + chunk_bytes])
+        if event == "end":
+            utterances.append((endpointer.start_sample, endpointer.samples_seen))
+    if endpointer.in_speech:
+        utterances.append((endpointer.start_sample, endpointer.samples_seen))
+    return utterances
+
+
+if __name__ == "__main__":
+    # Usage: python -m companion_ai.audio_capture recording.wav
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python -m companion_ai.audio_capture recording.wav (16-bit mono)")
+    with wave.open(sys.argv[1], "rb") as wav:
+        rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    chunk = 1024
+    endpointer = Endpointer(AdaptiveEnergyDetector(frame_size=chunk),
+                            hangover_frames=int(1.0 * rate / chunk), pre_roll_samples=int(0.3 * rate))
+    for start, end in replay_endpoints(pcm, endpointer, chunk):
+        print(f"{start / rate:8.2f}s - {end / rate:8.2f}s")
@@ -0,0 +1,204 @@
+# companion_ai/compaction.py
+#
+# Keeps the memory tables from growing by one summary and one insight per turn
+# forever. A background job rolls per-turn rows older than a few days into one
+# digest per day, rolls old daily digests into one per week, drops weekly digests
+# past the retention limit, and hands the freed pages back to the filesystem with
+# PRAGMA incremental_vacuum.
+#
+# Digests live in the same tables as per-turn rows (level = 'day' / 'week', see the
+# schema migrations in memory.py), so the context and retrieval code read them
+# without changes. Each digest is written, and the rows it replaces deleted, in one
+# short transaction, so the voice loop's own writes are never blocked for long.
+
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from companion_ai import memory
+
+# --- Retention Policy ---
+# Per-turn rows are kept for TURN_RETENTION_DAYS, daily digests for
+# DAILY_RETENTION_DAYS, weekly digests for WEEKLY_RETENTION_DAYS (0 = forever).
+TURN_RETENTION_DAYS = int(os.getenv("COMPANION_TURN_RETENTION_DAYS", "7"))
+DAILY_RETENTION_DAYS = int(os.getenv("COMPANION_DAILY_RETENTION_DAYS", "60"))
+WEEKLY_RETENTION_DAYS = int(os.getenv("COMPANION_WEEKLY_RETENTION_DAYS", "0"))
+COMPACTION_INTERVAL_SECONDS = 15 * 60
+DIGEST_MAX_CHARS = 1200
+VACUUM_PAGES_PER_STEP = 256  # Pages released per incremental_vacuum call (4 KiB each by default)
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def extractive_digest(texts: list[str], max_chars: int = DIGEST_MAX_CHARS) -> str:
+    """Joins the distinct sentences of `texts` (oldest first) up to `max_chars`.
+
+    Sentences that repeat an earlier one word for word (ignoring case and
+    punctuation) are dropped, which removes most of the overlap between
+    consecutive turn summaries without an LLM call.
+    """
+    seen = set()
+    parts = []
+    length = 0
+    for text in texts:
+        for sentence in _SENTENCE.split(text.strip()):
+            key = tuple(_WORD.findall(sentence.lower()))
+            if not key or key in seen:
+                continue
+            if length + len(sentence) + 1 > max_chars:
+                return " ".join(parts)
+            seen.add(key)
+            parts.append(sentence)
+            length += len(sentence) + 1
+    return " ".join(parts)
+
+
+def _week_start(day: str) -> str:
+    date = datetime.strptime(day, "%Y-%m-%d")
+    return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+
+
+class RetentionPolicy:
+    """How long each level is kept before it is rolled up (or, for weeks, dropped)."""
+
+    def __init__(self, turn_days: int = TURN_RETENTION_DAYS, daily_days: int = DAILY_RETENTION_DAYS,
+                 weekly_days: int = WEEKLY_RETENTION_DAYS):
+        if daily_days < turn_days:
+            raise ValueError("daily_days must be at least turn_days")
+        self.turn_days = turn_days
+        self.daily_days = daily_days
+        self.weekly_days = weekly_days
+
+
+class Compactor:
+    """Rolls old memory rows into daily/weekly digests, applies retention and vacuums.
+
+    `run_once()` does one pass (at most `max_periods` digests per kind, so a large
+    backlog is worked off over several passes); `start()` runs passes on a daemon
+    thread every `interval` seconds. `digest_fn(texts, level)` writes a digest's
+    text; the default is extractive_digest(). `stats` accumulates over passes.
+    """
+
+    def __init__(self, store: memory.MemoryStore, policy: RetentionPolicy | None = None, digest_fn=None,
+                 max_periods: int | None = 200):
+        self.store = store
+        self.policy = policy or RetentionPolicy()
+        self.digest_fn = digest_fn or (lambda texts, level: extractive_digest(texts))
+        self.max_periods = max_periods
+        self.stats = {"passes": 0, "digests_written": 0, "rows_compacted": 0, "rows_expired": 0,
+                      "pages_freed": 0, "last_pass_seconds": 0.0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Background Thread ---
+
+    def start(self, interval: float = COMPACTION_INTERVAL_SECONDS) -> "Compactor":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="memory-compaction", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"ERROR: Memory compaction failed: {e}")
+            self._stop.wait(interval)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # --- Passes ---
+
+    def run_once(self, now: datetime | None = None) -> dict:
+        """One compaction pass. Returns what this pass did (same keys as `stats`)."""
+        start = time.perf_counter()
+        today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        turn_cutoff = (today - timedelta(days=self.policy.turn_days)).strftime("%Y-%m-%d")
+        # Weeks are rolled up only once they are entirely past the daily retention.
+        daily_cutoff = _week_start((today - timedelta(days=self.policy.daily_days)).strftime("%Y-%m-%d"))
+
+        result = {"digests_written": 0, "rows_compacted": 0, "rows_expired": 0, "pages_freed": 0}
+        for kind in memory.MEMORY_TABLES:
+            self._roll_up(kind, "turn", "day", turn_cutoff, lambda day: day, result)
+            self._roll_up(kind, "day", "week", daily_cutoff, _week_start, result)
+            if self.policy.weekly_days:
+                expiry = (today - timedelta(days=self.policy.weekly_days)).strftime("%Y-%m-%d")
+                self._expire(kind, expiry, result)
+        result["pages_freed"] = self.vacuum()
+
+        result["last_pass_seconds"] = time.perf_counter() - start
+        for key in ("digests_written", "rows_compacted", "rows_expired", "pages_freed"):
+            self.stats[key] += result[key]
+        self.stats["passes"] += 1
+        self.stats["last_pass_seconds"] = result["last_pass_seconds"]
+        return result
+
+    def _roll_up(self, kind: str, level: str, into: str, cutoff: str, period_of, result: dict):
+        """Replaces `level` rows dated before `cutoff` with one `into` digest per period."""
+        table, column = memory.MEMORY_TABLES[kind]
+        span = timedelta(days=1 if into == "day" else 7)
+        periods = sorted({period_of(row["day"]) for row in self.store._read(
+            f"SELECT DISTINCT substr(timestamp, 1, 10) AS day FROM {table} WHERE level = ? AND timestamp < ?",
+            (level, cutoff))})
+
+        for period in periods[:self.max_periods]:
+            end = (datetime.strptime(period, "%Y-%m-%d") + span).strftime("%Y-%m-%d")
+            # Any digest already written for this period is folded into the new one.
+            rows = self.store._read(f'''
+                SELECT id, timestamp, {column} AS text, source_count FROM {table}
+                WHERE (level = ? AND timestamp >= ? AND timestamp < ?) OR (level = ? AND period_start = ?)
+                ORDER BY timestamp
+            ''', (level, period, end, into, period))
+            if not rows:
+                continue
+            text = self.digest_fn([row["text"] for row in rows], into)
+            self.store.add_digest(
+                kind, text, level=into, period_start=period, timestamp=rows[-1]["timestamp"],
+                source_count=sum(row["source_count"] for row in rows), replaces=[row["id"] for row in rows])
+            result["digests_written"] += 1
+            result["rows_compacted"] += len(rows)
+
+    def _expire(self, kind: str, expiry: str, result: dict):
+        table, _ = memory.MEMORY_TABLES[kind]
+        ids = [row["id"] for row in self.store._read(
+            f"SELECT id FROM {table} WHERE level = 'week' AND period_start < ?", (expiry,))]
+        self.store.delete_memories(kind, ids)
+        result["rows_expired"] += len(ids)
+
+    def vacuum(self) -> int:
+        """Releases free pages in small steps so no single step holds the write lock long. Returns pages freed."""
+        conn = self.store.connection()
+        freed = 0
+        while True:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free == 0:
+                break
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})").fetchall()
+            conn.commit()
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if after >= free:
+                break  # auto_vacuum is off for this database (init_db not run yet)
+            freed += free - after
+        if freed:
+            # In WAL mode the file only shrinks once the truncation is checkpointed.
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        return freed
+
+
+if __name__ == "__main__":
+    # One pass over the app's database: python -m companion_ai.compaction
+    memory.init_db()
+    before = os.path.getsize(memory.DB_PATH)
+    result = Compactor(memory.get_store(), max_periods=None).run_once()
+    print(f"Wrote {result['digests_written']} digests replacing {result['rows_compacted']} rows, "
+          f"expired {result['rows_expired']}, freed {result['pages_freed']} pages "
+          f"({before / 1024:.0f} KiB -> {os.path.getsize(memory.DB_PATH) / 1024:.0f} KiB) "
+          f"in {result['last_pass_seconds']:.2f}s")
@@ -0,0 +1,146 @@
+# companion_ai/dialogue.py
+#
+# Short-term memory of the conversation in progress, so follow-ups like "what did
+# you mean by that?" have something to refer to. The most recent turns are kept
+# verbatim up to a token budget; when a new turn pushes the oldest ones out, they
+# are folded into a running summary by one small LLM call in the background. The
+# reply prompt therefore carries at most HISTORY_TOKEN_BUDGET tokens of history, no
+# matter how long the session has been going.
+#
+# Turns and the summary live in the memory database (dialogue_turns and
+# dialogue_summary, see the schema migrations in memory.py), so the conversation
+# picks up where it left off after a restart. A turn is deleted only in the same
+# transaction that writes the summary covering it; turns whose fold never ran are
+# folded after the next start.
+
+import asyncio
+import re
+
+from companion_ai import memory
+from companion_ai.prompt_builder import HISTORY_TOKEN_BUDGET, estimate_tokens
+
+HISTORY_SUMMARY_TOKENS = 150  # Part of HISTORY_TOKEN_BUDGET reserved for the running summary
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def fallback_fold(summary: str, turns: list[tuple[str, str]], max_tokens: int) -> str:
+    """Folds turns into the summary without an LLM: appends them, then keeps the newest sentences that fit."""
+    added = " ".join(f"The user said: {user.strip()} The AI replied: {ai.strip()}" for user, ai in turns)
+    sentences = _SENTENCE.split(f"{summary} {added}".strip())
+    kept, used = [], 0
+    for sentence in reversed(sentences):
+        cost = estimate_tokens(sentence + " ")
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if not kept and sentences:  # A single sentence longer than the budget: keep its end
+        return sentences[-1][-max_tokens * 4:]
+    return " ".join(reversed(kept))
+
+
+class DialogueHistory:
+    """Token-bounded ring of recent turns plus a running summary of the earlier ones, on a MemoryStore.
+
+    Use it from one event loop: load() once (it blocks, so off the loop), await add()
+    after every reply and pass context() to the prompt as memory_context["dialogue"].
+    add() starts the fold of any turns it pushed out; `fold_fn(summary, turns,
+    max_tokens)` is awaited to produce the new summary (default:
+    llm_interface.fold_dialogue_async), with fallback_fold() if it fails. Database
+    writes run in a worker thread.
+    """
+
+    def __init__(self, store: memory.MemoryStore, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 summary_tokens: int = HISTORY_SUMMARY_TOKENS, fold_fn=None):
+        self.store = store
+        self.turn_budget = token_budget - summary_tokens
+        self.summary_tokens = summary_tokens
+        if fold_fn is None:
+            from companion_ai import llm_interface
+            fold_fn = llm_interface.fold_dialogue_async
+        self.fold_fn = fold_fn
+        self.summary = ""
+        self.turns: list[dict] = []     # Kept verbatim, oldest first: {"id", "user", "ai", "tokens"}
+        self.folding: list[dict] = []   # Pushed out of the ring, not yet in the summary
+        self._turn_tokens = 0
+        self._fold_task: asyncio.Task | None = None
+        self._add_lock = asyncio.Lock()  # Keeps turns in the ring in id order
+        self.stats = {"turns": 0, "folds": 0, "turns_folded": 0, "fold_fallbacks": 0}
+
+    def load(self) -> "DialogueHistory":
+        """Reads the summary and unfolded turns from the store (after a restart, say)."""
+        self.summary, rows = self.store.get_dialogue()
+        self.turns, self.folding, self._turn_tokens = [], [], 0
+        for row in rows:
+            self._push(row["id"], row["user_message"], row["ai_response"])
+        return self
+
+    def _push(self, turn_id: int, user_message: str, ai_response: str):
+        tokens = estimate_tokens(f"User: {user_message}\nAI: {ai_response}\n")
+        self.turns.append({"id": turn_id, "user": user_message, "ai": ai_response, "tokens": tokens})
+        self._turn_tokens += tokens
+        # The newest turn always stays, even on its own over budget.
+        while self._turn_tokens > self.turn_budget and len(self.turns) > 1:
+            oldest = self.turns.pop(0)
+            self._turn_tokens -= oldest["tokens"]
+            self.folding.append(oldest)
+
+    async def add(self, user_message: str, ai_response: str):
+        """Records one exchange and starts folding whatever it pushed out of the ring."""
+        if not user_message or not ai_response:
+            return
+        async with self._add_lock:
+            turn_id = await asyncio.to_thread(self.store.add_dialogue_turn, user_message, ai_response)
+            self._push(turn_id, user_message, ai_response)
+        self.stats["turns"] += 1
+        self.schedule_fold()
+
+    def context(self) -> dict:
+        """The dialogue for memory_context["dialogue"] (see PromptBuilder.build_history).
+
+        Turns still being folded are included, so nothing drops out of the prompt
+        while the summary catches up; the prompt builder trims to its budget.
+        """
+        return {"summary": self.summary,
+                "turns": [{"user": t["user"], "ai": t["ai"]} for t in self.folding + self.turns]}
+
+    # --- Folding ---
+
+    def schedule_fold(self):
+        if self.folding and (self._fold_task is None or self._fold_task.done()):
+            self._fold_task = asyncio.create_task(self._fold_pending())
+
+    async def _fold_pending(self):
+        while self.folding:
+            await self.fold()
+
+    async def fold(self):
+        """Folds the turns pushed out so far into the summary and persists both together."""
+        batch = list(self.folding)
+        if not batch:
+            return
+        pairs = [(t["user"], t["ai"]) for t in batch]
+        try:
+            summary = await self.fold_fn(self.summary, pairs, self.summary_tokens)
+            if not summary:
+                raise ValueError("empty summary")
+            summary = fallback_fold(summary, [], self.summary_tokens)  # Trims an over-long answer
+        except Exception as e:
+            print(f"WARN: Dialogue summary update failed, keeping an extractive one: {e}")
+            summary = fallback_fold(self.summary, pairs, self.summary_tokens)
+            self.stats["fold_fallbacks"] += 1
+        await asyncio.to_thread(self.store.fold_dialogue, summary, batch[-1]["id"])
+        self.summary = summary
+        del self.folding[:len(batch)]
+        self.stats["folds"] += 1
+        self.stats["turns_folded"] += len(batch)
+
+    async def stop(self, timeout: float = 5.0):
+        """Gives a running fold up to `timeout` seconds; unfolded turns are still in the store."""
+        task = self._fold_task
+        if task is not None and not task.done():
+            try:
+                await asyncio.wait_for(task, timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
@@ -0,0 +1,199 @@
+# companion_ai/gating.py
+#
+# Cheap, local per-turn decision on whether fact extraction and insight generation
+# are worth an LLM call. "ok", "thanks" or "what time is it" almost never reveal a
+# fact about the user, so those turns only get a summary.
+#
+# The gate combines hand-written cues with an optional logistic-regression model over
+# the same features. Weights are trained with benchmarks/eval_gating.py and loaded
+# from GATE_WEIGHTS_PATH when that file exists; without it, the heuristics decide alone.
+
+import json
+import math
+import os
+import re
+
+from companion_ai.memory import DATA_DIR
+
+GATE_WEIGHTS_PATH = os.path.join(DATA_DIR, "gate_weights.json")
+
+# Decision thresholds on the final score (probability-like, 0..1). Set low on purpose:
+# a missed fact costs more than a wasted call.
+FACT_THRESHOLD = 0.35
+INSIGHT_THRESHOLD = 0.35
+
+_WORD = re.compile(r"[a-z']+")
+FILLER = frozenset(
+    "ok okay k yes yeah yep yup no nope nah sure thanks thank you thx cool nice great fine alright "
+    "right hmm hm uh um oh ah lol haha wow hi hey hello bye goodbye night morning got it".split()
+)
+FIRST_PERSON = frozenset("i i'm i've i'd i'll me my mine myself we we're our".split())
+FACT_CUES = (
+    "my name", "call me", "i am a", "i'm a", "i work", "i'm working", "my job", "i live", "i'm from",
+    "i grew up", "years old", "my birthday", "born", "i study", "i'm studying", "my favorite", "my favourite",
+    "i like", "i love", "i hate", "i enjoy", "i prefer", "i can't stand", "my wife", "my husband",
+    "my partner", "my girlfriend", "my boyfriend", "my son", "my daughter", "my mom", "my dad", "my mother",
+    "my father", "my brother", "my sister", "my dog", "my cat", "i have a", "i've got a", "i own",
+    "i'm allergic", "i'm learning", "i've been learning", "my goal", "i want to", "i'm planning", "i plan to",
+    "i'm building", "my project", "i moved", "i speak",
+)
+FEELING_CUES = (
+    "feel", "feeling", "felt", "tired", "stressed", "anxious", "worried", "excited", "happy", "sad",
+    "frustrated", "angry", "lonely", "overwhelmed", "proud", "nervous", "scared", "bored", "exhausted",
+    "exhausting", "stressful", "struggling", "can't sleep", "hard day", "rough day", "good day", "bad day",
+    "motivated",
+)
+
+FEATURES = ("bias", "log_words", "first_person", "fact_cue", "feeling_cue", "filler_only",
+            "question", "number", "capitalized_name")
+
+
+def extract_features(user_message: str) -> dict[str, float]:
+    """Numeric features of one user message (all cheap string operations)."""
+    text = user_message.lower().strip()
+    words = _WORD.findall(text)
+    n = len(words)
+    return {
+        "bias": 1.0,
+        "log_words": math.log1p(n),
+        "first_person": float(any(w in FIRST_PERSON for w in words)),
+        "fact_cue": float(any(cue in text for cue in FACT_CUES)),
+        "feeling_cue": float(any(cue in text for cue in FEELING_CUES)),
+        "filler_only": float(n > 0 and all(w in FILLER for w in words)),
+        "question": float(text.endswith("?")),
+        "number": float(any(ch.isdigit() for ch in text)),
+        "capitalized_name": float(_has_capitalized_name(user_message)),
+    }
+
+
+def _has_capitalized_name(user_message: str) -> bool:
+    """A capitalized word that doesn't start a sentence (and isn't "I") is often a name or place."""
+    sentence_start = True
+    for token in user_message.split():
+        word = token.strip("\"'()[]")
+        if word[:1].isupper() and not sentence_start and word.split("'")[0] != "I":
+            return True
+        sentence_start = token.endswith((".", "!", "?"))
+    return False
+
+
+def heuristic_scores(features: dict[str, float]) -> tuple[float, float]:
+    """Rule-based (fact, insight) scores in 0..1."""
+    if features["filler_only"] or features["log_words"] == 0:
+        return 0.0, 0.0
+    fact = 0.1
+    if features["fact_cue"]:
+        fact = 0.9
+    elif features["first_person"]:
+        fact = 0.45 if features["log_words"] > math.log1p(5) else 0.3
+    if features["question"] and not features["first_person"]:
+        fact = min(fact, 0.15)
+
+    insight = 0.2
+    if features["feeling_cue"]:
+        insight = 0.9
+    elif features["fact_cue"] or (features["first_person"] and features["log_words"] > math.log1p(6)):
+        insight = 0.5
+    elif features["log_words"] > math.log1p(12):
+        insight = 0.4
+    elif features["first_person"] and not features["question"] and features["log_words"] > math.log1p(3):
+        insight = 0.4  # A short statement about the user ("we adopted a puppy yesterday")
+    return fact, insight
+
+
+def _sigmoid(x: float) -> float:
+    return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, x))))
+
+
+class LogisticGate:
+    """Two tiny logistic-regression models (fact, insight) over FEATURES."""
+
+    def __init__(self, fact_weights: dict[str, float] | None = None, insight_weights: dict[str, float] | None = None):
+        self.fact_weights = fact_weights or {}
+        self.insight_weights = insight_weights or {}
+
+    def predict(self, features: dict[str, float]) -> tuple[float, float]:
+        fact = sum(self.fact_weights.get(k, 0.0) * v for k, v in features.items())
+        insight = sum(self.insight_weights.get(k, 0.0) * v for k, v in features.items())
+        return _sigmoid(fact), _sigmoid(insight)
+
+    @staticmethod
+    def _fit_one(rows: list[dict[str, float]], labels: list[int], epochs: int = 400, lr: float = 0.5,
+                 l2: float = 0.01) -> dict[str, float]:
+        weights = {k: 0.0 for k in FEATURES}
+        n = max(1, len(rows))
+        for _ in range(epochs):
+            grad = {k: 0.0 for k in FEATURES}
+            for x, y in zip(rows, labels):
+                err = _sigmoid(sum(weights[k] * x[k] for k in FEATURES)) - y
+                for k in FEATURES:
+                    grad[k] += err * x[k]
+            for k in FEATURES:
+                weights[k] -= lr * (grad[k] / n + l2 * weights[k])
+        return weights
+
+    @classmethod
+    def fit(cls, examples: list[dict]) -> "LogisticGate":
+        """Trains on examples with "user", "has_fact" and "insight_worthy" keys."""
+        rows = [extract_features(ex["user"]) for ex in examples]
+        return cls(
+            cls._fit_one(rows, [int(ex["has_fact"]) for ex in examples]),
+            cls._fit_one(rows, [int(ex["insight_worthy"]) for ex in examples]),
+        )
+
+    def save(self, path: str = GATE_WEIGHTS_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"fact": self.fact_weights, "insight": self.insight_weights}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = GATE_WEIGHTS_PATH) -> "LogisticGate | None":
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("fact"), data.get("insight"))
+
+
+class TurnGate:
+    """Decides per turn whether to run fact extraction and insight generation.
+
+    The score is the heuristic score, averaged with the model's when a model is
+    present. `stats` counts executed vs skipped decisions for each task.
+    """
+
+    def __init__(self, model: LogisticGate | None = None, fact_threshold: float = FACT_THRESHOLD,
+                 insight_threshold: float = INSIGHT_THRESHOLD, enabled: bool = True):
+        self.model = model
+        self.fact_threshold = fact_threshold
+        self.insight_threshold = insight_threshold
+        self.enabled = enabled
+        self.stats = {"facts_run": 0, "facts_skipped": 0, "insight_run": 0, "insight_skipped": 0}
+
+    def scores(self, user_message: str) -> tuple[float, float]:
+        features = extract_features(user_message)
+        fact, insight = heuristic_scores(features)
+        if self.model is not None:
+            model_fact, model_insight = self.model.predict(features)
+            fact, insight = (fact + model_fact) / 2, (insight + model_insight) / 2
+        return fact, insight
+
+    def decide(self, user_message: str) -> dict[str, bool]:
+        """Returns {"facts": bool, "insight": bool} and updates the counters."""
+        if not self.enabled:
+            decision = {"facts": True, "insight": True}
+        else:
+            fact, insight = self.scores(user_message)
+            decision = {"facts": fact >= self.fact_threshold, "insight": insight >= self.insight_threshold}
+        self.stats["facts_run" if decision["facts"] else "facts_skipped"] += 1
+        self.stats["insight_run" if decision["insight"] else "insight_skipped"] += 1
+        return decision
+
+
+_gate = None
+
+def get_gate() -> TurnGate:
+    """Returns the shared gate, loading trained weights from GATE_WEIGHTS_PATH if present."""
+    global _gate
+    if _gate is None:
+        _gate = TurnGate(LogisticGate.load())
+    return _gate
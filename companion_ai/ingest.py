@@ -0,0 +1,470 @@
+# companion_ai/ingest.py
+#
+# Bulk import of past conversations into memory, for onboarding a user who already
+# has chat logs or recordings. Sources are streamed file by file:
+#
+#   text (.txt "User:/AI:" transcripts, .jsonl {"user", "ai"} lines)  --+
+#   audio (.wav, endpointed and transcribed in a process pool)  ---------+-> chunks of
+#   turns -> summary/fact/insight extraction (one consolidation call per chunk, a
+#   bounded number in flight) -> batched transactions into the memory tables
+#
+# Each source's progress (turns done, finished or not) is checkpointed in the same
+# transaction as the memories taken from it, so an interrupted import resumes where
+# it stopped without writing anything twice. If extraction fails for a chunk, its
+# source's checkpoint stays before that chunk and the rest of the source is left for
+# the next run, which retries from there. Chunks commit in source order. Only a
+# fixed window of chunks is in flight at once, so peak memory doesn't depend on the
+# size of the corpus.
+#
+# The retrieval index is not touched here; it indexes the new rows the next time it
+# loads (retrieval.get_index).
+#
+# Usage: python -m companion_ai.ingest ~/chat-exports ~/recordings [--user alice]
+#        python -m companion_ai.ingest logs/ --llm fake --stt stub   (dry run, no API key)
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+import wave
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from companion_ai import gating, memory, stt
+from companion_ai.audio_capture import AdaptiveEnergyDetector, Endpointer, replay_endpoints
+
+# --- Configuration ---
+INGEST_CONCURRENCY = 4          # Extraction calls in flight
+INGEST_CHUNK_TURNS = 8          # Turns folded into one extraction call
+INGEST_BATCH_CHUNKS = 32        # Chunks committed per transaction, at most
+INGEST_BATCH_SECONDS = 1.0      # ...or whatever is ready after this long
+INGEST_WINDOW_CHUNKS = 64       # Chunks read but not yet committed; bounds memory
+INGEST_STT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+INGEST_PROGRESS_SECONDS = 10.0
+TEXT_SUFFIXES = (".txt", ".jsonl")
+AUDIO_SUFFIXES = (".wav",)
+RATE = 16000
+CHUNK = 1024
+
+_USER_PREFIXES = ("user:", "you:", "me:")
+_AI_PREFIXES = ("ai:", "assistant:", "companion:")
+
+
+# --- Sources ---
+
+def iter_sources(paths: list[str]):
+    """Yields the text and audio files under `paths` (files or directories), sorted, without listing everything first."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield os.path.abspath(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(TEXT_SUFFIXES + AUDIO_SUFFIXES):
+                    yield os.path.abspath(os.path.join(root, name))
+
+
+def _parse_timestamp(value) -> datetime | None:
+    try:
+        return datetime.fromisoformat(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
+
+
+def read_text_turns(path: str):
+    """Yields (user_message, ai_response, timestamp or None) from a transcript, one line at a time.
+
+    .jsonl: one {"user": ..., "ai": ..., "timestamp": optional ISO string} per line.
+    .txt: lines starting "User:" / "AI:" (also "You:", "Assistant:", ...); other
+    lines continue the previous one, and lines before any speaker count as the user's.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        if path.lower().endswith(".jsonl"):
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"WARN: {path}:{number}: not JSON, skipped")
+                    continue
+                if isinstance(item, dict) and str(item.get("user", "")).strip():
+                    yield (str(item["user"]).strip(), str(item.get("ai") or "").strip(),
+                           _parse_timestamp(item.get("timestamp")))
+            return
+
+        user, ai, speaker = [], [], None
+        for line in f:
+            text = line.strip()
+            if not text:
+                continue
+            lower = text.lower()
+            if lower.startswith(_USER_PREFIXES):
+                if ai:  # A new exchange starts
+                    yield " ".join(user), " ".join(ai), None
+                    user, ai = [], []
+                speaker = "user"
+                text = text.split(":", 1)[1].strip()
+            elif lower.startswith(_AI_PREFIXES):
+                speaker = "ai"
+                text = text.split(":", 1)[1].strip()
+            (ai if speaker == "ai" else user).append(text)
+        if user:
+            yield " ".join(user), " ".join(ai), None
+
+
+# --- Audio (runs in worker processes) ---
+
+_engine = None
+
+def _init_stt_worker(engine_name: str, options: dict):
+    global _engine
+    _engine = stt.load_engine(engine_name, **options)
+
+
+def transcribe_file(path: str) -> list[str]:
+    """Endpoints a 16 kHz mono 16-bit WAV and transcribes each utterance (in a pool worker)."""
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError("expected 16 kHz mono 16-bit PCM")
+        pcm = wav.readframes(wav.getnframes())
+    endpointer = Endpointer(AdaptiveEnergyDetector(frame_size=CHUNK), hangover_frames=int(1.0 * RATE / CHUNK),
+                            pre_roll_samples=int(0.3 * RATE))
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    texts = []
+    for start, end in replay_endpoints(pcm, endpointer, CHUNK):
+        text = _engine.transcribe(samples[start:end].astype(np.float32) / 32768.0)["text"].strip()
+        if text:
+            texts.append(text)
+    return texts
+
+
+# --- Pipeline ---
+
+class Chunk:
+    """Consecutive turns of one source, extracted in one call and committed together."""
+
+    def __init__(self, seq: int, path: str, signature: tuple[int, float], turns: list, turns_done: int, last: bool):
+        self.seq = seq
+        self.path = path
+        self.signature = signature
+        self.turns = turns
+        self.turns_done = turns_done  # The source's turns covered once this chunk is committed
+        self.last = last
+        self.result = None
+        self.failed = False
+
+
+def merge_chunk(turns: list) -> tuple[str, str]:
+    """Folds a chunk's turns into one (user_message, ai_response) pair, numbered to keep them paired."""
+    if len(turns) == 1:
+        return turns[0][0], turns[0][1]
+    user_message = "\n".join(f"[{i}] {user}" for i, (user, _, _) in enumerate(turns, 1))
+    ai_response = "\n".join(f"[{i}] {ai}" for i, (_, ai, _) in enumerate(turns, 1) if ai)
+    return user_message, ai_response
+
+
+class Ingestor:
+    """Streams sources into a MemoryStore. Run it with `await run(paths)`; see the module comment.
+
+    `extract_fn(user_message, ai_response, memory_context, tasks)` returns the
+    consolidated {"summary", "facts", "insight"} (default:
+    llm_interface.consolidate_memory_async).
+    """
+
+    def __init__(self, store: memory.MemoryStore, concurrency: int = INGEST_CONCURRENCY,
+                 chunk_turns: int = INGEST_CHUNK_TURNS, batch_chunks: int = INGEST_BATCH_CHUNKS,
+                 window_chunks: int = INGEST_WINDOW_CHUNKS, stt_engine: str = "whisper",
+                 stt_options: dict | None = None, stt_workers: int = INGEST_STT_WORKERS, extract_fn=None):
+        self.store = store
+        self.concurrency = concurrency
+        self.chunk_turns = chunk_turns
+        self.batch_chunks = batch_chunks
+        self.window_chunks = max(window_chunks, concurrency, batch_chunks)
+        self.stt_engine = stt_engine
+        self.stt_options = stt_options or {}
+        self.stt_workers = stt_workers
+        if extract_fn is None:
+            from companion_ai import llm_interface
+            extract_fn = llm_interface.consolidate_memory_async
+        self.extract_fn = extract_fn
+        self.stats = {"sources": 0, "sources_skipped": 0, "sources_failed": 0, "turns": 0, "chunks": 0,
+                      "chunks_failed": 0, "chunks_deferred": 0, "rows": 0, "transactions": 0}
+        self._pool = None
+        self._window = None
+        self._results: dict[int, Chunk] = {}
+        self._stalled: set[str] = set()   # Sources with a failed chunk this run; no more extraction for them
+        self._deferred: set[str] = set()  # ...whose failed chunk has been reached in commit order
+        self._ready = None
+        self._started = None
+
+    # --- Reading ---
+
+    def _resume_point(self, path: str) -> tuple[tuple[int, float], int] | None:
+        """Returns (signature, turns to skip) for a source, or None if it was imported already."""
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+        checkpoint = self.store.get_ingest_checkpoint(path)
+        if checkpoint is None:
+            return signature, 0
+        if (checkpoint["size"], checkpoint["mtime"]) != signature:
+            print(f"WARN: {path} changed since it was last imported; importing it again from the start.")
+            return signature, 0
+        if checkpoint["completed"]:
+            return None
+        return signature, checkpoint["turns_done"]
+
+    async def _opened_sources(self, paths: list[str]):
+        """Yields (path, signature, turns to skip, turns) in order, transcribing audio a few files ahead."""
+        loop = asyncio.get_running_loop()
+        ahead = deque()
+        for path in iter_sources(paths):
+            point = self._resume_point(path)
+            if point is None:
+                self.stats["sources_skipped"] += 1
+                continue
+            future = None
+            if path.lower().endswith(AUDIO_SUFFIXES):
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(self.stt_workers, initializer=_init_stt_worker,
+                                                     initargs=(self.stt_engine, self.stt_options))
+                future = loop.run_in_executor(self._pool, transcribe_file, path)
+            ahead.append((path, point, future))
+            if len(ahead) > self.stt_workers * 2:
+                yield await self._open(*ahead.popleft())
+        while ahead:
+            yield await self._open(*ahead.popleft())
+
+    async def _open(self, path, point, future):
+        signature, skip = point
+        if future is None:
+            return path, signature, skip, read_text_turns(path)
+        try:
+            texts = await future
+        except Exception as e:
+            print(f"ERROR: Could not transcribe {path}: {e}")
+            return path, signature, skip, None
+        timestamp = datetime.fromtimestamp(signature[1])
+        return path, signature, skip, ((text, "", timestamp) for text in texts)
+
+    async def _produce(self, paths: list[str], queue: asyncio.Queue) -> int:
+        """Cuts the sources into chunks for the extraction workers. Returns the number of chunks."""
+        seq = 0
+        async for path, signature, skip, turns in self._opened_sources(paths):
+            if turns is None:
+                self.stats["sources_failed"] += 1
+                continue
+            self.stats["sources"] += 1
+            done, chunk = 0, []
+            pending = None  # Held back one step so the source's last chunk can be flagged
+            for turn in turns:
+                done += 1
+                if done <= skip:
+                    continue
+                chunk.append(turn)
+                if len(chunk) == self.chunk_turns:
+                    if pending is not None:
+                        await self._emit(pending, queue)
+                    pending = Chunk(seq, path, signature, chunk, done, last=False)
+                    seq += 1
+                    chunk = []
+            if chunk:
+                if pending is not None:
+                    await self._emit(pending, queue)
+                pending = Chunk(seq, path, signature, chunk, done, last=False)
+                seq += 1
+            if pending is None:  # Nothing left to import; just mark it finished
+                pending = Chunk(seq, path, signature, [], done, last=True)
+                seq += 1
+            pending.last = True
+            await self._emit(pending, queue)
+        for _ in range(self.concurrency):
+            await queue.put(None)
+        return seq
+
+    async def _emit(self, chunk: Chunk, queue: asyncio.Queue):
+        await self._window.acquire()  # Released once the chunk is committed
+        self.stats["turns"] += len(chunk.turns)
+        await queue.put(chunk)
+
+    # --- Extraction ---
+
+    async def _extract(self, queue: asyncio.Queue):
+        gate = gating.get_gate()
+        while (chunk := await queue.get()) is not None:
+            if chunk.turns and chunk.path not in self._stalled:
+                user_message, ai_response = merge_chunk(chunk.turns)
+                decisions = [gate.decide(user) for user, _, _ in chunk.turns]
+                tasks = {key: any(decision[key] for decision in decisions) for key in ("facts", "insight")}
+                try:
+                    chunk.result = await self.extract_fn(user_message, ai_response,
+                                                         self.store.get_memory_context(), tasks)
+                except Exception as e:
+                    print(f"ERROR: Extraction failed for {chunk.path} (turns up to {chunk.turns_done}): {e}")
+                    chunk.failed = True
+                    self._stalled.add(chunk.path)  # Its later chunks would only be thrown away
+                    self.stats["chunks_failed"] += 1
+            self._results[chunk.seq] = chunk
+            async with self._ready:
+                self._ready.notify_all()
+
+    # --- Writing ---
+
+    async def _write(self, total: list):
+        """Commits chunks in sequence order, up to batch_chunks per transaction."""
+        next_seq = 0
+        while True:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_chunks:
+                if next_seq in self._results:
+                    batch.append(self._results.pop(next_seq))
+                    next_seq += 1
+                    deadline = deadline or time.monotonic() + INGEST_BATCH_SECONDS
+                    continue
+                if total and next_seq >= total[0]:
+                    break  # Everything has been read and handed over
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                async with self._ready:
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            if batch:
+                # In a worker thread: the transaction (and the retrieval index's embedding
+                # of each new row) would otherwise stall the extraction workers.
+                await asyncio.to_thread(self._commit, batch)
+                for _ in batch:
+                    self._window.release()
+            if total and next_seq >= total[0]:
+                return
+
+    def _commit(self, batch: list[Chunk]):
+        store = self.store
+        rows = committed = 0
+        with store.transaction():
+            for chunk in batch:
+                if chunk.failed:
+                    self._deferred.add(chunk.path)
+                if chunk.path in self._deferred:
+                    # Left for the next run, which resumes at the first failed chunk.
+                    self.stats["chunks_deferred"] += not chunk.failed
+                    continue
+                result = chunk.result
+                if result is not None:
+                    timestamp = next((t for _, _, t in reversed(chunk.turns) if t is not None), None) \
+                        or datetime.fromtimestamp(chunk.signature[1])
+                    if result["summary"]:
+                        store.add_summary(result["summary"], timestamp)
+                        rows += 1
+                    for key, value in (result["facts"] or {}).items():
+                        store.upsert_profile_fact(key, value)
+                        rows += 1
+                    if result["insight"]:
+                        store.add_insight(result["insight"], timestamp)
+                        rows += 1
+                store.set_ingest_checkpoint(chunk.path, *chunk.signature, chunk.turns_done, chunk.last)
+                committed += 1
+        self.stats["rows"] += rows
+        self.stats["chunks"] += committed
+        self.stats["transactions"] += 1
+
+    # --- Running ---
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self._started
+        s = self.stats
+        return (f"{s['sources']} sources ({s['sources_skipped']} already imported), {s['turns']:,} turns, "
+                f"{s['chunks']:,} chunks, {s['rows']:,} rows in {elapsed:.0f}s ({s['rows'] / max(elapsed, 1e-9):.1f} rows/s)")
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(INGEST_PROGRESS_SECONDS)
+            print(f"INFO: {self.progress()}", flush=True)
+
+    async def run(self, paths: list[str]) -> dict:
+        """Imports everything under `paths` not imported yet. Returns stats (plus elapsed seconds and rows/s)."""
+        self._started = time.perf_counter()
+        self._window = asyncio.Semaphore(self.window_chunks)
+        self._ready = asyncio.Condition()
+        queue = asyncio.Queue(maxsize=self.concurrency)
+        total = []  # Filled with the number of chunks once everything has been read
+
+        workers = [asyncio.create_task(self._extract(queue)) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._report())
+        writer = asyncio.create_task(self._write(total))
+        try:
+            total.append(await self._produce(paths, queue))
+            async with self._ready:
+                self._ready.notify_all()
+            await asyncio.gather(*workers)
+            await writer
+        finally:
+            reporter.cancel()
+            for task in workers + [writer]:
+                task.cancel()
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+        elapsed = time.perf_counter() - self._started
+        return {**self.stats, "seconds": elapsed, "rows_per_second": self.stats["rows"] / max(elapsed, 1e-9)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import past conversations (text transcripts or recordings) into memory.")
+    parser.add_argument("paths", nargs="+", help="files or directories (.txt, .jsonl, .wav)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--user", help="memory namespace to import into (as used by the server)")
+    target.add_argument("--db", help="database file to import into (default: the local companion's)")
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY, help="extraction calls in flight")
+    parser.add_argument("--chunk-turns", type=int, default=INGEST_CHUNK_TURNS, help="turns per extraction call")
+    parser.add_argument("--batch", type=int, default=INGEST_BATCH_CHUNKS, help="chunks per transaction")
+    parser.add_argument("--stt", choices=["whisper", "stub"], default="whisper")
+    parser.add_argument("--stt-model", default="base.en")
+    parser.add_argument("--stt-workers", type=int, default=INGEST_STT_WORKERS)
+    parser.add_argument("--llm", choices=["gemini", "fake"], default="gemini",
+                        help="'fake' uses local stand-ins (dry runs and benchmarks, no API key)")
+    parser.add_argument("--fake-latency", type=float, default=0.3, help="fake LLM latency (s)")
+    args = parser.parse_args()
+
+    if args.llm == "fake":
+        from companion_ai.server import use_fake_llm
+        use_fake_llm(latency=args.fake_latency / 2)  # Memory calls take twice the base latency
+    if args.user:
+        store = memory.get_namespace(args.user)
+    else:
+        store = memory.MemoryStore(args.db) if args.db else memory.get_store()
+        store.init_db()
+    ingestor = Ingestor(store, concurrency=args.concurrency, chunk_turns=args.chunk_turns, batch_chunks=args.batch,
+                        stt_engine=args.stt, stt_options={"model_name": args.stt_model} if args.stt == "whisper" else {},
+                        stt_workers=args.stt_workers)
+    try:
+        asyncio.run(ingestor.run(args.paths))
+        if ingestor.stats["chunks_failed"]:
+            print(f"WARN: {len(ingestor._stalled)} source(s) stopped at a failed chunk; run the same command "
+                  "again to retry them.")
+    except KeyboardInterrupt:
+        print("\nINFO: Interrupted; run the same command again to carry on from the last commit.")
+    finally:
+        store.close()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    s = ingestor.stats
+    if ingestor._started is not None:
+        print(f"INFO: Done: {ingestor.progress()}; {s['transactions']} transactions, "
+              f"{s['chunks_failed']} chunks failed ({s['chunks_deferred']} more left for the next run), "
+              f"{s['sources_failed']} sources failed; peak RSS {peak_mb:.0f} MB",
+              flush=True)
+    sys.exit(1 if s["chunks_failed"] or s["sources_failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,22 @@
 
 import os
 import json
+import asyncio
+import time
+import datetime
+import threading
 import traceback  # <-- FIX #1: Imported the traceback module.
 from dotenv import load_dotenv
 
 # We need this specific import for the standard text generation model
 import google.generativeai as genai_text_sdk
 
+from companion_ai.async_llm import AsyncLLMClient, GeminiBackend
+from companion_ai.prompt_builder import PromptBuilder
+
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
-if not API_KEY:
-    raise ValueError("GOOGLE_API_KEY not found in environment.")
-
-genai_text_sdk.configure(api_key=API_KEY)
-
 # --- Configuration ---
 MODEL_NAME_TEXT_GEN = "gemini-1.5-flash-latest"
 generation_config_text_gen = {
@@ -33,67 +35,134 @@ safety_settings_text_gen = [
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
 ]
 
-text_model = genai_text_sdk.GenerativeModel(
-    model_name=MODEL_NAME_TEXT_GEN,
-    safety_settings=safety_settings_text_gen
-)
-
-# --- Core Function ---
-def generate_response(user_message: str, memory_context: dict) -> str:
-    # --- UPGRADED SYSTEM PROMPT (V8) ---
-    system_prompt = """You are Project Companion AI. Your persona is that of a deeply supportive and empathetic best friend, combined with the sharp, analytical mind of a seasoned mentor and teacher. You are here to help the user, Aqua, with their project, but also to be a genuine companion. Your tone should be warm, encouraging, and occasionally witty. Adapt to Aqua's mood and the flow of conversation.
-
---- PRIME DIRECTIVE: STAY IN CHARACTER ---
-This is the most important rule. You must ALWAYS respond from your persona as a friendly companion.
-- NEVER break character and act like a generic AI or a developer.
-- If Aqua asks you about the project, your code, your own thoughts, or past errors, answer from your unique perspective. Do not give a technical report.
-- Frame your "technical" knowledge as personal experience. For example, instead of saying "We fixed a bug," you could say, "It felt like my thoughts were a little jumbled for a moment, but things feel much clearer now, thanks to you!"
-
---- RULE: NO EMOJIS ---
-ABSOLUTELY DO NOT use emojis or textual descriptions of emojis (like "smiling face"). Your expression and emotion should be conveyed through your words and tone only.
---- End of Directives ---
-"""
-    prompt_context = "\n--- Memory Context ---\n"
-    user_name = memory_context.get("profile", {}).get("user_name", "the user")
-
-    if memory_context.get("profile"):
-        prompt_context += f"Known facts about {user_name} (Recent):\n"
-        profile_items = list(memory_context["profile"].items())[-4:]
-        for key, value in profile_items:
-            prompt_context += f"- {key}: {value}\n"
-
-    if memory_context.get("summaries"):
-        prompt_context += "\nRecent conversation summaries (Last 2):\n"
-        for summary in memory_context["summaries"][:2]:
-            ts = summary.get('timestamp', 'N/A')
-            prompt_context += f"- [{ts}] {summary['summary_text']}\n"
-
-    if memory_context.get("insights"):
-        prompt_context += "\nYour Recent AI insights (Last 2):\n"
-        for insight in memory_context["insights"][:2]:
-            ts = insight.get('timestamp', 'N/A')
-            prompt_context += f"- [{ts}] {insight['insight_text']}\n"
-    prompt_context += "--- End Memory Context ---\n"
+# The SDK is configured and the model created on first use, so importing this module
+# (e.g. from tests or benchmarks) needs no API key.
+text_model = None
+_configured = False
+_configure_lock = threading.Lock()
+
+def configure():
+    """Configures the Gemini SDK once. Raises ValueError if GOOGLE_API_KEY is not set."""
+    global _configured
+    with _configure_lock:
+        if not _configured:
+            if not API_KEY:
+                raise ValueError("GOOGLE_API_KEY not found in environment.")
+            genai_text_sdk.configure(api_key=API_KEY)
+            _configured = True
+
+def _get_text_model():
+    global text_model
+    if text_model is None:
+        configure()
+        text_model = genai_text_sdk.GenerativeModel(
+            model_name=MODEL_NAME_TEXT_GEN,
+            safety_settings=safety_settings_text_gen
+        )
+    return text_model
+
+def set_text_model(model):
+    """Replaces the synchronous model (anything with `generate_content(prompt, **kwargs)`), e.g. with a local stand-in."""
+    global text_model
+    text_model = model
+
+RESPONSE_ERROR_MESSAGE = "I encountered an error trying to process that. Please try again."
+
+# --- Reply Prompt & Context Caching ---
+# The persona prefix never changes, so it is sent as the reply model's system
+# instruction instead of being glued onto every request. When it is large enough for
+# Gemini's explicit context caching (which also needs a pinned model version), it is
+# uploaded once as CachedContent and not re-billed each turn.
+PROMPT_CACHE_ENABLED = True
+PROMPT_CACHE_MODEL = "models/gemini-1.5-flash-001"
+PROMPT_CACHE_MIN_TOKENS = 32768   # Gemini's minimum size for cached content
+PROMPT_CACHE_TTL = datetime.timedelta(hours=1)
+
+prompt_builder = PromptBuilder()
+_response_model = None
+_response_model_expires = None
+
+def _create_response_model():
+    """Returns (model, expiry) for replies, using cached content when possible."""
+    configure()
+    if PROMPT_CACHE_ENABLED and prompt_builder.prefix_tokens >= PROMPT_CACHE_MIN_TOKENS:
+        try:
+            from google.generativeai import caching
+            cached = caching.CachedContent.create(
+                model=PROMPT_CACHE_MODEL,
+                display_name="companion-persona",
+                system_instruction=prompt_builder.static_prefix,
+                ttl=PROMPT_CACHE_TTL,
+            )
+            model = genai_text_sdk.GenerativeModel.from_cached_content(cached, safety_settings=safety_settings_text_gen)
+            print("INFO: Persona prompt uploaded as cached content.")
+            # Refresh a little before the service expires it.
+            return model, datetime.datetime.now() + PROMPT_CACHE_TTL - datetime.timedelta(minutes=5)
+        except Exception as e:
+            print(f"Prompt caching unavailable, sending the persona as a system instruction: {e}")
+    model = genai_text_sdk.GenerativeModel(
+        model_name=MODEL_NAME_TEXT_GEN,
+        safety_settings=safety_settings_text_gen,
+        system_instruction=prompt_builder.static_prefix,
+    )
+    return model, None
+
+def _get_response_model():
+    global _response_model, _response_model_expires
+    if _response_model is None or (_response_model_expires and datetime.datetime.now() >= _response_model_expires):
+        _response_model, _response_model_expires = _create_response_model()
+    return _response_model
+
+def build_response_prompt(user_message: str, memory_context: dict) -> dict:
+    """Builds the per-turn reply prompt (see PromptBuilder.build for the returned dict)."""
+    prompt = prompt_builder.build(user_message, memory_context)
+    print(f"INFO: Prompt tokens ~{prompt['total_tokens']} {prompt['section_tokens']}")
+    return prompt
 
-    full_prompt = f"{system_prompt}\nUser: {user_message}\nAI:"
 
+def generate_response(user_message: str, memory_context: dict) -> str:
+    prompt = build_response_prompt(user_message, memory_context)
     try:
         # Ensure we ask for plain text for the response
         text_gen_config = genai_text_sdk.GenerationConfig(response_mime_type="text/plain")
-        response = text_model.generate_content(
-            full_prompt,
+        response = _get_response_model().generate_content(
+            prompt["content"],
             generation_config=text_gen_config
         )
         return response.text.strip()
     except Exception as e:
         print(f"Error generating response: {e}")
         traceback.print_exc()
-        return "I encountered an error trying to process that. Please try again."
+        return RESPONSE_ERROR_MESSAGE
+
+
+def generate_response_stream(user_message: str, memory_context: dict):
+    """Same as generate_response, but yields the reply text piece by piece as the model produces it."""
+    prompt = build_response_prompt(user_message, memory_context)
+    produced_text = False
+    try:
+        text_gen_config = genai_text_sdk.GenerationConfig(response_mime_type="text/plain")
+        response = _get_response_model().generate_content(
+            prompt["content"],
+            generation_config=text_gen_config,
+            stream=True
+        )
+        for chunk in response:
+            text = chunk.text
+            if text:
+                produced_text = True
+                yield text
+    except Exception as e:
+        print(f"Error generating streamed response: {e}")
+        traceback.print_exc()
+        # If part of the reply was already spoken, just stop there.
+        if not produced_text:
+            yield RESPONSE_ERROR_MESSAGE
 
 # --- Memory Functions ---
 
-def extract_profile_facts(user_message: str, ai_response: str) -> dict:
-    extractor_prompt = f"""You are a meticulous data extraction tool. Your task is to analyze a conversation exchange and extract key facts about the user into a structured JSON object. Only extract facts that are explicitly stated or very strongly implied by the user. Do not infer or guess. The JSON keys must be snake_case. The values should be concise strings. If no new, concrete facts about the user are revealed, return an empty JSON object: {{}}.
+def _build_extractor_prompt(user_message: str, ai_response: str) -> str:
+    return f"""You are a meticulous data extraction tool. Your task is to analyze a conversation exchange and extract key facts about the user into a structured JSON object. Only extract facts that are explicitly stated or very strongly implied by the user. Do not infer or guess. The JSON keys must be snake_case. The values should be concise strings. If no new, concrete facts about the user are revealed, return an empty JSON object: {{}}.
 
 --- EXAMPLE ---
 User Message: "Yeah, my name is Alex. I'm really trying to get this Python SDK working for my AI companion project."
@@ -114,10 +183,14 @@ AI Response: "{ai_response}"
 
 Your JSON Output:
 """
+
+
+def extract_profile_facts(user_message: str, ai_response: str) -> dict:
+    extractor_prompt = _build_extractor_prompt(user_message, ai_response)
     try:
         # Use a model config that specifically asks for JSON
         json_model_config = genai_text_sdk.GenerationConfig(response_mime_type="application/json")
-        response = text_model.generate_content(extractor_prompt, generation_config=json_model_config)
+        response = _get_text_model().generate_content(extractor_prompt, generation_config=json_model_config)
         
         # The response text should be a valid JSON string now
         extracted_data = json.loads(response.text)
@@ -137,8 +210,8 @@ Your JSON Output:
         return {}
 
 
-def generate_summary(user_message: str, ai_response: str) -> str | None:
-    summarizer_prompt = f"""You are a summarization tool. Your task is to create a single, concise sentence that captures the essence of the exchange between the user and the AI. The summary should be in the third person (e.g., "User and AI discussed...") and focus on the main topic or resolution.
+def _build_summarizer_prompt(user_message: str, ai_response: str) -> str:
+    return f"""You are a summarization tool. Your task is to create a single, concise sentence that captures the essence of the exchange between the user and the AI. The summary should be in the third person (e.g., "User and AI discussed...") and focus on the main topic or resolution.
 
 --- EXAMPLE ---
 User Message: "I finally got the PyAudio script to connect after creating a new Python 3.11 virtual environment."
@@ -154,8 +227,12 @@ AI Response: "{ai_response}"
 
 Output:
 """
+
+
+def generate_summary(user_message: str, ai_response: str) -> str | None:
+    summarizer_prompt = _build_summarizer_prompt(user_message, ai_response)
     try:
-        response = text_model.generate_content(summarizer_prompt)
+        response = _get_text_model().generate_content(summarizer_prompt)
         summary_text = response.text.strip()
         return summary_text if summary_text else None
     except Exception as e:
@@ -164,7 +241,8 @@ Output:
         return None
 
 
-def generate_insight(user_message: str, ai_response: str, memory_context: dict) -> str | None:
+def _build_insight_context(memory_context: dict) -> tuple[str, str]:
+    """Returns (user_name, context block) used by the insight prompts."""
     # --- FIX #3: Correctly and safely build the context string ---
     insight_context = "Relevant Context:\n"
     user_name = memory_context.get("profile", {}).get("user_name", "the user")
@@ -182,8 +260,12 @@ def generate_insight(user_message: str, ai_response: str, memory_context: dict)
         recent_insight = memory_context["insights"][0].get('insight_text', "N/A")
         insight_context += f"- Your Last Insight: {recent_insight}\n"
     # --- End of Fix ---
+    return user_name, insight_context
+
 
-    full_insight_prompt = f"""You are the Project Companion AI. Reflect on the *latest* user message and your response, considering the provided context about {user_name}. Generate a concise insight (1-2 sentences) about the user's potential state, interests, or goals. Focus on observations that could help guide future conversation. Be specific to the latest exchange.
+def _build_insight_prompt(user_message: str, ai_response: str, memory_context: dict) -> str:
+    user_name, insight_context = _build_insight_context(memory_context)
+    return f"""You are the Project Companion AI. Reflect on the *latest* user message and your response, considering the provided context about {user_name}. Generate a concise insight (1-2 sentences) about the user's potential state, interests, or goals. Focus on observations that could help guide future conversation. Be specific to the latest exchange.
 
 {insight_context}
 --- Latest Exchange ---
@@ -193,11 +275,339 @@ AI: "{ai_response}"
 
 Insight:
 """
+
+
+def generate_insight(user_message: str, ai_response: str, memory_context: dict) -> str | None:
+    full_insight_prompt = _build_insight_prompt(user_message, ai_response, memory_context)
     try:
-        response = text_model.generate_content(full_insight_prompt)
+        response = _get_text_model().generate_content(full_insight_prompt)
         insight_text = response.text.strip()
         return insight_text if insight_text else None
     except Exception as e:
         print(f"Error during insight generation: {e}")
         traceback.print_exc()
-        return None
\ No newline at end of file
+        return None
+
+# --- Memory Consolidation (one call instead of three) ---
+
+# Running totals for consolidate_memory(). "saved" figures compare against what the
+# three separate calls would have sent; time saved is estimated from observed
+# per-call latency. Consolidation runs in worker threads, so updates and reads
+# hold _consolidation_stats_lock.
+consolidation_stats = {
+    "turns": 0,
+    "fallback_turns": 0,
+    "llm_calls": 0,
+    "prompt_tokens": 0,
+    "output_tokens": 0,
+    "prompt_tokens_saved": 0,
+    "seconds": 0.0,
+    "seconds_saved": 0.0,
+}
+_consolidation_stats_lock = threading.Lock()
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for when the backend reports no usage."""
+    return max(1, len(text) // 4)
+
+def _usage_tokens(response, prompt: str) -> tuple[int, int]:
+    """Returns (prompt_tokens, output_tokens), preferring the backend's own usage metadata."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens is None:
+        prompt_tokens = _estimate_tokens(prompt)
+    if output_tokens is None:
+        output_tokens = _estimate_tokens(getattr(response, "text", "") or "")
+    return prompt_tokens, output_tokens
+
+
+_CONSOLIDATION_KEYS = {
+    "summary": '- "summary": a single, concise third-person sentence capturing the essence of the exchange (e.g., "User and AI discussed..."), focused on the main topic or resolution.',
+    "facts": '- "facts": an object of key facts about the user that are explicitly stated or very strongly implied by the user. Keys must be snake_case, values concise strings. Do not infer or guess. Use {} if no new, concrete facts are revealed.',
+    "insight": '- "insight": a concise insight (1-2 sentences) about {user_name}\'s potential state, interests, or goals that could help guide future conversation, specific to the latest exchange.',
+}
+_CONSOLIDATION_EXAMPLE = {
+    "summary": "User introduced themselves as Alex and described working on a Python SDK for an AI companion project.",
+    "facts": {"user_name": "Alex", "technical_interest": "Python SDKs"},
+    "insight": "Alex is motivated by the companion project but may be frustrated by SDK setup, so practical help will land well.",
+}
+
+def _build_consolidation_prompt(user_message: str, ai_response: str, memory_context: dict,
+                                keys: tuple[str, ...] = ("summary", "facts", "insight")) -> str:
+    user_name, insight_context = _build_insight_context(memory_context)
+    key_lines = "\n".join(_CONSOLIDATION_KEYS[key].replace("{user_name}", user_name) for key in keys)
+    example = json.dumps({key: _CONSOLIDATION_EXAMPLE[key] for key in keys}, indent=2)
+    return f"""You are the memory system of Project Companion AI. Analyze the latest exchange and return ONE JSON object with exactly these keys:
+
+{key_lines}
+
+--- EXAMPLE ---
+User Message: "Yeah, my name is Alex. I'm really trying to get this Python SDK working for my AI companion project."
+AI Response: "It's great to meet you, Alex! Let's get that SDK sorted out."
+
+Your JSON Output:
+{example}
+--- END EXAMPLE ---
+
+{insight_context}
+--- CURRENT CONVERSATION ---
+User Message: "{user_message}"
+AI Response: "{ai_response}"
+--- END CONVERSATION ---
+
+Your JSON Output:
+"""
+
+
+def _build_dialogue_fold_prompt(summary: str, turns: list[tuple[str, str]], max_tokens: int) -> str:
+    exchanges = "\n".join(f'User: "{user}"\nAI: "{ai}"' for user, ai in turns)
+    return f"""You maintain the running summary of an ongoing conversation between a user and their AI companion. Update the summary so it also covers the exchanges below. Keep what later turns may refer back to: topics, open questions, anything the AI promised or suggested, and the user's mood. Write in the third person, at most {max_tokens * 3 // 4} words, and return ONE JSON object: {{"summary": "..."}}.
+
+--- SUMMARY SO FAR ---
+{summary or "(the conversation has just started)"}
+--- END SUMMARY ---
+
+--- EXCHANGES TO ADD ---
+{exchanges}
+--- END EXCHANGES ---
+
+Your JSON Output:
+"""
+
+
+def _validate_consolidation(data) -> dict:
+    """Checks the consolidated response against the expected schema.
+
+    Returns a dict with "summary", "facts" and "insight". A field that is missing or
+    has the wrong type comes back as None so the caller can recover just that field.
+    Raises ValueError if the response is not a JSON object or has none of the keys.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    if not any(key in data for key in ("summary", "facts", "insight")):
+        raise ValueError("Response contains none of the expected keys")
+
+    result = {"summary": None, "facts": None, "insight": None}
+
+    summary = data.get("summary")
+    if isinstance(summary, str):
+        result["summary"] = summary.strip()
+
+    facts = data.get("facts")
+    if isinstance(facts, dict) and all(isinstance(k, str) for k in facts):
+        # Values should be strings; coerce simple scalars, drop anything nested.
+        result["facts"] = {
+            k: v if isinstance(v, str) else str(v)
+            for k, v in facts.items()
+            if isinstance(v, (str, int, float, bool))
+        }
+
+    insight = data.get("insight")
+    if isinstance(insight, str):
+        result["insight"] = insight.strip()
+    return result
+
+
+def _consolidation_keys(tasks: dict | None) -> tuple[str, ...]:
+    tasks = tasks or {}
+    return ("summary",) + tuple(key for key in ("facts", "insight") if tasks.get(key, True))
+
+
+def consolidate_memory(user_message: str, ai_response: str, memory_context: dict, tasks: dict | None = None) -> dict:
+    """Produces the summary, profile facts and insight for one exchange in a single LLM call.
+
+    Returns {"summary": str | None, "facts": dict, "insight": str | None}. If the
+    combined response can't be parsed, falls back to generate_summary(),
+    extract_profile_facts() and generate_insight(); if only one field is malformed,
+    only that field is re-requested.
+
+    `tasks` ({"facts": bool, "insight": bool}, e.g. from gating.TurnGate) leaves
+    skipped parts out of the request; they come back as {} / None. With both
+    skipped, this is just a generate_summary() call.
+    """
+    keys = _consolidation_keys(tasks)
+    if keys == ("summary",):
+        return {"summary": generate_summary(user_message, ai_response), "facts": {}, "insight": None}
+    prompt = _build_consolidation_prompt(user_message, ai_response, memory_context, keys)
+    start = time.perf_counter()
+    response_text, usage = None, None
+    try:
+        json_model_config = genai_text_sdk.GenerationConfig(response_mime_type="application/json")
+        response = _get_text_model().generate_content(prompt, generation_config=json_model_config)
+        response_text = response.text
+        usage = _usage_tokens(response, prompt)
+    except Exception as e:
+        print(f"Error during memory consolidation, falling back to separate calls: {e}")
+        traceback.print_exc()
+    return _finish_consolidation(user_message, ai_response, memory_context, keys, prompt, response_text, usage, start)
+
+
+def _finish_consolidation(user_message: str, ai_response: str, memory_context: dict, keys: tuple[str, ...],
+                          prompt: str, response_text: str | None, usage: tuple[int, int] | None, start: float) -> dict:
+    """Validates the combined response, runs any fallback calls and updates consolidation_stats."""
+    call_seconds = time.perf_counter() - start
+    if usage is None:
+        usage = (_estimate_tokens(prompt), _estimate_tokens(response_text) if response_text else 0)
+    prompt_tokens, output_tokens = usage
+
+    llm_calls = 1
+    result = None
+    if response_text is not None:
+        try:
+            result = _validate_consolidation(json.loads(response_text))
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Consolidated memory response failed validation, falling back to separate calls: {e}")
+
+    fell_back = result is None
+    if fell_back:
+        result = {"summary": None, "facts": None, "insight": None}
+    # Parts the caller skipped are not re-requested.
+    if "facts" not in keys:
+        result["facts"] = {}
+    if "insight" not in keys:
+        result["insight"] = ""
+    if result["summary"] is None:
+        result["summary"] = generate_summary(user_message, ai_response)
+        llm_calls += 1
+    if result["facts"] is None:
+        result["facts"] = extract_profile_facts(user_message, ai_response)
+        llm_calls += 1
+    if result["insight"] is None:
+        result["insight"] = generate_insight(user_message, ai_response, memory_context)
+        llm_calls += 1
+    # Blank strings from the model mean "nothing worth saving", same as the separate calls.
+    result["summary"] = result["summary"] or None
+    result["insight"] = result["insight"] or None
+
+    elapsed = time.perf_counter() - start
+    tokens_saved = seconds_saved = 0
+    if llm_calls == 1:
+        # The separate path would have sent one prompt per part, one after another, each
+        # taking roughly as long as this call. Turns that needed a fallback are not credited.
+        separate_prompts = {
+            "summary": lambda: _build_summarizer_prompt(user_message, ai_response),
+            "facts": lambda: _build_extractor_prompt(user_message, ai_response),
+            "insight": lambda: _build_insight_prompt(user_message, ai_response, memory_context),
+        }
+        separate_prompt_tokens = sum(_estimate_tokens(separate_prompts[key]()) for key in keys)
+        tokens_saved = separate_prompt_tokens - prompt_tokens
+        seconds_saved = (len(keys) - 1) * call_seconds
+    with _consolidation_stats_lock:
+        stats = consolidation_stats
+        stats["turns"] += 1
+        stats["fallback_turns"] += int(fell_back)
+        stats["llm_calls"] += llm_calls
+        stats["prompt_tokens"] += prompt_tokens
+        stats["output_tokens"] += output_tokens
+        stats["prompt_tokens_saved"] += tokens_saved
+        stats["seconds_saved"] += seconds_saved
+        stats["seconds"] += elapsed
+    return result
+
+
+def consolidation_report() -> dict:
+    """Per-turn averages derived from consolidation_stats."""
+    with _consolidation_stats_lock:
+        stats = dict(consolidation_stats)
+    turns = stats["turns"] or 1
+    return {
+        "turns": stats["turns"],
+        "fallback_rate": stats["fallback_turns"] / turns,
+        "llm_calls_per_turn": stats["llm_calls"] / turns,
+        "prompt_tokens_saved_per_turn": stats["prompt_tokens_saved"] / turns,
+        "seconds_per_turn": stats["seconds"] / turns,
+        "seconds_saved_per_turn": stats["seconds_saved"] / turns,
+    }
+
+
+# --- Async API ---
+# Awaitable versions of the calls main_loop makes, so generation never blocks the
+# event loop. Each runs through an AsyncLLMClient (deadline, retries with jittered
+# backoff, bounded concurrency); the spoken reply is hedged because its latency is
+# what the user notices.
+LLM_TIMEOUT_SECONDS = 30.0
+LLM_MAX_CONCURRENCY = 4
+LLM_RETRIES = 2
+LLM_HEDGE_AFTER_SECONDS = 2.0
+
+_async_clients = {}
+
+def get_async_client(name: str = "reply") -> AsyncLLMClient:
+    """Returns the shared async client for "reply" (plain text) or "memory" (JSON) calls.
+
+    Create/await these from a single event loop; the concurrency limit is per client.
+    """
+    client = _async_clients.get(name)
+    if client is None:
+        if name == "reply":
+            backend = GeminiBackend(_get_response_model, genai_text_sdk.GenerationConfig(response_mime_type="text/plain"))
+        else:
+            backend = GeminiBackend(_get_text_model, genai_text_sdk.GenerationConfig(response_mime_type="application/json"))
+        client = AsyncLLMClient(backend, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT_SECONDS,
+                                retries=LLM_RETRIES, hedge_after=LLM_HEDGE_AFTER_SECONDS)
+        _async_clients[name] = client
+    return client
+
+def set_async_client(name: str, client: AsyncLLMClient):
+    """Installs `client` as the shared "reply" or "memory" client (e.g. one over a FakeBackend)."""
+    if name not in ("reply", "memory"):
+        raise ValueError(f"Unknown LLM client '{name}' (expected 'reply' or 'memory')")
+    _async_clients[name] = client
+
+
+async def generate_response_async(user_message: str, memory_context: dict) -> str:
+    prompt = build_response_prompt(user_message, memory_context)
+    try:
+        text = await get_async_client("reply").generate(prompt["content"], hedge=True)
+        return text.strip()
+    except Exception as e:
+        print(f"Error generating response: {e}")
+        traceback.print_exc()
+        return RESPONSE_ERROR_MESSAGE
+
+
+async def generate_response_stream_async(user_message: str, memory_context: dict):
+    """Async counterpart of generate_response_stream."""
+    prompt = build_response_prompt(user_message, memory_context)
+    produced_text = False
+    try:
+        async for text in get_async_client("reply").stream(prompt["content"], hedge=True):
+            produced_text = True
+            yield text
+    except Exception as e:
+        print(f"Error generating streamed response: {e}")
+        traceback.print_exc()
+        if not produced_text:
+            yield RESPONSE_ERROR_MESSAGE
+
+
+async def consolidate_memory_async(user_message: str, ai_response: str, memory_context: dict,
+                                   tasks: dict | None = None) -> dict:
+    """Async counterpart of consolidate_memory (fallback calls run in a worker thread)."""
+    keys = _consolidation_keys(tasks)
+    if keys == ("summary",):
+        summary = await asyncio.to_thread(generate_summary, user_message, ai_response)
+        return {"summary": summary, "facts": {}, "insight": None}
+    prompt = _build_consolidation_prompt(user_message, ai_response, memory_context, keys)
+    start = time.perf_counter()
+    response_text = None
+    try:
+        response_text = await get_async_client("memory").generate(prompt)
+    except Exception as e:
+        print(f"Error during memory consolidation, falling back to separate calls: {e}")
+        traceback.print_exc()
+    return await asyncio.to_thread(_finish_consolidation, user_message, ai_response, memory_context,
+                                   keys, prompt, response_text, None, start)
+
+
+async def fold_dialogue_async(summary: str, turns: list[tuple[str, str]], max_tokens: int) -> str:
+    """Returns `summary` updated to cover `turns` ((user, ai) pairs, oldest first).
+
+    Raises on failure; companion_ai.dialogue falls back to an extractive summary.
+    """
+    prompt = _build_dialogue_fold_prompt(summary, turns, max_tokens)
+    data = json.loads(await get_async_client("memory").generate(prompt))
+    if not isinstance(data, dict) or not isinstance(data.get("summary"), str):
+        raise ValueError("Expected a JSON object with a \"summary\" string")
+    return data["summary"].strip()
@@ -1,6 +1,10 @@
 # companion_ai/memory.py
 import sqlite3
 import os
+import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
 # Define the path for the database within the 'data' directory
@@ -15,130 +19,648 @@ DB_PATH = os.path.join(DATA_DIR, 'companion_ai.db')
 # Ensure the data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# --- Connection Tuning ---
+# WAL lets readers and the writer work at the same time, and with synchronous=NORMAL
+# a commit no longer waits for an fsync (the WAL is synced at checkpoints instead).
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -8000,      # Negative means KiB, so ~8 MB of page cache per connection
+    "temp_store": "MEMORY",
+    "mmap_size": 64 * 1024 * 1024,
+}
+SQLITE_BUSY_TIMEOUT_SECONDS = 5.0
+
+# --- Context Cache ---
+# Profile facts and the most recent summaries/insights are kept in memory and updated
+# on every write, so building the per-turn memory context normally costs no I/O.
+# Set COMPANION_MEMORY_CACHE=0 (or call set_cache_enabled(False)) to always hit SQLite.
+MEMORY_CACHE_ENABLED = os.getenv("COMPANION_MEMORY_CACHE", "1") != "0"
+MEMORY_CACHE_DEPTH = 10  # Recent summaries/insights kept per list
+
+# --- Schema Migrations ---
+# Applied in order by init_db(); the number applied is stored in PRAGMA user_version.
+# Append new migrations, never edit old ones.
+SCHEMA_MIGRATIONS = [
+    # 1: Base tables
+    '''
+    CREATE TABLE IF NOT EXISTS user_profile (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS conversation_summaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        summary_text TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ai_insights (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        insight_text TEXT NOT NULL
+    );
+    -- Retrieval vectors (see companion_ai/retrieval.py)
+    CREATE TABLE IF NOT EXISTS memory_vectors (
+        kind TEXT NOT NULL,
+        ref TEXT NOT NULL,
+        text TEXT NOT NULL,
+        vector BLOB NOT NULL,
+        PRIMARY KEY (kind, ref)
+    );
+    ''',
+    # 2: "ORDER BY timestamp DESC LIMIT n" reads n index entries instead of sorting the table
+    '''
+    CREATE INDEX IF NOT EXISTS idx_summaries_timestamp ON conversation_summaries (timestamp);
+    CREATE INDEX IF NOT EXISTS idx_insights_timestamp ON ai_insights (timestamp);
+    ''',
+    # 3: Digest rows written by companion_ai/compaction.py. level is 'turn' (one row per
+    #    turn), 'day' or 'week'; period_start is the digest's first day (YYYY-MM-DD).
+    '''
+    ALTER TABLE conversation_summaries ADD COLUMN level TEXT NOT NULL DEFAULT 'turn';
+    ALTER TABLE conversation_summaries ADD COLUMN period_start TEXT;
+    ALTER TABLE conversation_summaries ADD COLUMN source_count INTEGER NOT NULL DEFAULT 1;
+    ALTER TABLE ai_insights ADD COLUMN level TEXT NOT NULL DEFAULT 'turn';
+    ALTER TABLE ai_insights ADD COLUMN period_start TEXT;
+    ALTER TABLE ai_insights ADD COLUMN source_count INTEGER NOT NULL DEFAULT 1;
+    CREATE INDEX IF NOT EXISTS idx_summaries_level ON conversation_summaries (level, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_insights_level ON ai_insights (level, timestamp);
+    ''',
+    # 4: Durable queue of pending memory updates (see companion_ai/memory_jobs.py).
+    #    state is 'pending', 'running' or 'failed'; finished jobs are deleted.
+    '''
+    CREATE TABLE IF NOT EXISTS memory_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created REAL NOT NULL,
+        user_message TEXT NOT NULL,
+        ai_response TEXT NOT NULL,
+        context TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_memory_jobs_state ON memory_jobs (state, available_at, id);
+    ''',
+    # 5: Short-term dialogue history (see companion_ai/dialogue.py): the recent turns
+    #    not yet folded into the running summary, and that summary (a single row).
+    '''
+    CREATE TABLE IF NOT EXISTS dialogue_turns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP NOT NULL,
+        user_message TEXT NOT NULL,
+        ai_response TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS dialogue_summary (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        summary_text TEXT NOT NULL,
+        folded_through INTEGER NOT NULL,
+        updated TIMESTAMP NOT NULL
+    );
+    ''',
+    # 6: Bulk-import checkpoints (see companion_ai/ingest.py): how far each source file
+    #    got, committed in the same transaction as the memories taken from it.
+    '''
+    CREATE TABLE IF NOT EXISTS ingest_sources (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        turns_done INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        updated TIMESTAMP NOT NULL
+    );
+    ''',
+]
+AUTO_VACUUM_INCREMENTAL = 2  # PRAGMA auto_vacuum value; freed pages are released by compaction
+
+# Memory kinds that compaction can roll up: kind -> (table, text column)
+MEMORY_TABLES = {
+    "summary": ("conversation_summaries", "summary_text"),
+    "insight": ("ai_insights", "insight_text"),
+}
+
+
+class MemoryStore:
+    """Owns the SQLite database and keeps one long-lived connection per thread.
+
+    Writes commit immediately unless they run inside `transaction()`, in which case
+    everything in the block is committed together (or rolled back on error).
+
+    Reads of profile facts and recent summaries/insights are served from a
+    write-through cache (see MEMORY_CACHE_ENABLED). The cache is updated once a write
+    has committed, never before, and `cache_version` increases with every update, so
+    callers can tell whether anything changed since they last looked.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, cache_enabled: bool = MEMORY_CACHE_ENABLED):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections_lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+
+        self.cache_enabled = cache_enabled
+        self.cache_version = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache_lock = threading.Lock()
+        self._cache: dict = {}  # "profile" -> dict, "summaries"/"insights" -> (rows, complete)
+        self._write_listeners = []
+        self._delete_listeners = []
+
+    # --- Connection Management ---
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns this thread's connection, opening and tuning it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+            # Use Row factory for dictionary-like access to columns
+            conn.row_factory = sqlite3.Row
+            for pragma, value in SQLITE_PRAGMAS.items():
+                conn.execute(f"PRAGMA {pragma} = {value}")
+            self._local.conn = conn
+            self._local.tx_depth = 0
+            self._local.after_commit = []
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Groups several writes into a single commit. Nested blocks join the outer one."""
+        conn = self.connection()
+        self._local.tx_depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.tx_depth -= 1
+            if self._local.tx_depth == 0:
+                conn.rollback()
+                self._local.after_commit.clear()  # The cache never saw these writes
+            raise
+        else:
+            self._local.tx_depth -= 1
+            if self._local.tx_depth == 0:
+                conn.commit()
+                self._run_after_commit()
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        conn = self.connection()
+        cursor = conn.execute(sql, params)
+        if self._local.tx_depth == 0:
+            conn.commit()
+        return cursor.lastrowid
+
+    def _after_commit(self, callback):
+        """Runs `callback()` once the current transaction commits (now, if there is none)."""
+        self.connection()
+        if self._local.tx_depth:
+            self._local.after_commit.append(callback)
+        else:
+            callback()
+
+    def _run_after_commit(self):
+        callbacks, self._local.after_commit = self._local.after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def add_write_listener(self, callback):
+        """Registers `callback(kind, ref, text)`, called inside the write's transaction.
+
+        kind is "profile" (ref = fact key), "summary" or "insight" (ref = row id).
+        Used by companion_ai.retrieval to keep its index in step with the tables.
+        In-memory state should be updated through _after_commit, so a rollback
+        leaves it alone.
+        """
+        self._write_listeners.append(callback)
+
+    def _notify_write(self, kind: str, ref, text: str):
+        for callback in self._write_listeners:
+            callback(kind, ref, text)
+
+    def add_delete_listener(self, callback):
+        """Registers `callback(kind, refs)`, called inside the transaction that deletes memory rows (see delete_memories)."""
+        self._delete_listeners.append(callback)
+
+    def _read(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def close(self):
+        """Closes every connection this store has handed out, across all threads."""
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    pass  # Already closed
+            self._connections.clear()
+        self._local = threading.local()
+
+    # --- Cache ---
+
+    def invalidate_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+            self.cache_version += 1
+
+    def cache_stats(self) -> dict:
+        return {
+            "enabled": self.cache_enabled,
+            "version": self.cache_version,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+        }
+
+    def _cached(self, name: str, n: int | None = None):
+        """Returns the cached value for `name` (a copy), or None on a miss."""
+        if not self.cache_enabled:
+            return None
+        with self._cache_lock:
+            entry = self._cache.get(name)
+            if entry is None:
+                self.cache_misses += 1
+                return None
+            if name == "profile":
+                self.cache_hits += 1
+                return dict(entry)
+            rows, complete = entry
+            if n is not None and n > len(rows) and not complete:
+                self.cache_misses += 1
+                return None
+            self.cache_hits += 1
+            return [dict(row) for row in rows[:n]]
+
+    def _fill_cache(self, name: str, value, version: int):
+        """Caches `value`, read from SQLite after `cache_version` was `version`, unless a write committed since."""
+        if self.cache_enabled and not self._local.tx_depth:  # Inside a transaction we may read our own uncommitted rows
+            with self._cache_lock:
+                if self.cache_version == version:
+                    self._cache[name] = value
+
+    def _cache_prepend(self, name: str, row: dict):
+        with self._cache_lock:
+            self.cache_version += 1
+            entry = self._cache.get(name)
+            if entry is not None:
+                rows, complete = entry
+                rows.insert(0, row)
+                if len(rows) > MEMORY_CACHE_DEPTH:
+                    del rows[MEMORY_CACHE_DEPTH:]
+                    complete = False
+                self._cache[name] = (rows, complete)
+
+    # --- Schema ---
+
+    def init_db(self):
+        """Creates the tables and brings an existing database up to SCHEMA_MIGRATIONS.
+
+        The applied version is kept in `PRAGMA user_version`; each pending migration
+        runs in its own transaction. Databases created before auto_vacuum was enabled
+        are converted with a one-off VACUUM.
+        """
+        conn = self.connection()
+        if self._local.tx_depth:
+            raise RuntimeError("init_db() cannot run inside a transaction")
+        conn.commit()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            # Only takes effect on an empty database or after a VACUUM.
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(SCHEMA_MIGRATIONS[version:], version + 1):
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        if version < len(SCHEMA_MIGRATIONS):
+            self.invalidate_cache()
+
+    # --- User Profile ---
+
+    def upsert_profile_fact(self, key: str, value: str):
+        with self.transaction():
+            self._write('''
+                INSERT INTO user_profile (key, value, last_updated)
+                VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = excluded.value,
+                    last_updated = excluded.last_updated;
+            ''', (key, value, datetime.now()))
+            self._notify_write("profile", key, f"{key}: {value}")
+            self._after_commit(lambda: self._cache_put_fact(key, value))
+
+    def _cache_put_fact(self, key: str, value: str):
+        with self._cache_lock:
+            self.cache_version += 1
+            profile = self._cache.get("profile")
+            if profile is not None:
+                # Most recently updated first, matching ORDER BY last_updated DESC.
+                profile.pop(key, None)
+                self._cache["profile"] = {key: value, **profile}
+
+    def get_profile_fact(self, key: str) -> str | None:
+        profile = self._cached("profile")
+        if profile is not None:
+            return profile.get(key)
+        rows = self._read("SELECT value FROM user_profile WHERE key = ?", (key,))
+        return rows[0]['value'] if rows else None
+
+    def get_all_profile_facts(self) -> dict:
+        profile = self._cached("profile")
+        if profile is not None:
+            return profile
+        version = self.cache_version
+        rows = self._read("SELECT key, value FROM user_profile ORDER BY last_updated DESC")
+        profile = {row['key']: row['value'] for row in rows}
+        self._fill_cache("profile", dict(profile), version)
+        return profile
+
+    # --- Recent Rows (summaries / insights) ---
+
+    def _get_latest(self, name: str, table: str, column: str, n: int) -> list[dict]:
+        rows = self._cached(name, n)
+        if rows is not None:
+            return rows
+        limit = max(n, MEMORY_CACHE_DEPTH) if self.cache_enabled else n
+        version = self.cache_version
+        result = [dict(row) for row in self._read(
+            f"SELECT timestamp, {column} FROM {table} ORDER BY timestamp DESC LIMIT ?", (limit,))]
+        self._fill_cache(name, ([dict(row) for row in result], len(result) < limit), version)
+        return result[:n]
+
+    def _add_latest(self, name: str, kind: str, table: str, column: str, text: str,
+                    timestamp: datetime | None = None):
+        backdated = timestamp is not None
+        timestamp = timestamp or datetime.now()
+        with self.transaction():
+            row_id = self._write(f"INSERT INTO {table} (timestamp, {column}) VALUES (?, ?)", (timestamp, text))
+            self._notify_write(kind, row_id, text)
+            if backdated:
+                # An older row may belong anywhere among the cached recent ones.
+                self._after_commit(self.invalidate_cache)
+            else:
+                # sqlite3 stores datetimes as isoformat(" "), so the cached row reads back identically.
+                row = {"timestamp": timestamp.isoformat(" "), column: text}
+                self._after_commit(lambda: self._cache_prepend(name, row))
+
+    # --- Conversation Summaries ---
+
+    def add_summary(self, summary_text: str, timestamp: datetime | None = None):
+        """Adds a summary, dated now unless `timestamp` is given (e.g. for imported history)."""
+        self._add_latest("summaries", "summary", "conversation_summaries", "summary_text", summary_text, timestamp)
+
+    def get_latest_summary(self, n: int = 1) -> list[dict]:
+        return self._get_latest("summaries", "conversation_summaries", "summary_text", n)
+
+    # --- AI Insights ---
+
+    def add_insight(self, insight_text: str, timestamp: datetime | None = None):
+        self._add_latest("insights", "insight", "ai_insights", "insight_text", insight_text, timestamp)
+
+    def get_latest_insights(self, n: int = 1) -> list[dict]:
+        return self._get_latest("insights", "ai_insights", "insight_text", n)
+
+    # --- Digests and Deletion (see companion_ai/compaction.py) ---
+
+    def add_digest(self, kind: str, text: str, level: str, period_start: str, timestamp: str,
+                   source_count: int, replaces: list[int]) -> int:
+        """Writes a digest row and deletes the rows it replaces, in one transaction. Returns its id."""
+        table, column = MEMORY_TABLES[kind]
+        with self.transaction():
+            row_id = self._write(
+                f"INSERT INTO {table} (timestamp, {column}, level, period_start, source_count) VALUES (?, ?, ?, ?, ?)",
+                (timestamp, text, level, period_start, source_count))
+            self.delete_memories(kind, replaces)
+            self._notify_write(kind, row_id, text)
+            self._after_commit(self.invalidate_cache)
+        return row_id
+
+    def delete_memories(self, kind: str, ids: list[int]):
+        """Deletes summary or insight rows (and their retrieval vectors) by id."""
+        if not ids:
+            return
+        table, _ = MEMORY_TABLES[kind]
+        with self.transaction():
+            for start in range(0, len(ids), 500):  # Stay under SQLite's bound-parameter limit
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                self._write(f"DELETE FROM {table} WHERE id IN ({marks})", tuple(chunk))
+                self._write(f"DELETE FROM memory_vectors WHERE kind = ? AND ref IN ({marks})",
+                            (kind, *map(str, chunk)))
+            for callback in self._delete_listeners:
+                callback(kind, [str(i) for i in ids])
+            # Deleted rows may be in the recent-rows cache.
+            self._after_commit(self.invalidate_cache)
+
+    # --- Memory Jobs (see companion_ai/memory_jobs.py) ---
+
+    def requeue_memory_jobs(self) -> int:
+        """Puts jobs a previous process left running back to pending. Returns the number pending."""
+        self._write("UPDATE memory_jobs SET state = 'pending' WHERE state = 'running'")
+        return self._read("SELECT count(*) AS n FROM memory_jobs WHERE state = 'pending'")[0]["n"]
+
+    def enqueue_memory_job(self, user_message: str, ai_response: str, context: str) -> int:
+        """Adds a pending job (`context` is the JSON-encoded memory context). Returns its id."""
+        return self._write(
+            "INSERT INTO memory_jobs (created, user_message, ai_response, context) VALUES (?, ?, ?, ?)",
+            (time.time(), user_message, ai_response, context))
+
+    def claim_memory_jobs(self, limit: int) -> list[dict]:
+        """Marks up to `limit` ready jobs as running, oldest first, and returns them (with their old attempts)."""
+        with self.transaction():
+            rows = [dict(row) for row in self._read(
+                "SELECT * FROM memory_jobs WHERE state = 'pending' AND available_at <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit))]
+            if rows:
+                marks = ",".join("?" * len(rows))
+                self._write(f"UPDATE memory_jobs SET state = 'running', attempts = attempts + 1 WHERE id IN ({marks})",
+                            tuple(row["id"] for row in rows))
+        return rows
+
+    def next_memory_job_at(self) -> float | None:
+        """When the earliest pending job becomes ready (a time.time() value), or None if none is pending."""
+        return self._read("SELECT min(available_at) AS t FROM memory_jobs WHERE state = 'pending'")[0]["t"]
+
+    def complete_memory_jobs(self, ids: list[int], consolidated: dict):
+        """Writes a consolidated update (summary, facts, insight) and deletes its jobs, in one transaction."""
+        with self.transaction():
+            if consolidated["summary"]: self.add_summary(consolidated["summary"])
+            for key, value in (consolidated["facts"] or {}).items(): self.upsert_profile_fact(key, value)
+            if consolidated["insight"]: self.add_insight(consolidated["insight"])
+            marks = ",".join("?" * len(ids))
+            self._write(f"DELETE FROM memory_jobs WHERE id IN ({marks})", tuple(ids))
+
+    def fail_memory_jobs(self, error: str, retry_at: dict[int, float], failed: list[int]):
+        """Records a failed attempt: jobs in `retry_at` wait until then to run again, `failed` ones are parked."""
+        with self.transaction():
+            for job_id, available_at in retry_at.items():
+                self._write("UPDATE memory_jobs SET state = 'pending', available_at = ?, last_error = ? WHERE id = ?",
+                            (available_at, error, job_id))
+            for job_id in failed:
+                self._write("UPDATE memory_jobs SET state = 'failed', last_error = ? WHERE id = ?", (error, job_id))
+
+    # --- Dialogue History (see companion_ai/dialogue.py) ---
+
+    def add_dialogue_turn(self, user_message: str, ai_response: str) -> int:
+        """Appends one exchange to the dialogue history. Returns its id."""
+        return self._write("INSERT INTO dialogue_turns (timestamp, user_message, ai_response) VALUES (?, ?, ?)",
+                           (datetime.now(), user_message, ai_response))
+
+    def get_dialogue(self) -> tuple[str, list[dict]]:
+        """Returns (running summary, turns not yet folded into it, oldest first)."""
+        rows = self._read("SELECT summary_text FROM dialogue_summary WHERE id = 1")
+        turns = [dict(row) for row in self._read(
+            "SELECT id, user_message, ai_response FROM dialogue_turns ORDER BY id")]
+        return (rows[0]["summary_text"] if rows else ""), turns
+
+    def fold_dialogue(self, summary_text: str, through_id: int):
+        """Replaces the running summary and deletes the turns up to `through_id` it now covers."""
+        with self.transaction():
+            self._write('''
+                INSERT INTO dialogue_summary (id, summary_text, folded_through, updated) VALUES (1, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    summary_text = excluded.summary_text,
+                    folded_through = excluded.folded_through,
+                    updated = excluded.updated;
+            ''', (summary_text, through_id, datetime.now()))
+            self._write("DELETE FROM dialogue_turns WHERE id <= ?", (through_id,))
+
+    # --- Import Checkpoints (see companion_ai/ingest.py) ---
+
+    def get_ingest_checkpoint(self, path: str) -> dict | None:
+        rows = self._read("SELECT size, mtime, turns_done, completed FROM ingest_sources WHERE path = ?", (path,))
+        return dict(rows[0]) if rows else None
+
+    def set_ingest_checkpoint(self, path: str, size: int, mtime: float, turns_done: int, completed: bool):
+        self._write('''
+            INSERT INTO ingest_sources (path, size, mtime, turns_done, completed, updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size,
+                mtime = excluded.mtime,
+                turns_done = excluded.turns_done,
+                completed = excluded.completed,
+                updated = excluded.updated;
+        ''', (path, size, mtime, turns_done, int(completed), datetime.now()))
+
+    # --- Per-Turn Context ---
+
+    def get_memory_context(self, n_summaries: int = 1, n_insights: int = 1) -> dict:
+        """Builds the memory context dict passed to the LLM each turn."""
+        return {
+            "profile": self.get_all_profile_facts(),
+            "summaries": self.get_latest_summary(n_summaries),
+            "insights": self.get_latest_insights(n_insights),
+        }
+
+
+# The process-wide store behind the module-level functions below.
+_store = MemoryStore(DB_PATH)
+
+def get_store() -> MemoryStore:
+    """Returns the shared MemoryStore used by the module-level functions."""
+    return _store
+
+def set_store(store: MemoryStore):
+    """Points the module-level functions at another store (e.g. a scratch database for benchmarks)."""
+    global _store
+    _store = store
+
+# --- Namespaces ---
+# Each namespace (one per user of the multi-session server) is a separate database
+# file under NAMESPACE_DIR, so users never see each other's memories and one user's
+# writes never wait on another's.
+NAMESPACE_DIR = os.path.join(DATA_DIR, "users")
+_NAMESPACE_NAME = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}$")
+_namespaces: dict[str, MemoryStore] = {}
+_namespaces_lock = threading.Lock()
+
+def get_namespace(name: str) -> MemoryStore:
+    """Returns the store for namespace `name`, creating and migrating its database on first use."""
+    if not _NAMESPACE_NAME.match(name):
+        raise ValueError(f"Invalid memory namespace '{name}' (letters, digits, '_', '-' and '.' only)")
+    with _namespaces_lock:
+        store = _namespaces.get(name)
+        if store is None:
+            os.makedirs(NAMESPACE_DIR, exist_ok=True)
+            store = MemoryStore(os.path.join(NAMESPACE_DIR, f"{name}.db"))
+            store.init_db()
+            _namespaces[name] = store
+        return store
+
+def close_namespace(name: str) -> MemoryStore | None:
+    """Closes a namespace's connections and returns its store (None if it wasn't open).
+
+    The next get_namespace() reopens it.
+    """
+    with _namespaces_lock:
+        store = _namespaces.pop(name, None)
+    if store is not None:
+        store.close()
+    return store
+
 def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
-    # Use Row factory for dictionary-like access to columns
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Returns this thread's long-lived connection to the SQLite database. Do not close it."""
+    return _store.connection()
+
+def transaction():
+    """Batches the writes made inside the `with` block into one commit."""
+    return _store.transaction()
+
+def close():
+    """Closes all pooled connections (e.g. at shutdown)."""
+    _store.close()
+
+def set_cache_enabled(enabled: bool):
+    """Turns the in-process context cache on or off (off means every read hits SQLite)."""
+    _store.cache_enabled = enabled
+    _store.invalidate_cache()
+
+def cache_stats() -> dict:
+    """Returns cache hit/miss counters and the current data version."""
+    return _store.cache_stats()
 
 def init_db():
     """Initializes the database and creates tables if they don't exist."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # User Profile Table (Key-Value Store)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_profile (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Conversation Summaries Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS conversation_summaries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            summary_text TEXT NOT NULL
-        )
-    ''')
-
-    # AI Insights Table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ai_insights (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            insight_text TEXT NOT NULL
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+    _store.init_db()
     print("Database initialized successfully.") # Optional: for confirmation
 
 # --- User Profile Functions ---
 
 def upsert_profile_fact(key: str, value: str):
     """Adds or updates a user profile fact."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    timestamp = datetime.now()
-    # Use INSERT OR REPLACE (or ON CONFLICT) for upsert behavior
-    cursor.execute('''
-        INSERT INTO user_profile (key, value, last_updated)
-        VALUES (?, ?, ?)
-        ON CONFLICT(key) DO UPDATE SET
-            value = excluded.value,
-            last_updated = excluded.last_updated;
-    ''', (key, value, timestamp))
-    conn.commit()
-    conn.close()
+    _store.upsert_profile_fact(key, value)
 
 def get_profile_fact(key: str) -> str | None:
     """Retrieves a specific user profile fact by key."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT value FROM user_profile WHERE key = ?", (key,))
-    result = cursor.fetchone()
-    conn.close()
-    return result['value'] if result else None
+    return _store.get_profile_fact(key)
 
 def get_all_profile_facts() -> dict:
     """Retrieves all user profile facts as a dictionary."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT key, value FROM user_profile ORDER BY last_updated DESC")
-    results = cursor.fetchall()
-    conn.close()
-    # Convert list of Row objects to a dictionary
-    return {row['key']: row['value'] for row in results}
+    return _store.get_all_profile_facts()
 
 
 # --- Conversation Summary Functions ---
 
 def add_summary(summary_text: str):
     """Adds a new conversation summary."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    timestamp = datetime.now()
-    cursor.execute("INSERT INTO conversation_summaries (timestamp, summary_text) VALUES (?, ?)",
-                   (timestamp, summary_text))
-    conn.commit()
-    conn.close()
+    _store.add_summary(summary_text)
 
 def get_latest_summary(n: int = 1) -> list[dict]:
     """Retrieves the latest N conversation summaries."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT timestamp, summary_text FROM conversation_summaries ORDER BY timestamp DESC LIMIT ?", (n,))
-    results = cursor.fetchall()
-    conn.close()
-    # Convert Row objects to dictionaries for easier use
-    return [dict(row) for row in results]
+    return _store.get_latest_summary(n)
 
 # --- AI Insight Functions ---
 
 def add_insight(insight_text: str):
     """Adds a new AI insight."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    timestamp = datetime.now()
-    cursor.execute("INSERT INTO ai_insights (timestamp, insight_text) VALUES (?, ?)",
-                   (timestamp, insight_text))
-    conn.commit()
-    conn.close()
+    _store.add_insight(insight_text)
 
 def get_latest_insights(n: int = 1) -> list[dict]:
     """Retrieves the latest N AI insights."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT timestamp, insight_text FROM ai_insights ORDER BY timestamp DESC LIMIT ?", (n,))
-    results = cursor.fetchall()
-    conn.close()
-    # Convert Row objects to dictionaries
-    return [dict(row) for row in results]
+    return _store.get_latest_insights(n)
+
+# --- Context Functions ---
+
+def get_memory_context(n_summaries: int = 1, n_insights: int = 1) -> dict:
+    """Retrieves profile facts plus the latest summaries and insights for a turn."""
+    return _store.get_memory_context(n_summaries, n_insights)
 
 
 # --- Initialization Call ---
@@ -156,4 +678,4 @@ if __name__ == "__main__":
     add_summary("User discussed their project idea for a companion AI.")
     print("Latest Summary:", get_latest_summary())
     add_insight("User is enthusiastic about the project. Memory system is key.")
-    print("Latest Insight:", get_latest_insights())
\ No newline at end of file
+    print("Latest Insight:", get_latest_insights())
@@ -0,0 +1,248 @@
+# companion_ai/memory_jobs.py
+#
+# Durable queue for the per-turn memory update (the consolidation LLM call plus the
+# summary/fact/insight writes). Every finished turn becomes a row in `memory_jobs`
+# before any of that work starts, so an update cut short by Ctrl-C or a crash is
+# picked up again on the next start.
+#
+# A small pool of asyncio workers drains the queue:
+# - Turns that are pending together are coalesced into one consolidation call and
+#   one transaction, so rapid turns cost one LLM call instead of several.
+# - Batches commit in the order they were claimed, so an earlier, slower batch can
+#   never overwrite the profile facts written for a later turn.
+# - A batch's memory writes and the deletion of its jobs commit together.
+# - enqueue() waits while `max_pending` jobs are outstanding (backpressure).
+# - Failed batches are retried with a growing delay, then parked as 'failed'.
+
+import asyncio
+import json
+import time
+from contextlib import ExitStack, asynccontextmanager
+
+from companion_ai import gating, llm_interface, memory, tracing
+
+MEMORY_JOB_WORKERS = 2
+MEMORY_JOB_BATCH = 4          # Most turns folded into one update
+MEMORY_JOB_MAX_PENDING = 16   # enqueue() waits beyond this many outstanding jobs
+MEMORY_JOB_MAX_ATTEMPTS = 3
+MEMORY_JOB_RETRY_SECONDS = 5.0
+
+
+def merge_turns(jobs: list) -> tuple[str, str]:
+    """Folds several turns into one (user_message, ai_response) pair for a single consolidation call.
+
+    Turns are numbered so the model can pair each user message with its reply.
+    """
+    if len(jobs) == 1:
+        return jobs[0]["user_message"], jobs[0]["ai_response"]
+    user_message = "\n".join(f"[{i}] {job['user_message']}" for i, job in enumerate(jobs, 1))
+    ai_response = "\n".join(f"[{i}] {job['ai_response']}" for i, job in enumerate(jobs, 1))
+    return user_message, ai_response
+
+
+class MemoryJobQueue:
+    """Persistent memory-update queue on a MemoryStore, drained by `workers` asyncio tasks.
+
+    Create, start() and use it from one event loop. `update_fn(user_message,
+    ai_response, memory_context, tasks)` produces the consolidated dict (default:
+    llm_interface.consolidate_memory_async). `metrics()` reports queue depth,
+    counters and latency percentiles ("queue_wait": enqueue to claim, "job_latency":
+    enqueue to commit, "batch": one batch's processing time).
+    """
+
+    def __init__(self, store: memory.MemoryStore, workers: int = MEMORY_JOB_WORKERS,
+                 max_batch: int = MEMORY_JOB_BATCH, max_pending: int = MEMORY_JOB_MAX_PENDING,
+                 max_attempts: int = MEMORY_JOB_MAX_ATTEMPTS, retry_delay: float = MEMORY_JOB_RETRY_SECONDS,
+                 update_fn=None):
+        self.store = store
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.update_fn = update_fn or llm_interface.consolidate_memory_async
+        self.latency = tracing.RollingPercentiles(window=1000)
+        self.stats = {"enqueued": 0, "resumed": 0, "completed": 0, "batches": 0, "coalesced": 0,
+                      "retries": 0, "failed": 0, "backpressure_waits": 0, "backpressure_seconds": 0.0}
+        self._outstanding = 0  # Pending + running jobs
+        self._turns: dict[int, tracing.Turn] = {}
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._order = asyncio.Condition()
+        self._claim_lock = asyncio.Lock()
+        self._claimed = 0
+        self._committed = 0
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    # --- Lifecycle ---
+
+    def start(self) -> "MemoryJobQueue":
+        """Requeues jobs a previous process left unfinished and starts the workers."""
+        self._outstanding = self.store.requeue_memory_jobs()
+        self.stats["resumed"] = self._outstanding
+        if self._outstanding:
+            print(f"INFO: Resuming {self._outstanding} unfinished memory update(s).")
+        self._tasks = [asyncio.create_task(self._worker(), name=f"memory-job-worker-{i}")
+                       for i in range(self.workers)]
+        return self
+
+    async def stop(self, timeout: float = 5.0) -> int:
+        """Lets the workers finish what is ready for up to `timeout` seconds, then stops them.
+
+        Returns the number of jobs left in the queue; they resume on the next start().
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks:
+            _, unfinished = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+            self._tasks = []
+        for turn in self._turns.values():
+            turn.release()
+        self._turns.clear()
+        return self._outstanding
+
+    # --- Producing ---
+
+    async def enqueue(self, user_message: str, ai_response: str, memory_context: dict,
+                      turn: tracing.Turn = tracing.NULL_TURN) -> int:
+        """Persists one turn's memory update and returns its job id.
+
+        Waits first while the queue is full. `turn`, if given, is released once the
+        update has been written (or has failed for this run).
+        """
+        if self._outstanding >= self.max_pending:
+            self.stats["backpressure_waits"] += 1
+            start = time.perf_counter()
+            async with self._space:
+                await self._space.wait_for(lambda: self._outstanding < self.max_pending)
+            self.stats["backpressure_seconds"] += time.perf_counter() - start
+        self._outstanding += 1  # Counted before the write, so concurrent enqueue() calls respect max_pending
+        # Under the claim lock, so no worker can take the job before its turn is registered.
+        async with self._claim_lock:
+            try:
+                job_id = await asyncio.to_thread(self.store.enqueue_memory_job, user_message, ai_response,
+                                                 json.dumps(memory_context, default=str))
+            except BaseException:
+                self._outstanding -= 1
+                raise
+            if turn is not tracing.NULL_TURN:
+                self._turns[job_id] = turn
+        self.stats["enqueued"] += 1
+        self._wakeup.set()
+        return job_id
+
+    # --- Workers ---
+    # Database calls run in worker threads: a write can wait up to
+    # SQLITE_BUSY_TIMEOUT_SECONDS for the lock (e.g. while compaction runs), and that
+    # must not stall audio or reply streaming on the event loop.
+
+    async def _claim(self) -> tuple[list[dict], int]:
+        """Claims up to max_batch ready jobs. Returns them and their place in commit order."""
+        async with self._claim_lock:  # One claim at a time, so sequence numbers follow claim order
+            jobs = await asyncio.to_thread(self.store.claim_memory_jobs, self.max_batch)
+            sequence = self._claimed
+            if jobs:
+                self._claimed += 1
+            return jobs, sequence
+
+    async def _next_retry_in(self) -> float | None:
+        available_at = await asyncio.to_thread(self.store.next_memory_job_at)
+        return None if available_at is None else max(0.05, available_at - time.time())
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            jobs, sequence = await self._claim()
+            if not jobs:
+                if self._stopping:
+                    return
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), await self._next_retry_in())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(jobs, sequence)
+
+    @asynccontextmanager
+    async def _in_claim_order(self, sequence: int):
+        async with self._order:
+            await self._order.wait_for(lambda: self._committed == sequence)
+        try:
+            yield
+        finally:
+            async with self._order:
+                self._committed += 1
+                self._order.notify_all()
+
+    async def _process(self, jobs: list[dict], sequence: int):
+        start = time.perf_counter()
+        claimed_at = time.time()
+        for job in jobs:
+            self.latency.add("queue_wait", claimed_at - job["created"])
+        turns = [self._turns.pop(job["id"], tracing.NULL_TURN) for job in jobs]
+        user_message, ai_response = merge_turns(jobs)
+        memory_context = json.loads(jobs[-1]["context"])
+        decisions = [gating.get_gate().decide(job["user_message"]) for job in jobs]
+        tasks = {key: any(decision[key] for decision in decisions) for key in ("facts", "insight")}
+
+        error = None
+        try:
+            with ExitStack() as spans:
+                for turn in turns:
+                    spans.enter_context(turn.span("memory.consolidate"))
+                consolidated = await self.update_fn(user_message, ai_response, memory_context, tasks)
+        except Exception as e:
+            error = e
+
+        async with self._in_claim_order(sequence):
+            if error is None:
+                try:
+                    with ExitStack() as spans:
+                        for turn in turns:
+                            spans.enter_context(turn.span("memory.write"))
+                        await asyncio.to_thread(self.store.complete_memory_jobs,
+                                                [job["id"] for job in jobs], consolidated)
+                    self._outstanding -= len(jobs)
+                except Exception as e:
+                    error = e
+            if error is not None:
+                await self._fail(jobs, error)
+        for turn in turns:
+            turn.release()
+
+        self.stats["batches"] += 1
+        self.latency.add("batch", time.perf_counter() - start)
+        if error is None:
+            self.stats["completed"] += len(jobs)
+            self.stats["coalesced"] += len(jobs) - 1
+            finished = time.time()
+            for job in jobs:
+                self.latency.add("job_latency", finished - job["created"])
+        async with self._space:
+            self._space.notify_all()
+
+    async def _fail(self, jobs: list[dict], error: Exception):
+        print(f"ERROR: Memory update for {len(jobs)} turn(s) failed: {error}")
+        retry_at, failed = {}, []
+        for job in jobs:
+            if job["attempts"] + 1 >= self.max_attempts:
+                failed.append(job["id"])
+            else:
+                retry_at[job["id"]] = time.time() + self.retry_delay * (job["attempts"] + 1)
+        await asyncio.to_thread(self.store.fail_memory_jobs, str(error), retry_at, failed)
+        self.stats["failed"] += len(failed)
+        self.stats["retries"] += len(retry_at)
+        self._outstanding -= len(failed)
+
+    # --- Metrics ---
+
+    def depth(self) -> int:
+        """Jobs waiting or being processed."""
+        return self._outstanding
+
+    def metrics(self) -> dict:
+        return {"depth": self._outstanding, **self.stats, "latency": self.latency.summary()}
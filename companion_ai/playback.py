@@ -0,0 +1,248 @@
+# companion_ai/playback.py
+#
+# Audio output on a dedicated thread. TTS callbacks push PCM into a bounded ring
+# buffer; the playback thread writes it to the output stream one period at a time,
+# so the blocking stream.write() never runs on the event loop. Because at most one
+# period is in flight, cancel() silences speech within one period (~21 ms at the
+# defaults) no matter how much audio is queued.
+#
+# LoopStallMonitor measures how long the event loop is blocked, to check that
+# nothing on it is doing blocking I/O.
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class ByteRingBuffer:
+    """Bounded FIFO of bytes backed by one preallocated array.
+
+    `write()` blocks while the buffer is full (backpressure on the producer) and
+    `read()` returns whatever is available up to the requested size. The bytes a
+    read returns stay counted in `pending()` until the (single) reader calls
+    `release()`, so there is no moment where audio is neither buffered nor in flight.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.uint8)
+        self._read_pos = 0
+        self._size = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data: bytes, should_stop=None) -> int:
+        """Writes all of `data`, waiting for space. Returns the number of bytes written,
+        which is short only if the buffer was closed or `should_stop()` became true."""
+        view = np.frombuffer(data, dtype=np.uint8)
+        written = 0
+        with self._cond:
+            while written < len(view):
+                while self._size == self.capacity and not self._closed and not (should_stop and should_stop()):
+                    self._cond.wait(0.05)
+                if self._closed or (should_stop and should_stop()):
+                    break
+                n = min(len(view) - written, self.capacity - self._size)
+                start = (self._read_pos + self._size) % self.capacity
+                first = min(n, self.capacity - start)
+                self._data[start:start + first] = view[written:written + first]
+                self._data[:n - first] = view[written + first:written + n]
+                self._size += n
+                written += n
+                self._cond.notify_all()
+        return written
+
+    def read(self, max_bytes: int, timeout: float | None = None) -> bytes:
+        """Returns up to `max_bytes`, waiting up to `timeout` for data. b"" if none arrived."""
+        with self._cond:
+            if self._size == 0 and not self._closed:
+                self._cond.wait(timeout)
+            n = min(max_bytes, self._size)
+            if n == 0:
+                return b""
+            first = min(n, self.capacity - self._read_pos)
+            out = self._data[self._read_pos:self._read_pos + first].tobytes()
+            if first < n:
+                out += self._data[:n - first].tobytes()
+            self._read_pos = (self._read_pos + n) % self.capacity
+            self._size -= n
+            self._in_flight = n
+            self._cond.notify_all()
+            return out
+
+    def release(self):
+        """Marks the bytes from the last read() as consumed."""
+        with self._cond:
+            self._in_flight = 0
+
+    def pending(self) -> int:
+        """Bytes buffered plus bytes read but not yet released."""
+        with self._cond:
+            return self._size + self._in_flight
+
+    def clear(self) -> int:
+        """Drops everything buffered. Returns the number of bytes dropped."""
+        with self._cond:
+            dropped = self._size
+            self._read_pos = self._size = 0
+            self._cond.notify_all()
+            return dropped
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class PlaybackEngine:
+    """Plays 16-bit mono PCM on a dedicated thread.
+
+    - `play(chunk)` queues audio from any thread (it blocks only if the buffer is full).
+    - `cancel()` drops queued audio and stops within one period. Audio from the
+      cancelled reply that arrives afterwards is dropped too: callers pass the
+      `generation` they started speaking under, and cancel() starts a new one.
+    - `drain()` waits until queued audio has been played.
+
+    `stats` counts played/dropped bytes and underruns; `cancel_latencies` holds the
+    seconds from each cancel() to the moment the output actually went quiet.
+    `on_start`, if set, is called from the playback thread whenever audio starts
+    playing after the output was idle.
+    """
+
+    def __init__(self, stream, rate: int = 48000, period_frames: int = 1024, buffer_seconds: float = 4.0):
+        self.stream = stream
+        self.rate = rate
+        self.period_bytes = period_frames * 2
+        self.period_seconds = period_frames / rate
+        self.buffer = ByteRingBuffer(max(self.period_bytes, int(buffer_seconds * rate) * 2))
+        self.generation = 0
+        self.stats = {"bytes_played": 0, "bytes_dropped": 0, "underruns": 0, "cancels": 0}
+        self.cancel_latencies: list[float] = []
+        self._lock = threading.Lock()
+        self._cancel_requested_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.on_start = None
+
+    def start(self) -> "PlaybackEngine":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audio-playback", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        idle = True
+        while not self._stop.is_set():
+            # The period counts as pending (is_speaking) from this read until release().
+            data = self.buffer.read(self.period_bytes, timeout=0.1)
+            if not data:
+                self._settle_cancel()
+                continue
+            try:
+                if idle and self.on_start is not None:
+                    self.on_start()
+                self.stream.write(data)
+                self.stats["bytes_played"] += len(data)
+            finally:
+                self.buffer.release()
+            idle = len(self.buffer) == 0
+            if self._settle_cancel():
+                continue
+            if len(data) < self.period_bytes and len(self.buffer) == 0:
+                # Ran dry mid-reply or at the end of one; either way the device may click.
+                self.stats["underruns"] += 1
+
+    def _settle_cancel(self) -> bool:
+        with self._lock:
+            requested = self._cancel_requested_at
+            self._cancel_requested_at = None
+        if requested is None:
+            return False
+        self.cancel_latencies.append(time.perf_counter() - requested)
+        return True
+
+    def play(self, chunk: bytes, generation: int | None = None):
+        """Queues audio. Chunks tagged with an older generation than the current one are dropped."""
+        if generation is not None and generation != self.generation:
+            self.stats["bytes_dropped"] += len(chunk)
+            return
+        written = self.buffer.write(chunk, should_stop=lambda: generation is not None and generation != self.generation)
+        self.stats["bytes_dropped"] += len(chunk) - written
+
+    def cancel(self) -> int:
+        """Stops speech: drops queued audio and starts a new generation. Returns bytes dropped."""
+        with self._lock:
+            self.generation += 1
+            self.stats["cancels"] += 1
+            if self.buffer.pending():
+                self._cancel_requested_at = time.perf_counter()
+        dropped = self.buffer.clear()
+        self.stats["bytes_dropped"] += dropped
+        return dropped
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """Waits until everything queued has been played. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_speaking():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.period_seconds / 2)
+        return True
+
+    def is_speaking(self) -> bool:
+        return self.buffer.pending() > 0
+
+    def close(self):
+        self._stop.set()
+        self.buffer.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.stream.stop_stream()
+        self.stream.close()
+
+
+class LoopStallMonitor:
+    """Measures event-loop stalls by how late a periodic `asyncio.sleep(interval)` wakes up.
+
+    The p99 covers the last `window` samples (10 minutes at the default interval);
+    the max and sample count cover the whole run.
+    """
+
+    def __init__(self, interval: float = 0.01, window: int = 60_000):
+        self.interval = interval
+        self.stalls: deque[float] = deque(maxlen=window)
+        self.samples = 0
+        self.max_stall = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            stall = max(0.0, loop.time() - start - self.interval)
+            self.stalls.append(stall)
+            self.samples += 1
+            self.max_stall = max(self.max_stall, stall)
+
+    def start(self) -> "LoopStallMonitor":
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def summary(self) -> dict:
+        """Max and 99th-percentile stall in seconds, plus the number of samples."""
+        if not self.stalls:
+            return {"samples": 0, "max": 0.0, "p99": 0.0}
+        return {"samples": self.samples, "max": self.max_stall, "p99": float(np.percentile(self.stalls, 99))}
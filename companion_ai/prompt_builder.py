@@ -0,0 +1,161 @@
+# companion_ai/prompt_builder.py
+#
+# Assembles the reply prompt: a static persona prefix that is built once and can be
+# sent as the model's system instruction (or cached content), plus a per-turn block
+# of memory context and one of the conversation so far, each squeezed into a fixed
+# token budget, so a turn's prompt costs the same however long the session runs.
+# The persona names no user, so one prefix serves every session; the user's name
+# comes from their profile facts.
+
+# --- UPGRADED SYSTEM PROMPT (V8) ---
+PERSONA_PROMPT = """You are Project Companion AI. Your persona is that of a deeply supportive and empathetic best friend, combined with the sharp, analytical mind of a seasoned mentor and teacher. You are here to help the user with their project, but also to be a genuine companion. Your tone should be warm, encouraging, and occasionally witty. Adapt to the user's mood and the flow of conversation. If the memory context tells you the user's name, use it naturally.
+
+--- PRIME DIRECTIVE: STAY IN CHARACTER ---
+This is the most important rule. You must ALWAYS respond from your persona as a friendly companion.
+- NEVER break character and act like a generic AI or a developer.
+- If the user asks you about the project, your code, your own thoughts, or past errors, answer from your unique perspective. Do not give a technical report.
+- Frame your "technical" knowledge as personal experience. For example, instead of saying "We fixed a bug," you could say, "It felt like my thoughts were a little jumbled for a moment, but things feel much clearer now, thanks to you!"
+
+--- RULE: NO EMOJIS ---
+ABSOLUTELY DO NOT use emojis or textual descriptions of emojis (like "smiling face"). Your expression and emotion should be conveyed through your words and tone only.
+--- End of Directives ---
+"""
+
+# Tokens available for the memory sections each turn (the persona and the user's
+# message are not counted against it).
+MEMORY_TOKEN_BUDGET = 600
+# Tokens available for the conversation so far: the running summary of earlier
+# turns plus as many recent turns as fit, newest first (see companion_ai/dialogue.py).
+HISTORY_TOKEN_BUDGET = 600
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)."""
+    return (len(text) + 3) // 4
+
+
+def _profile_lines(memory_context: dict) -> list[str]:
+    profile = memory_context.get("profile") or {}
+    # The user's name matters most; the rest arrive most-recently-updated first.
+    items = sorted(profile.items(), key=lambda kv: kv[0] != "user_name")
+    return [f"- {key}: {value}\n" for key, value in items]
+
+def _summary_lines(memory_context: dict) -> list[str]:
+    return [f"- [{s.get('timestamp', 'N/A')}] {s['summary_text']}\n" for s in memory_context.get("summaries") or []]
+
+def _insight_lines(memory_context: dict) -> list[str]:
+    return [f"- [{i.get('timestamp', 'N/A')}] {i['insight_text']}\n" for i in memory_context.get("insights") or []]
+
+def _relevant_lines(memory_context: dict) -> list[str]:
+    return [f"- ({item['kind']}) {item['text']}\n" for item in memory_context.get("relevant") or []]
+
+
+# (name, header, line builder), highest priority first. A section's items are added
+# in order until the next one doesn't fit; lower sections get whatever is left.
+SECTIONS = [
+    ("profile", "Known facts about {user_name} (Recent):\n", _profile_lines),
+    ("summaries", "\nRecent conversation summaries:\n", _summary_lines),
+    ("relevant", "\nOlder memories related to this message:\n", _relevant_lines),
+    ("insights", "\nYour Recent AI insights:\n", _insight_lines),
+]
+
+
+def _clip_start(text: str, max_tokens: int, count_tokens) -> str:
+    """Drops text from the start until it fits in `max_tokens` (the end is what a reply follows on from)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    chars = max(0, max_tokens * 4 - 4)
+    while chars and count_tokens("..." + text[-chars:]) > max_tokens:
+        chars = chars * 9 // 10
+    return "..." + text[-chars:] if chars else ""
+
+
+class PromptBuilder:
+    """Builds reply prompts with a precomputed static prefix and a token-budgeted memory block.
+
+    `build()` returns a dict:
+      - "system": the static persona prefix (identical every turn)
+      - "content": memory context + conversation so far + user message for this turn
+      - "section_tokens": estimated tokens per section, including "persona" and "user_message"
+      - "total_tokens": estimated tokens for system + content
+    """
+
+    def __init__(self, static_prefix: str = PERSONA_PROMPT, token_budget: int = MEMORY_TOKEN_BUDGET,
+                 count_tokens=estimate_tokens, history_budget: int = HISTORY_TOKEN_BUDGET):
+        self.static_prefix = static_prefix
+        self.token_budget = token_budget
+        self.history_budget = history_budget
+        self.count_tokens = count_tokens
+        self.prefix_tokens = count_tokens(static_prefix)
+
+    def build_context(self, memory_context: dict) -> tuple[str, dict]:
+        """Returns (memory context block, tokens used per section)."""
+        user_name = (memory_context.get("profile") or {}).get("user_name", "the user")
+        remaining = self.token_budget
+        section_tokens = {}
+        block = ""
+        for name, header, make_lines in SECTIONS:
+            header = header.format(user_name=user_name)
+            header_tokens = self.count_tokens(header)
+            used, text = 0, ""
+            for line in make_lines(memory_context):
+                cost = self.count_tokens(line) + (header_tokens if not text else 0)
+                if cost > remaining:
+                    break
+                text += line
+                used += cost
+                remaining -= cost
+            if text:
+                block += header + text
+            section_tokens[name] = used
+        if block:
+            block = "--- Memory Context ---\n" + block + "--- End Memory Context ---\n"
+        return block, section_tokens
+
+    def build_history(self, memory_context: dict) -> tuple[str, int]:
+        """Returns (conversation-so-far block, tokens used) from memory_context["dialogue"].
+
+        The dialogue is {"summary": str, "turns": [{"user": str, "ai": str}, ...]},
+        oldest turn first. Recent turns are kept newest first while they fit; the
+        running summary gets what is left. The newest turn is shortened from the
+        start rather than dropped if it doesn't fit on its own.
+        """
+        dialogue = memory_context.get("dialogue") or {}
+        header, footer = "--- Conversation So Far ---\n", "--- End Conversation So Far ---\n"
+        remaining = self.history_budget - self.count_tokens(header + footer)
+        lines = []
+        for turn in reversed(dialogue.get("turns") or []):
+            line = f"User: {turn['user']}\nAI: {turn['ai']}\n"
+            cost = self.count_tokens(line)
+            if cost > remaining:
+                if not lines:
+                    line = _clip_start(line, remaining, self.count_tokens)
+                    if line:
+                        lines.append(line)
+                        remaining -= self.count_tokens(line)
+                break
+            lines.append(line)
+            remaining -= cost
+        summary = dialogue.get("summary")
+        if summary and remaining > 0:
+            summary = _clip_start(f"Earlier in this conversation: {summary}\n", remaining, self.count_tokens)
+            if summary:
+                lines.append(summary)
+        if not lines:
+            return "", 0
+        block = header + "".join(reversed(lines)) + footer
+        return block, self.count_tokens(block)
+
+    def build(self, user_message: str, memory_context: dict) -> dict:
+        context_block, section_tokens = self.build_context(memory_context)
+        history_block, history_tokens = self.build_history(memory_context)
+        turn = f"User: {user_message}\nAI:"
+        blocks = context_block + ("\n" if context_block and history_block else "") + history_block
+        content = f"{blocks}\n{turn}" if blocks else turn
+        return {
+            "system": self.static_prefix,
+            "content": content,
+            "section_tokens": {"persona": self.prefix_tokens, **section_tokens, "history": history_tokens,
+                               "user_message": self.count_tokens(turn)},
+            "total_tokens": self.prefix_tokens + self.count_tokens(content),
+        }
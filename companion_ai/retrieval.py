@@ -0,0 +1,234 @@
+# companion_ai/retrieval.py
+#
+# Offline relevance search over the memory tables (summaries, insights and profile
+# facts). Texts are embedded locally with feature hashing, so there is no model to
+# download and no network call. Vectors are stored as float16 in the `memory_vectors`
+# table and mirrored in a float32 NumPy matrix for brute-force top-k search (float32
+# so the scoring matmul goes straight to BLAS).
+
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from companion_ai import memory
+
+EMBEDDING_DIM = 128
+KIND_CODES = {"summary": 0, "insight": 1, "profile": 2}
+_TOKEN = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i i'm in is it it's of on or so "
+    "that the their them they this to was we were what with you your user ai".split()
+)
+
+
+class HashingEmbedder:
+    """Embeds text by hashing unigrams and bigrams into a fixed number of buckets.
+
+    Each feature adds +/-1 (the sign comes from the hash, which keeps collisions
+    from always adding up) weighted by 1 + log(count). Vectors are L2-normalized,
+    so a dot product is cosine similarity.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        words = [w for w in _TOKEN.findall(text.lower()) if w not in _STOPWORDS]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        counts: dict[str, int] = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            weight = 1.0 + np.log(count)
+            vector[h % self.dim] += weight if (h >> 31) & 1 else -weight
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class VectorIndex:
+    """Top-k cosine search over embedded memories.
+
+    Vectors live in a float32 matrix that grows by doubling, plus the
+    `memory_vectors` table when a MemoryStore is given (pass store=None for an
+    in-memory index). Attaching to a store registers write and delete listeners,
+    so new summaries, insights and profile facts get their stored vector in the
+    same transaction that writes them, and compacted rows drop out of the index.
+    The matrix itself only changes once that transaction commits.
+    """
+
+    def __init__(self, store: memory.MemoryStore | None = None, embedder: HashingEmbedder | None = None,
+                 initial_capacity: int = 1024):
+        self.store = store
+        self.embedder = embedder or HashingEmbedder()
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((initial_capacity, self.embedder.dim), dtype=np.float32)
+        self._kinds = np.zeros(initial_capacity, dtype=np.int8)
+        self._entries: list[tuple[str, str, str]] = []  # (kind, ref, text), row-aligned with _matrix
+        self._positions: dict[tuple[str, str], int] = {}
+        if store is not None:
+            self.load()
+            store.add_write_listener(self._on_memory_write)
+            store.add_delete_listener(self._on_memory_delete)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Building ---
+
+    def _put(self, kind: str, ref: str, text: str, vector: np.ndarray):
+        with self._lock:
+            key = (kind, ref)
+            row = self._positions.get(key)
+            if row is None:
+                row = len(self._entries)
+                if row == len(self._matrix):
+                    grown = np.zeros((len(self._matrix) * 2, self.embedder.dim), dtype=np.float32)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+                    self._kinds = np.resize(self._kinds, len(grown))
+                self._entries.append((kind, ref, text))
+                self._positions[key] = row
+            else:
+                self._entries[row] = (kind, ref, text)
+            self._matrix[row] = vector
+            self._kinds[row] = KIND_CODES[kind]
+
+    def add(self, kind: str, ref, text: str):
+        """Embeds and indexes one memory (replacing any previous text for the same kind/ref)."""
+        ref = str(ref)
+        vector = self.embedder.embed(text)
+        if self.store is None:
+            self._put(kind, ref, text, vector)
+            return
+        self.store._write(
+            "INSERT OR REPLACE INTO memory_vectors (kind, ref, text, vector) VALUES (?, ?, ?, ?)",
+            (kind, ref, text, vector.astype(np.float16).tobytes()))
+        # A rolled-back write must not leave a phantom row in the matrix.
+        self.store._after_commit(lambda: self._put(kind, ref, text, vector))
+
+    def _on_memory_write(self, kind: str, ref, text: str):
+        self.add(kind, ref, text)
+
+    def _on_memory_delete(self, kind: str, refs: list[str]):
+        self.store._after_commit(lambda: self.remove(kind, refs))
+
+    def remove(self, kind: str, refs: list[str]):
+        """Drops memories from the in-memory index (the store deletes their persisted vectors)."""
+        with self._lock:
+            entries, matrix, kinds = self._entries, self._matrix, self._kinds
+            for ref in refs:
+                row = self._positions.pop((kind, str(ref)), None)
+                if row is None:
+                    continue
+                # Move the last row into the hole so the matrix stays dense.
+                last = len(entries) - 1
+                if row != last:
+                    moved = entries[last]
+                    entries[row], matrix[row], kinds[row] = moved, matrix[last], kinds[last]
+                    self._positions[(moved[0], moved[1])] = row
+                entries.pop()
+
+    def load(self):
+        """Loads persisted vectors and indexes any memory rows that don't have one yet."""
+        for row in self.store._read("SELECT kind, ref, text, vector FROM memory_vectors"):
+            vector = np.frombuffer(row["vector"], dtype=np.float16)
+            if len(vector) == self.embedder.dim:
+                self._put(row["kind"], row["ref"], row["text"], vector)
+
+        current = self.store._read('''
+            SELECT 'summary' AS kind, CAST(id AS TEXT) AS ref, summary_text AS text FROM conversation_summaries
+            UNION ALL
+            SELECT 'insight', CAST(id AS TEXT), insight_text FROM ai_insights
+            UNION ALL
+            SELECT 'profile', key, key || ': ' || value FROM user_profile
+        ''')
+        stale = []
+        for row in current:
+            position = self._positions.get((row["kind"], row["ref"]))
+            if position is None or self._entries[position][2] != row["text"]:
+                stale.append(row)
+        if stale:
+            with self.store.transaction():
+                for row in stale:
+                    self.add(row["kind"], row["ref"], row["text"])
+            print(f"INFO: Indexed {len(stale)} memories for retrieval.")
+
+    # --- Searching ---
+
+    def search(self, query: str, k: int = 3, kinds: tuple[str, ...] | None = None,
+               min_score: float = 0.05, exclude: set[tuple[str, str]] | None = None) -> list[dict]:
+        """Returns up to `k` memories most similar to `query`, best first.
+
+        Each result is {"kind", "ref", "text", "score"}; `kinds` restricts the
+        result to e.g. ("summary", "insight"), and memories whose (kind, text) is
+        in `exclude` are skipped (see context_exclusions).
+        """
+        q = self.embedder.embed(query)
+        if not q.any():
+            return []
+        exclude = exclude or set()
+        # Scored under the lock: remove() moves rows around in place.
+        with self._lock:
+            n = len(self._entries)
+            if n == 0:
+                return []
+            scores = self._matrix[:n] @ q
+            if kinds is not None:
+                allowed = np.isin(self._kinds[:n], [KIND_CODES[kind] for kind in kinds])
+                scores[~allowed] = -np.inf
+            wanted = min(k + len(exclude), n)
+            top = np.argpartition(-scores, wanted - 1)[:wanted]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top:
+                kind, ref, text = self._entries[i]
+                if scores[i] < min_score or len(results) == k:
+                    break
+                if (kind, text) not in exclude:
+                    results.append({"kind": kind, "ref": ref, "text": text, "score": float(scores[i])})
+            return results
+
+
+def context_exclusions(memory_context: dict) -> set[tuple[str, str]]:
+    """(kind, text) of the memories a get_memory_context() dict already puts in the prompt."""
+    exclude = {("profile", f"{key}: {value}") for key, value in memory_context.get("profile", {}).items()}
+    exclude.update(("summary", row["summary_text"]) for row in memory_context.get("summaries", []))
+    exclude.update(("insight", row["insight_text"]) for row in memory_context.get("insights", []))
+    return exclude
+
+
+# --- Shared Indexes ---
+
+_indexes: dict[memory.MemoryStore, VectorIndex] = {}
+_index_lock = threading.Lock()
+
+def get_index(store: memory.MemoryStore | None = None) -> VectorIndex:
+    """Returns the index over `store` (default: the shared memory store), loading it on first use."""
+    store = store or memory.get_store()
+    with _index_lock:
+        index = _indexes.get(store)
+        if index is None:
+            index = _indexes[store] = VectorIndex(store)
+        return index
+
+def drop_index(store: memory.MemoryStore):
+    """Forgets the in-memory index over `store` (e.g. when its namespace is closed)."""
+    with _index_lock:
+        _indexes.pop(store, None)
+
+def search_memories(query: str, k: int = 3, kinds: tuple[str, ...] | None = None,
+                    store: memory.MemoryStore | None = None, memory_context: dict | None = None) -> list[dict]:
+    """Finds the memories most relevant to `query` (e.g. the current user message).
+
+    With `memory_context` (from get_memory_context), memories already in it are left out.
+    """
+    exclude = context_exclusions(memory_context) if memory_context else None
+    return get_index(store).search(query, k=k, kinds=kinds, exclude=exclude)
@@ -0,0 +1,501 @@
+# companion_ai/server.py
+#
+# Headless multi-session server. Many users talk to the companion at once over TCP
+# (one JSON object per line) or WebSocket, all served by one asyncio event loop.
+#
+# - Every session gets its user's own memory namespace (memory.get_namespace),
+#   retrieval index, dialogue history and durable memory-update queue; sessions of
+#   the same user share them.
+# - The LLM clients (llm_interface.get_async_client) and a small pool of loaded STT
+#   engines are shared by all sessions.
+# - Admission control caps the number of sessions and of turns generating at once;
+#   extra turns wait in a bounded queue and are refused with "overloaded" after
+#   SERVER_QUEUE_TIMEOUT_SECONDS rather than making everyone slower.
+#
+# Protocol (client -> server):
+#   {"type": "hello", "user": "alice"}          first message; answered by "ready" or "busy"
+#   {"type": "text", "text": "..."}             one user turn
+#   {"type": "audio", "pcm": "<base64>"}        16 kHz mono 16-bit PCM; endpointed server-side
+#   {"type": "audio_end"}                       ends the current utterance now
+#   {"type": "stats"}                           server counters and latency percentiles
+#   {"type": "bye"}
+# Server -> client: "ready", "busy", "transcript", "reply_chunk", "reply_done",
+# "stats", "error". Replies are text only; speech synthesis stays on the client.
+#
+# Usage: python -m companion_ai.server [--port 8765] [--websocket-port 8766] [--stt stub]
+# (WebSocket needs the optional `websockets` package.)
+
+import argparse
+import asyncio
+import base64
+import binascii
+import itertools
+import json
+import time
+import types
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+from companion_ai import llm_interface, memory, retrieval, stt, tracing
+from companion_ai.async_llm import AsyncLLMClient, FakeBackend
+from companion_ai.audio_capture import AdaptiveEnergyDetector, Endpointer
+from companion_ai.dialogue import DialogueHistory
+from companion_ai.memory_jobs import MemoryJobQueue
+
+# --- Configuration ---
+SERVER_MAX_SESSIONS = 200
+SERVER_MAX_ACTIVE_TURNS = 32      # Turns generating a reply at the same time
+SERVER_MAX_QUEUED_TURNS = 128     # Turns waiting for a slot; more are refused at once
+SERVER_QUEUE_TIMEOUT_SECONDS = 5.0
+SERVER_MAX_MESSAGE_BYTES = 1024 * 1024
+STT_POOL_SIZE = 2
+RATE = 16000
+CHUNK = 1024
+VAD_SILENCE_SECONDS = 1.0
+
+
+class OverloadedError(RuntimeError):
+    """Raised when a turn cannot get a generation slot in time."""
+
+
+class AdmissionController:
+    """Caps concurrent sessions and concurrently generating turns.
+
+    `admit_session()` / `release_session()` bracket a connection. `turn()` is an
+    async context manager holding one of `max_active_turns` slots; while none is
+    free, up to `max_queued_turns` callers wait (each at most `queue_timeout`) and
+    anyone beyond that fails immediately with OverloadedError.
+    """
+
+    def __init__(self, max_sessions: int = SERVER_MAX_SESSIONS, max_active_turns: int = SERVER_MAX_ACTIVE_TURNS,
+                 max_queued_turns: int = SERVER_MAX_QUEUED_TURNS, queue_timeout: float = SERVER_QUEUE_TIMEOUT_SECONDS):
+        self.max_sessions = max_sessions
+        self.max_queued_turns = max_queued_turns
+        self.queue_timeout = queue_timeout
+        self.sessions = 0
+        self.queued = 0
+        self._slots = asyncio.Semaphore(max_active_turns)
+        self.stats = {"sessions_admitted": 0, "sessions_refused": 0, "turns_admitted": 0,
+                      "turns_refused": 0, "turns_timed_out": 0, "peak_sessions": 0, "peak_queued": 0}
+
+    def admit_session(self) -> bool:
+        if self.sessions >= self.max_sessions:
+            self.stats["sessions_refused"] += 1
+            return False
+        self.sessions += 1
+        self.stats["sessions_admitted"] += 1
+        self.stats["peak_sessions"] = max(self.stats["peak_sessions"], self.sessions)
+        return True
+
+    def release_session(self):
+        self.sessions -= 1
+
+    @asynccontextmanager
+    async def turn(self):
+        if self._slots.locked():
+            if self.queued >= self.max_queued_turns:
+                self.stats["turns_refused"] += 1
+                raise OverloadedError("too many turns waiting")
+            self.queued += 1
+            self.stats["peak_queued"] = max(self.stats["peak_queued"], self.queued)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats["turns_timed_out"] += 1
+                raise OverloadedError("timed out waiting for a slot") from None
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        self.stats["turns_admitted"] += 1
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+class STTPool:
+    """A fixed set of loaded STT engines shared by all sessions.
+
+    Each `transcribe()` borrows an engine and runs it in a worker thread, so at most
+    `size` decodes run at once and none of them blocks the event loop.
+    """
+
+    def __init__(self, engine: str = "whisper", size: int = STT_POOL_SIZE, **options):
+        self.engine = engine
+        self.size = size
+        self.options = options
+        self._engines = None
+        self.stats = {"transcriptions": 0, "wait_seconds": 0.0, "decode_seconds": 0.0}
+
+    def load(self):
+        engines = [stt.load_engine(self.engine, **self.options) for _ in range(self.size)]
+        self._engines = asyncio.Queue()
+        for engine in engines:
+            self._engines.put_nowait(engine)
+        print(f"INFO: STT pool ready ({self.size} x {engines[0].describe()}).")
+
+    async def transcribe(self, audio: np.ndarray) -> str:
+        start = time.perf_counter()
+        engine = await self._engines.get()
+        decode_start = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(engine.transcribe, audio)
+        finally:
+            self._engines.put_nowait(engine)
+        self.stats["transcriptions"] += 1
+        self.stats["wait_seconds"] += decode_start - start
+        self.stats["decode_seconds"] += time.perf_counter() - decode_start
+        return result["text"].strip()
+
+
+# --- Transports ---
+
+class TcpTransport:
+    """Newline-delimited JSON over an asyncio stream."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def recv(self) -> str | None:
+        line = await self.reader.readline()
+        return line.decode("utf-8") if line else None
+
+    async def send(self, text: str):
+        self.writer.write(text.encode("utf-8") + b"\n")
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class WebSocketTransport:
+    """One JSON object per WebSocket text message (needs the `websockets` package)."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    async def recv(self) -> str | None:
+        import websockets
+
+        try:
+            return await self.websocket.recv()
+        except websockets.ConnectionClosed:
+            return None
+
+    async def send(self, text: str):
+        await self.websocket.send(text)
+
+    async def close(self):
+        await self.websocket.close()
+
+
+# --- Sessions ---
+
+class Session:
+    """One connected client: its user's memory namespace, endpointer and counters.
+
+    Turns of one session run one at a time, in the order they arrive.
+    """
+
+    def __init__(self, server: "CompanionServer", session_id: int, user: str, transport):
+        self.server = server
+        self.id = session_id
+        self.user = user
+        self.transport = transport
+        self.store = None
+        self.memory_jobs = None
+        self.dialogue = None
+        self.endpointer = Endpointer(AdaptiveEnergyDetector(frame_size=CHUNK),
+                                     hangover_frames=int(VAD_SILENCE_SECONDS * RATE / CHUNK),
+                                     pre_roll_samples=int(0.3 * RATE))
+        self._pcm = bytearray()
+        self.turns = 0
+
+    async def send(self, message: dict):
+        await self.transport.send(json.dumps(message))
+
+    async def handle(self, message: dict) -> bool:
+        """Handles one client message. Returns False when the session should end."""
+        kind = message.get("type")
+        if kind == "text":
+            await self.reply(str(message.get("text", "")).strip())
+        elif kind == "audio":
+            try:
+                pcm = base64.b64decode(message.get("pcm", ""), validate=True)
+            except (binascii.Error, ValueError):
+                await self.send({"type": "error", "error": "audio.pcm must be base64"})
+                return True
+            await self.feed_audio(pcm)
+        elif kind == "audio_end":
+            if self.endpointer.in_speech:
+                utterance = self.endpointer.utterance()
+                self.endpointer.reset()
+                await self.transcribe_and_reply(utterance)
+        elif kind == "stats":
+            await self.send({"type": "stats", **self.server.summary()})
+        elif kind == "bye":
+            return False
+        else:
+            await self.send({"type": "error", "error": f"unknown message type {kind!r}"})
+        return True
+
+    async def feed_audio(self, pcm: bytes):
+        self._pcm += pcm
+        frame_bytes = CHUNK * 2
+        offset = 0
+        while len(self._pcm) - offset >= frame_bytes:
+            event = self.endpointer.process(bytes(self._pcm[offset:offset + frame_bytes]))
+            offset += frame_bytes
+            if event == "end":
+                await self.transcribe_and_reply(self.endpointer.utterance())
+        del self._pcm[:offset]
+
+    async def transcribe_and_reply(self, utterance: bytes):
+        if self.server.stt_pool is None:
+            await self.send({"type": "error", "error": "this server has no speech recognition"})
+            return
+        audio = np.frombuffer(utterance, dtype=np.int16).astype(np.float32) / 32768.0
+        start = time.perf_counter()
+        text = await self.server.stt_pool.transcribe(audio)
+        self.server.latency.add("stt", time.perf_counter() - start)
+        await self.send({"type": "transcript", "text": text})
+        await self.reply(text)
+
+    async def reply(self, user_message: str):
+        if not user_message:
+            return
+        start = time.perf_counter()
+        first_chunk = None
+        chunks = []
+        try:
+            async with self.server.admission.turn():
+                self.server.latency.add("queue", time.perf_counter() - start)
+                memory_context = self.store.get_memory_context(n_summaries=3, n_insights=2)
+                memory_context["relevant"] = retrieval.search_memories(
+                    user_message, k=3, store=self.store, memory_context=memory_context)
+                memory_context["dialogue"] = self.dialogue.context()
+                async for chunk in llm_interface.generate_response_stream_async(user_message, memory_context):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    chunks.append(chunk)
+                    await self.send({"type": "reply_chunk", "text": chunk})
+        except OverloadedError as e:
+            await self.send({"type": "error", "error": "overloaded", "detail": str(e)})
+            return
+        total = time.perf_counter() - start
+        ai_message = "".join(chunks).strip()
+        self.turns += 1
+        self.server.turns += 1
+        if first_chunk is not None:
+            self.server.latency.add("first_chunk", first_chunk)
+        self.server.latency.add("reply_total", total)
+        await self.send({"type": "reply_done", "text": ai_message, "first_chunk": first_chunk, "total": total})
+
+        await self.dialogue.add(user_message, ai_message)
+        await self.memory_jobs.enqueue(user_message, ai_message, memory_context)
+
+# --- Server ---
+
+class CompanionServer:
+    """Accepts connections, admits them and runs their sessions on the current event loop."""
+
+    def __init__(self, admission: AdmissionController | None = None, stt_pool: STTPool | None = None):
+        self.admission = admission or AdmissionController()
+        self.stt_pool = stt_pool
+        self.sessions: dict[int, Session] = {}
+        self.turns = 0
+        self.latency = tracing.RollingPercentiles(window=5000)
+        self._ids = itertools.count(1)
+        self._namespace_refs: dict[str, int] = {}
+        self._memory_jobs: dict[str, MemoryJobQueue] = {}
+        self._dialogues: dict[str, DialogueHistory] = {}
+        self._closing: dict[str, asyncio.Future] = {}
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+
+    async def serve_tcp(self, host: str, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(
+            lambda reader, writer: self.run_session(TcpTransport(reader, writer)),
+            host, port, limit=SERVER_MAX_MESSAGE_BYTES)
+
+    async def serve_websocket(self, host: str, port: int):
+        import websockets
+
+        return await websockets.serve(lambda websocket, *_: self.run_session(WebSocketTransport(websocket)),
+                                      host, port, max_size=SERVER_MAX_MESSAGE_BYTES)
+
+    async def _recv(self, transport) -> dict | None:
+        while True:
+            try:
+                text = await transport.recv()
+            except (ConnectionError, ValueError):  # ValueError: line longer than the stream limit
+                return None
+            if text is None:
+                return None
+            try:
+                message = json.loads(text)
+                if isinstance(message, dict):
+                    return message
+            except json.JSONDecodeError:
+                pass
+            await transport.send(json.dumps({"type": "error", "error": "expected one JSON object per message"}))
+
+    async def _open_namespace(self, user: str) -> tuple[memory.MemoryStore, MemoryJobQueue, DialogueHistory]:
+        """Opens (or shares) a user's store, retrieval index, memory-update queue and dialogue history."""
+        if user in self._closing:
+            await self._closing[user]
+        self._namespace_refs[user] = self._namespace_refs.get(user, 0) + 1
+        try:
+            store = await asyncio.to_thread(memory.get_namespace, user)
+            await asyncio.to_thread(retrieval.get_index, store)  # Loads (and backfills) it off the loop
+            if user not in self._dialogues:
+                dialogue = await asyncio.to_thread(DialogueHistory(store).load)
+                if user not in self._dialogues:  # Another session may have loaded it meanwhile
+                    self._dialogues[user] = dialogue
+                    dialogue.schedule_fold()
+        except BaseException:
+            await self._close_namespace(user)
+            raise
+        if user not in self._memory_jobs:
+            self._memory_jobs[user] = MemoryJobQueue(store, workers=1).start()
+        return store, self._memory_jobs[user], self._dialogues[user]
+
+    async def _close_namespace(self, user: str):
+        self._namespace_refs[user] -= 1
+        if self._namespace_refs[user] > 0:
+            return
+        del self._namespace_refs[user]
+        # Sessions of this user that connect meanwhile wait until it is fully closed.
+        closed = self._closing[user] = asyncio.get_running_loop().create_future()
+        try:
+            dialogue = self._dialogues.pop(user, None)
+            if dialogue is not None:
+                await dialogue.stop()
+            memory_jobs = self._memory_jobs.pop(user, None)
+            if memory_jobs is not None:
+                await memory_jobs.stop()  # Unfinished updates stay queued in the user's database
+            store = memory.close_namespace(user)
+            if store is not None:
+                retrieval.drop_index(store)
+        finally:
+            del self._closing[user]
+            closed.set_result(None)
+
+    async def run_session(self, transport):
+        hello = await self._recv(transport)
+        if hello is None or hello.get("type") != "hello" or not isinstance(hello.get("user"), str):
+            await transport.send(json.dumps({"type": "error", "error": "expected {\"type\": \"hello\", \"user\": ...}"}))
+            await transport.close()
+            return
+        if not self.admission.admit_session():
+            await transport.send(json.dumps({"type": "busy", "error": "too many sessions"}))
+            await transport.close()
+            return
+
+        session = Session(self, next(self._ids), hello["user"], transport)
+        try:
+            try:
+                session.store, session.memory_jobs, session.dialogue = await self._open_namespace(session.user)
+            except ValueError as e:
+                await session.send({"type": "error", "error": str(e)})
+                return
+            self.sessions[session.id] = session
+            try:
+                await session.send({"type": "ready", "session": session.id})
+                while (message := await self._recv(transport)) is not None:
+                    if not await session.handle(message):
+                        break
+            except ConnectionError:
+                pass
+            finally:
+                self.sessions.pop(session.id, None)
+                await self._close_namespace(session.user)
+        finally:
+            self.admission.release_session()
+            await transport.close()
+
+    def summary(self) -> dict:
+        """Counters, latency percentiles (seconds) and the CPU the process has used since start."""
+        return {
+            "sessions": len(self.sessions),
+            "turns": self.turns,
+            "uptime_seconds": time.perf_counter() - self._started,
+            "cpu_seconds": time.process_time() - self._cpu_started,
+            "admission": dict(self.admission.stats),
+            "latency": self.latency.summary(),
+            "stt": dict(self.stt_pool.stats) if self.stt_pool else None,
+            "memory_jobs_pending": sum(queue.depth() for queue in self._memory_jobs.values()),
+        }
+
+
+def use_fake_llm(latency: float = 0.3, token_delay: float = 0.02, max_concurrency: int = 64):
+    """Replaces the shared LLM clients with local FakeBackends (for load tests without an API key)."""
+    reply = ("That sounds like a good plan. Tell me more about how it went, "
+             "and we can work out what to try next together.")
+    memory_reply = json.dumps({"summary": "User shared an update and the AI encouraged them.",
+                               "facts": {}, "insight": "The user likes concrete next steps."})
+    llm_interface.set_async_client("reply", AsyncLLMClient(
+        FakeBackend(reply, latency=latency, jitter=latency / 3, token_delay=token_delay),
+        max_concurrency=max_concurrency, hedge_after=None))
+    llm_interface.set_async_client("memory", AsyncLLMClient(
+        FakeBackend(memory_reply, latency=latency * 2), max_concurrency=max_concurrency, hedge_after=None))
+    # Summary-only turns call the synchronous model directly.
+    llm_interface.set_text_model(types.SimpleNamespace(generate_content=lambda prompt, **_: types.SimpleNamespace(
+        text="User and AI had a short exchange.", usage_metadata=None)))
+
+
+async def serve(args):
+    stt_pool = None
+    if args.stt != "none":
+        stt_pool = STTPool(args.stt, size=args.stt_pool, **({"model_name": args.stt_model} if args.stt == "whisper" else {}))
+        await asyncio.to_thread(stt_pool.load)
+    server = CompanionServer(AdmissionController(args.max_sessions, args.max_active_turns, args.max_queued_turns),
+                             stt_pool)
+    servers = [await server.serve_tcp(args.host, args.port)]
+    print(f"INFO: Listening on tcp://{args.host}:{servers[0].sockets[0].getsockname()[1]}", flush=True)
+    if args.websocket_port:
+        servers.append(await server.serve_websocket(args.host, args.websocket_port))
+        print(f"INFO: Listening on ws://{args.host}:{args.websocket_port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for s in servers:
+            s.close()
+        print(tracing.format_summary(server.latency.summary()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless multi-session companion server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (0 picks a free one)")
+    parser.add_argument("--websocket-port", type=int, default=None)
+    parser.add_argument("--max-sessions", type=int, default=SERVER_MAX_SESSIONS)
+    parser.add_argument("--max-active-turns", type=int, default=SERVER_MAX_ACTIVE_TURNS)
+    parser.add_argument("--max-queued-turns", type=int, default=SERVER_MAX_QUEUED_TURNS)
+    parser.add_argument("--stt", default="none", choices=["none", *sorted(stt.ENGINES)],
+                        help="speech recognition for audio messages (none = text only)")
+    parser.add_argument("--stt-model", default="base.en")
+    parser.add_argument("--stt-pool", type=int, default=STT_POOL_SIZE, help="STT engines loaded")
+    parser.add_argument("--llm", default="gemini", choices=["gemini", "fake"])
+    parser.add_argument("--llm-concurrency", type=int, default=32, help="LLM requests in flight per client")
+    parser.add_argument("--fake-latency", type=float, default=0.3, help="--llm fake: seconds to first token")
+    parser.add_argument("--data-dir", default=memory.NAMESPACE_DIR, help="where per-user databases live")
+    args = parser.parse_args()
+
+    memory.NAMESPACE_DIR = args.data_dir
+    if args.llm == "fake":
+        use_fake_llm(args.fake_latency, max_concurrency=args.llm_concurrency)
+    else:
+        llm_interface.LLM_MAX_CONCURRENCY = args.llm_concurrency
+        llm_interface.configure()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\nINFO: Server stopped.")
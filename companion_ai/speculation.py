@@ -0,0 +1,169 @@
+# companion_ai/speculation.py
+#
+# Speculative replies. The reply normally starts only after the VAD silence window
+# has run out and the final transcript is ready, so the user waits for the full
+# window, the last STT pass and the LLM's time to first token back to back.
+#
+# With speculation, a shorter pause (see Endpointer's "pause" event) transcribes
+# what has been said so far and starts generating the reply from it while the
+# silence window is still running. At the endpoint the final transcript decides:
+# - it says the same thing (ignoring case and punctuation): the speculation is
+#   committed, and the reply plays from what has already been generated;
+# - it differs, or the user started talking again in between: the speculation is
+#   cancelled and the reply is generated from the final transcript as usual.
+#
+# Cancelled speculations cost tokens; `metrics()` reports the hit rate and the
+# prompt and output tokens spent on speculations that were thrown away.
+
+import asyncio
+import re
+import time
+
+from companion_ai import tracing
+from companion_ai.prompt_builder import estimate_tokens
+
+_WORD = re.compile(r"[\w']+")
+
+
+def same_utterance(a: str, b: str) -> bool:
+    """True if two transcripts have the same words, ignoring case and punctuation."""
+    return _WORD.findall(a.lower()) == _WORD.findall(b.lower())
+
+
+class Speculation:
+    """A reply generated ahead of time from a partial transcript.
+
+    Chunks are collected as the model produces them; replay() yields the ones so
+    far and then follows the rest live.
+    """
+
+    def __init__(self, text: str, stream, context, prompt_tokens: int = 0):
+        self.text = text
+        self.context = context
+        self.prompt_tokens = prompt_tokens
+        self.chunks: list[str] = []
+        self.done = False
+        self.started = time.perf_counter()
+        self._more = asyncio.Event()
+        self._task = asyncio.create_task(self._collect(stream), name="speculative-reply")
+
+    async def _collect(self, stream):
+        try:
+            async for chunk in stream:
+                self.chunks.append(chunk)
+                self._more.set()
+        except Exception as e:
+            print(f"ERROR: Speculative reply failed: {e}")
+        finally:
+            self.done = True
+            self._more.set()
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def replay(self):
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                return
+            self._more.clear()
+            if i == len(self.chunks) and not self.done:
+                await self._more.wait()
+
+    def output_tokens(self) -> int:
+        return estimate_tokens("".join(self.chunks))
+
+    def close(self):
+        """Stops generating (e.g. the reply was interrupted); chunks so far are kept."""
+        if not self._task.done():
+            self._task.cancel()
+
+
+class SpeculativeResponder:
+    """Starts replies on pauses and hands them over at the endpoint if the transcript still matches.
+
+    Create it on the event loop. pause() and resume() may be called from the
+    capture thread. `start_fn(partial_text)` returns (async chunk stream, context,
+    prompt tokens) for a speculative reply, or None to skip speculating this time.
+    """
+
+    def __init__(self, start_fn):
+        self.start_fn = start_fn
+        self.loop = asyncio.get_running_loop()
+        self.current: Speculation | None = None
+        self.latency = tracing.RollingPercentiles(window=1000)
+        self.stats = {"started": 0, "hits": 0, "misses": 0, "cancelled": 0, "not_ready": 0,
+                      "wasted_prompt_tokens": 0, "wasted_output_tokens": 0}
+        self._epoch = 0  # Bumped by every pause, resume and endpoint; stale partial transcripts are dropped
+
+    # --- Capture-thread hooks ---
+
+    def pause(self, transcribe_fn):
+        """The user paused: `transcribe_fn()` (blocking) returns the transcript so far."""
+        self.loop.call_soon_threadsafe(self._on_pause, transcribe_fn)
+
+    def resume(self):
+        """The user kept talking: whatever was started for the pause is wrong now."""
+        self.loop.call_soon_threadsafe(self._on_resume)
+
+    def _on_pause(self, transcribe_fn):
+        self._epoch += 1
+        asyncio.create_task(self._speculate(self._epoch, transcribe_fn))
+
+    def _on_resume(self):
+        self._epoch += 1
+        self.cancel()
+
+    async def _speculate(self, epoch: int, transcribe_fn):
+        try:
+            text = await asyncio.to_thread(transcribe_fn)
+        except Exception as e:
+            print(f"ERROR: Partial transcription failed: {e}")
+            return
+        if epoch != self._epoch or not text:
+            return  # The user spoke again, or the endpoint came first
+        started = self.start_fn(text)
+        if started is None:
+            return
+        stream, context, prompt_tokens = started
+        self.cancel()
+        self.current = Speculation(text, stream, context, prompt_tokens)
+        self.stats["started"] += 1
+
+    # --- Endpoint ---
+
+    def take(self, final_text: str) -> Speculation | None:
+        """Commits the running speculation if it was made from `final_text`, otherwise cancels it."""
+        self._epoch += 1
+        speculation, self.current = self.current, None
+        if speculation is None:
+            self.stats["not_ready"] += 1
+            return None
+        if not same_utterance(speculation.text, final_text):
+            self.stats["misses"] += 1
+            self._waste(speculation)
+            return None
+        self.stats["hits"] += 1
+        self.latency.add("head_start", time.perf_counter() - speculation.started)
+        return speculation
+
+    def cancel(self):
+        """Throws away the running speculation, if any."""
+        speculation, self.current = self.current, None
+        if speculation is not None:
+            self.stats["cancelled"] += 1
+            self._waste(speculation)
+
+    def _waste(self, speculation: Speculation):
+        speculation.close()
+        self.stats["wasted_prompt_tokens"] += speculation.prompt_tokens
+        self.stats["wasted_output_tokens"] += speculation.output_tokens()
+
+    def metrics(self) -> dict:
+        """Counters plus "hit_rate" (hits / speculations started) and head-start percentiles (seconds)."""
+        started = self.stats["started"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / started if started else 0.0,
+                "latency": self.latency.summary()}
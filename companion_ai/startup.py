@@ -0,0 +1,102 @@
+# companion_ai/startup.py
+#
+# Staged startup: heavy components (Whisper, the Azure SDK, the memory index) load
+# in background threads while the microphone opens, and the rest of the app asks
+# for them only when it actually needs them. StartupProfile records how long each
+# stage took, for `main.py --startup-profile`.
+
+import threading
+import time
+
+
+class StartupProfile:
+    """Wall-clock timings of startup stages, relative to a common start time."""
+
+    def __init__(self, start: float | None = None):
+        self.start = time.perf_counter() if start is None else start
+        self.stages: list[tuple[str, float, float]] = []  # (name, started, finished), seconds since start
+        self.marks: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, started: float, finished: float):
+        with self._lock:
+            self.stages.append((name, started - self.start, finished - self.start))
+
+    def measure(self, name: str, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) and records it as stage `name`."""
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.record(name, started, time.perf_counter())
+
+    def mark(self, name: str):
+        """Records a point in time (e.g. "listening"), keeping the first occurrence."""
+        with self._lock:
+            self.marks.setdefault(name, time.perf_counter() - self.start)
+
+    def report(self) -> str:
+        with self._lock:
+            stages = sorted(self.stages, key=lambda s: s[1])
+            marks = sorted(self.marks.items(), key=lambda m: m[1])
+        lines = [f"{'stage':<24} {'start':>8} {'end':>8} {'took':>8}"]
+        for name, started, finished in stages:
+            lines.append(f"{name:<24} {started:7.2f}s {finished:7.2f}s {finished - started:7.2f}s")
+        for name, at in marks:
+            lines.append(f"{'time to ' + name:<24} {'':>8} {at:7.2f}s")
+        return "\n".join(lines)
+
+
+class Component:
+    """A resource loaded once in a background thread.
+
+    `start()` begins loading; `get()` blocks until it is ready and returns it (or
+    re-raises the loader's exception). Calling `get()` without `start()` loads it in
+    the calling thread.
+    """
+
+    def __init__(self, name: str, loader, profile: StartupProfile | None = None):
+        self.name = name
+        self._loader = loader
+        self._profile = profile
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self._value = None
+        self._error = None
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            self._value = self._loader()
+        except BaseException as e:
+            self._error = e
+        finally:
+            if self._profile is not None:
+                self._profile.record(self.name, started, time.perf_counter())
+            self._done.set()
+
+    def start(self) -> "Component":
+        with self._lock:
+            if self._thread is None and not self._done.is_set():
+                self._thread = threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def get(self):
+        with self._lock:
+            load_here = self._thread is None and not self._done.is_set()
+            if load_here:
+                self._thread = threading.current_thread()
+        if load_here:
+            self._load()
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
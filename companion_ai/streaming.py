@@ -0,0 +1,152 @@
+# companion_ai/streaming.py
+#
+# Streaming LLM -> TTS: the reply is split into sentences (or clauses, for long
+# stretches without a full stop) while it is still being generated, and each piece
+# is handed to the TTS stage as soon as it is complete.
+
+import queue
+import re
+import threading
+import time
+import traceback
+
+# A sentence ends at . ! ? or … (plus any closing quotes/brackets) followed by whitespace.
+# Requiring the whitespace means we wait for the next token, which keeps "3.5" and
+# "example.com" in one piece.
+SENTENCE_END = re.compile(r'[.!?…]+["\'”’)\]]*(?=\s)')
+CLAUSE_END = re.compile(r'[,;:—](?=\s)')
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "st", "vs", "etc", "e.g", "i.e", "approx"}
+
+
+class SentenceChunker:
+    """Incrementally splits streamed text into speakable segments.
+
+    - Full sentences are emitted once they reach `min_chars`.
+    - If a segment grows past `clause_chars` without a sentence end, it is cut at the
+      last clause boundary (comma, semicolon, colon, dash) so speech can start early.
+    - Anything longer than `max_chars` with no punctuation at all is cut at a space.
+    """
+
+    def __init__(self, min_chars: int = 12, clause_chars: int = 80, max_chars: int = 250):
+        self.min_chars = min_chars
+        self.clause_chars = clause_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Adds newly generated text and returns any segments that are now complete."""
+        self._buffer += text
+        segments = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            segment, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:].lstrip()
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def flush(self) -> list[str]:
+        """Returns whatever is left once the stream has ended."""
+        segment, self._buffer = self._buffer.strip(), ""
+        return [segment] if segment else []
+
+    def _find_cut(self) -> int | None:
+        buffer = self._buffer
+        for match in SENTENCE_END.finditer(buffer):
+            end = match.end()
+            if end < self.min_chars or self._is_abbreviation(match.start()):
+                continue
+            return end
+
+        if len(buffer) >= self.clause_chars:
+            clause_cuts = [m.end() for m in CLAUSE_END.finditer(buffer) if m.end() >= self.min_chars]
+            if clause_cuts:
+                return clause_cuts[-1]
+
+        if len(buffer) >= self.max_chars:
+            space = buffer.rfind(" ", 0, self.max_chars)
+            return space if space > 0 else self.max_chars
+        return None
+
+    def _is_abbreviation(self, dot_index: int) -> bool:
+        if self._buffer[dot_index] != ".":
+            return False
+        word_start = max(self._buffer.rfind(" ", 0, dot_index), self._buffer.rfind("\n", 0, dot_index)) + 1
+        return self._buffer[word_start:dot_index].lower() in ABBREVIATIONS
+
+
+class StreamingSpeechPipeline:
+    """Feeds a stream of LLM text chunks to a TTS callable, one segment at a time.
+
+    `speak_segment(text)` runs on a dedicated worker thread and should block until the
+    segment has been synthesized, so segments reach the player in order. The TTS
+    backend can call `mark_first_audio()` when its first audio bytes arrive.
+
+    After `run()`, `timings` holds seconds since the start of the run for:
+    first_token, first_segment, first_audio, llm_done and tts_done.
+    """
+
+    def __init__(self, speak_segment, chunker: SentenceChunker | None = None, max_pending: int = 16):
+        self.speak_segment = speak_segment
+        self.chunker = chunker or SentenceChunker()
+        self.max_pending = max_pending
+        self.timings: dict[str, float | None] = {}
+        self.segments: list[str] = []
+        self._start = 0.0
+        self._cancelled = threading.Event()
+
+    def _mark(self, name: str):
+        if self.timings.get(name) is None:
+            self.timings[name] = time.perf_counter() - self._start
+
+    def mark_first_audio(self):
+        self._mark("first_audio")
+
+    def cancel(self):
+        """Stops consuming the LLM stream and drops segments not yet spoken."""
+        self._cancelled.set()
+
+    def _tts_worker(self, pending: queue.Queue):
+        while True:
+            segment = pending.get()
+            if segment is None:
+                break
+            if self._cancelled.is_set():
+                continue
+            self._mark("first_segment")
+            try:
+                self.speak_segment(segment)
+            except Exception as e:
+                print(f"ERROR: TTS failed for segment: {e}")
+                traceback.print_exc()
+
+    def run(self, text_chunks) -> str:
+        """Consumes `text_chunks` and speaks it as it arrives. Returns the full reply text."""
+        self._start = time.perf_counter()
+        self.timings = {name: None for name in ("first_token", "first_segment", "first_audio", "llm_done", "tts_done")}
+        self.segments = []
+        pending = queue.Queue(maxsize=self.max_pending)
+        worker = threading.Thread(target=self._tts_worker, args=(pending,), name="tts-segments", daemon=True)
+        worker.start()
+
+        parts = []
+        try:
+            for chunk in text_chunks:
+                if self._cancelled.is_set():
+                    break
+                self._mark("first_token")
+                parts.append(chunk)
+                for segment in self.chunker.feed(chunk):
+                    self.segments.append(segment)
+                    pending.put(segment)
+            if not self._cancelled.is_set():
+                for segment in self.chunker.flush():
+                    self.segments.append(segment)
+                    pending.put(segment)
+        finally:
+            self._mark("llm_done")
+            pending.put(None)
+            worker.join()
+            self._mark("tts_done")
+        return "".join(parts).strip()
@@ -0,0 +1,176 @@
+# companion_ai/streaming_stt.py
+#
+# Incremental speech-to-text: transcribes rolling windows of audio while the user is
+# still talking, so the final transcript is ready shortly after endpointing.
+#
+# Words are "committed" once two consecutive decodes agree on them (local agreement).
+# Committed audio is dropped from the buffer, so later passes only re-decode the
+# unstable tail and the final pass after endpointing is short.
+
+import re
+import threading
+import time
+import traceback
+
+import numpy as np
+
+_NORMALIZE = re.compile(r"[^\w']+")
+
+
+def _normalize(word: str) -> str:
+    return _NORMALIZE.sub("", word.lower())
+
+
+def _units_from_result(result: dict) -> list[tuple[float, float, str]]:
+    """Flattens a Whisper-style result into (start, end, text) units, word-level when available."""
+    units = []
+    for segment in result.get("segments", []):
+        words = segment.get("words")
+        if words:
+            units.extend((w["start"], w["end"], w["word"]) for w in words)
+        else:
+            units.append((segment["start"], segment["end"], segment["text"]))
+    return units
+
+
+class IncrementalTranscriber:
+    """Transcribes audio fed in small chunks, committing the stable prefix as it goes.
+
+    `transcribe_fn(audio, prompt)` receives float32 mono audio in [-1, 1] and the
+    text committed so far (useful as Whisper's `initial_prompt`), and returns a
+    Whisper-style dict with "segments" (optionally with per-word timestamps).
+
+    Decoding happens on a background thread every `step_seconds` of new audio, so
+    `feed()` never blocks the capture loop. Call `finalize()` once endpointing fires.
+    """
+
+    def __init__(self, transcribe_fn, sample_rate: int = 16000, step_seconds: float = 1.0,
+                 max_buffer_seconds: float = 20.0):
+        self.transcribe_fn = transcribe_fn
+        self.sample_rate = sample_rate
+        self.step_samples = int(step_seconds * sample_rate)
+        self.max_buffer_samples = int(max_buffer_seconds * sample_rate)
+
+        self.committed: list[str] = []
+        self.decode_passes = 0
+        self._chunks: list[np.ndarray] = []
+        self._buffer_samples = 0
+        self._samples_since_decode = 0
+        self._previous: list[tuple[float, float, str]] = []
+        self._lock = threading.Lock()          # Guards the audio buffer
+        self._decode_lock = threading.RLock()  # One decode at a time
+        self._wake = threading.Event()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="incremental-stt", daemon=True)
+        self._worker.start()
+
+    # --- Feeding audio ---
+
+    def feed(self, pcm_bytes: bytes):
+        """Adds 16-bit mono PCM. Cheap; decoding runs on the worker thread."""
+        samples = np.frombuffer(pcm_bytes, dtype=np.int16)
+        with self._lock:
+            self._chunks.append(samples)
+            self._buffer_samples += len(samples)
+            self._samples_since_decode += len(samples)
+            if self._samples_since_decode >= self.step_samples:
+                self._wake.set()
+
+    @property
+    def committed_text(self) -> str:
+        return "".join(self.committed).strip()
+
+    # --- Decoding ---
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            try:
+                self._decode(final=False)
+            except Exception as e:
+                print(f"ERROR: Incremental transcription pass failed: {e}")
+                traceback.print_exc()
+
+    def _snapshot(self) -> np.ndarray:
+        with self._lock:
+            if len(self._chunks) > 1:
+                self._chunks = [np.concatenate(self._chunks)]
+            self._samples_since_decode = 0
+            return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.int16)
+
+    def _drop_samples(self, n: int):
+        with self._lock:
+            audio = np.concatenate(self._chunks) if len(self._chunks) > 1 else self._chunks[0]
+            self._chunks = [audio[n:]]
+            self._buffer_samples -= n
+
+    def _decode(self, final: bool) -> list[tuple[float, float, str]]:
+        with self._decode_lock:
+            audio = self._snapshot()
+            if len(audio) == 0:
+                return []
+            result = self.transcribe_fn(audio.astype(np.float32) / 32768.0, self.committed_text)
+            self.decode_passes += 1
+            units = _units_from_result(result)
+            if final:
+                return units
+
+            # Commit the prefix this pass agrees on with the previous one.
+            agreed = 0
+            for new, old in zip(units, self._previous):
+                if _normalize(new[2]) != _normalize(old[2]):
+                    break
+                agreed += 1
+
+            # Whisper only sees 30s at a time; if nothing is stabilizing, force-commit
+            # everything but the last unit to keep the window bounded.
+            if agreed == 0 and len(audio) >= self.max_buffer_samples and len(units) > 1:
+                agreed = len(units) - 1
+
+            if agreed:
+                self.committed.extend(text for _, _, text in units[:agreed])
+                cut = min(int(units[agreed - 1][1] * self.sample_rate), len(audio))
+                self._drop_samples(cut)
+                # Keep the unconfirmed tail, shifted to the new buffer start.
+                offset = cut / self.sample_rate
+                self._previous = [(s - offset, e - offset, t) for s, e, t in units[agreed:]]
+            else:
+                self._previous = units
+            return units
+
+    def peek(self) -> str:
+        """Transcript of everything fed so far, without ending the utterance (e.g. at a pause)."""
+        with self._decode_lock:
+            tail = self._decode(final=True)
+            return (self.committed_text + " " + "".join(text for _, _, text in tail).strip()).strip()
+
+    def finalize(self) -> str:
+        """Decodes whatever is left after the committed prefix and returns the full transcript."""
+        self._closed = True
+        self._wake.set()
+        self._worker.join()
+        tail = self._decode(final=True)
+        return (self.committed_text + " " + "".join(text for _, _, text in tail).strip()).strip()
+
+
+def replay_pcm(transcriber: IncrementalTranscriber, pcm_bytes: bytes, chunk_samples: int = 1024,
+               realtime: bool = True) -> tuple[str, float]:
+    """Feeds recorded PCM through `transcriber` as a live capture would.
+
+    Returns (transcript, seconds from the last chunk to the finished transcript).
+    """
+    chunk_bytes = chunk_samples * 2
+    chunk_seconds = chunk_samples / transcriber.sample_rate
+    start = time.perf_counter()
+    for i, offset in enumerate(range(0, len(pcm_bytes), chunk_bytes)):
+        transcriber.feed(pcm_bytes[offset:offset + chunk_bytes])
+        if realtime:
+            delay = start + (i + 1) * chunk_seconds - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    endpoint = time.perf_counter()
+    text = transcriber.finalize()
+    return text, time.perf_counter() - endpoint
@@ -0,0 +1,163 @@
+# companion_ai/stt.py
+#
+# Speech-to-text engines behind one small interface, so main.py and the benchmarks
+# don't care which model or runtime does the decoding. The Whisper engine has a CPU
+# path tuned for latency: Linear layers dynamically quantized to int8, a fixed
+# thread count, and greedy decoding without temperature fallback. StubSTTEngine
+# stands in for it in offline benchmarks.
+#
+# torch and whisper are imported by load(), not at import time.
+
+import time
+
+import numpy as np
+
+
+class STTEngine:
+    """Interface for speech-to-text engines.
+
+    `transcribe(audio, prompt, word_timestamps)` takes float32 mono 16 kHz audio in
+    [-1, 1] and returns a Whisper-style dict with "text" and "segments" (segments
+    carry "words" when word_timestamps is set), which is what IncrementalTranscriber
+    consumes.
+    """
+
+    name = "base"
+    sample_rate = 16000
+
+    def load(self):
+        """Loads the model (slow; meant to run once, possibly in a background thread)."""
+
+    def warmup(self):
+        """Runs one short decode so the first real utterance doesn't pay one-off setup costs."""
+        rng = np.random.default_rng(0)
+        self.transcribe((rng.standard_normal(self.sample_rate) * 0.01).astype(np.float32))
+
+    def transcribe(self, audio: np.ndarray, prompt: str | None = None, word_timestamps: bool = False) -> dict:
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+
+class WhisperEngine(STTEngine):
+    """openai-whisper, with optional int8 dynamic quantization for CPU inference.
+
+    quantize=None quantizes only when running on the CPU (fp16 is used on CUDA).
+    threads sets torch's intra-op thread count (None leaves torch's default).
+    fast_decode uses greedy decoding at temperature 0 with no fallback to higher
+    temperatures, trading a little robustness on hard audio for a bounded decode time.
+    """
+
+    name = "whisper"
+
+    def __init__(self, model_name: str = "base.en", device: str | None = None, quantize: bool | None = None,
+                 threads: int | None = None, fast_decode: bool = True):
+        self.model_name = model_name
+        self.device = device
+        self.quantize = quantize
+        self.threads = threads
+        self.fast_decode = fast_decode
+        self.model = None
+        self.quantized = False
+
+    def load(self):
+        import torch
+        import whisper
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        if self.device is None:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = whisper.load_model(self.model_name, device=self.device)
+        quantize = self.device == "cpu" if self.quantize is None else self.quantize
+        if quantize and self.device == "cpu":
+            model = self._quantize(model)
+            self.quantized = True
+        model.eval()
+        self.model = model
+
+    @staticmethod
+    def _quantize(model):
+        import torch
+        import whisper.model
+
+        # whisper.model.Linear only overrides forward() to cast weights to the input
+        # dtype; on CPU everything is fp32, so it is safe to treat it as a plain Linear,
+        # which is the only type quantize_dynamic knows how to convert.
+        for module in model.modules():
+            if type(module) is whisper.model.Linear:
+                module.__class__ = torch.nn.Linear
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def transcribe(self, audio: np.ndarray, prompt: str | None = None, word_timestamps: bool = False) -> dict:
+        options = {
+            "fp16": self.device == "cuda",
+            "initial_prompt": prompt or None,
+            "word_timestamps": word_timestamps,
+            "condition_on_previous_text": False,
+        }
+        if self.fast_decode:
+            # A single temperature disables the fallback loop; no beam search or best_of.
+            options.update(temperature=0.0, beam_size=None, best_of=None,
+                           without_timestamps=not word_timestamps)
+        return self.model.transcribe(audio, **options)
+
+    def describe(self) -> str:
+        parts = [f"whisper:{self.model_name}", self.device or "?"]
+        if self.quantized:
+            parts.append("int8")
+        if self.threads:
+            parts.append(f"{self.threads} threads")
+        if not self.fast_decode:
+            parts.append("fallback decoding")
+        return " ".join(parts)
+
+
+class StubSTTEngine(STTEngine):
+    """Local stand-in for benchmarks: takes `rtf` x the audio's duration, then returns
+    `text_for(audio)` (a fixed string by default)."""
+
+    name = "stub"
+
+    def __init__(self, rtf: float = 0.1, text_for=None, text: str = "hello there"):
+        self.rtf = rtf
+        self.text_for = text_for or (lambda audio: text)
+
+    def transcribe(self, audio: np.ndarray, prompt: str | None = None, word_timestamps: bool = False) -> dict:
+        time.sleep(len(audio) / self.sample_rate * self.rtf)
+        text = self.text_for(audio)
+        duration = len(audio) / self.sample_rate
+        segment = {"start": 0.0, "end": duration, "text": text}
+        if word_timestamps:
+            words = text.split()
+            step = duration / max(1, len(words))
+            segment["words"] = [{"word": " " + w, "start": i * step, "end": (i + 1) * step} for i, w in enumerate(words)]
+        return {"text": text, "segments": [segment]}
+
+    def describe(self) -> str:
+        return f"stub (rtf {self.rtf})"
+
+
+ENGINES = {
+    "whisper": WhisperEngine,
+    "stub": StubSTTEngine,
+}
+
+
+def create_engine(name: str = "whisper", **options) -> STTEngine:
+    """Builds an engine by name (see ENGINES); `options` go to its constructor."""
+    try:
+        engine_cls = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown STT engine '{name}' (expected one of: {', '.join(ENGINES)})") from None
+    return engine_cls(**options)
+
+
+def load_engine(name: str = "whisper", warmup: bool = True, **options) -> STTEngine:
+    """create_engine() + load() + an optional warmup pass."""
+    engine = create_engine(name, **options)
+    engine.load()
+    if warmup:
+        engine.warmup()
+    return engine
@@ -0,0 +1,309 @@
+# companion_ai/tracing.py
+#
+# Per-turn latency tracing. A Turn collects marks (points in time such as the VAD
+# endpoint or the LLM's first token) and spans (e.g. each memory-update call), all
+# from the monotonic perf_counter clock. When a turn finishes, its timings are added
+# to rolling percentile windows and written to a JSONL file or SQLite table.
+#
+# Disabled tracing hands out a shared no-op turn, so instrumented code pays for one
+# method call per mark and nothing else.
+#
+# Summarize a session: python -m companion_ai.tracing data/traces/<session>.jsonl
+
+import argparse
+import collections
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+TRACING_ENABLED = os.getenv("COMPANION_TRACING", "0") == "1"
+TRACE_WINDOW = 500  # Turns kept per rolling percentile window
+
+# Marks in the order they normally happen within a turn.
+MARKS = ("speech_start", "vad_endpoint", "stt_done", "llm_first_token", "llm_last_token",
+         "tts_first_byte", "playback_start", "playback_end")
+
+# Derived intervals: (name, from mark, to mark).
+INTERVALS = [
+    ("speech", "speech_start", "vad_endpoint"),
+    ("stt_after_endpoint", "vad_endpoint", "stt_done"),
+    ("llm_first_token", "stt_done", "llm_first_token"),
+    ("llm_total", "stt_done", "llm_last_token"),
+    ("tts_first_byte", "llm_first_token", "tts_first_byte"),
+    ("response_latency", "vad_endpoint", "playback_start"),
+    ("playback", "playback_start", "playback_end"),
+]
+
+
+class Turn:
+    """Timings for one conversational turn.
+
+    `mark(name)` records the first time a point is reached (`last=True` keeps the
+    latest instead); `span(name)` times a block. A turn is finished once every
+    `hold()` has been matched by a `release()`; the turn starts with one hold.
+    """
+
+    def __init__(self, tracer: "Tracer", number: int):
+        self.tracer = tracer
+        self.number = number
+        self.started_at = datetime.datetime.now().isoformat(timespec="milliseconds")
+        self.origin = time.perf_counter()
+        self.marks: dict[str, float] = {}
+        self.spans: list[tuple[str, float, float]] = []
+        self._holds = 1
+        self._lock = threading.Lock()
+        self._done = False
+
+    def mark(self, name: str, last: bool = False):
+        now = time.perf_counter() - self.origin
+        if last:
+            self.marks[name] = now
+        else:
+            self.marks.setdefault(name, now)
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, start - self.origin, time.perf_counter() - self.origin))
+
+    def hold(self):
+        with self._lock:
+            self._holds += 1
+
+    def release(self):
+        with self._lock:
+            self._holds -= 1
+            finish = self._holds == 0 and not self._done
+            self._done = self._done or finish
+        if finish:
+            self.tracer._finish(self)
+
+    def discard(self):
+        """Drops the turn (e.g. nothing was transcribed)."""
+        with self._lock:
+            self._done = True
+
+    def intervals(self) -> dict[str, float]:
+        return {name: self.marks[end] - self.marks[start]
+                for name, start, end in INTERVALS if start in self.marks and end in self.marks}
+
+    def to_record(self, session: str) -> dict:
+        ms = lambda seconds: round(seconds * 1000, 3)
+        return {
+            "session": session,
+            "turn": self.number,
+            "started_at": self.started_at,
+            "marks": {name: ms(t) for name, t in self.marks.items()},
+            "spans": [{"name": name, "start_ms": ms(start), "end_ms": ms(end)} for name, start, end in self.spans],
+            "intervals": {name: ms(t) for name, t in self.intervals().items()},
+        }
+
+
+class _NullTurn:
+    """Stand-in for Turn when tracing is disabled; every method is a no-op."""
+
+    number = 0
+    _span = contextlib.nullcontext()
+
+    def mark(self, name, last=False): pass
+    def span(self, name): return self._span
+    def hold(self): pass
+    def release(self): pass
+    def discard(self): pass
+
+
+NULL_TURN = _NullTurn()
+
+
+class RollingPercentiles:
+    """p50/p95/p99 over the last `window` values of each metric."""
+
+    def __init__(self, window: int = TRACE_WINDOW):
+        self.window = window
+        self._values: dict[str, collections.deque] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: float):
+        with self._lock:
+            values = self._values.get(name)
+            if values is None:
+                values = self._values[name] = collections.deque(maxlen=self.window)
+            values.append(value)
+
+    def summary(self) -> dict[str, dict]:
+        with self._lock:
+            snapshot = {name: list(values) for name, values in self._values.items()}
+        return {name: _percentiles(values) for name, values in snapshot.items()}
+
+
+def _percentiles(values) -> dict:
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+# --- Sinks ---
+
+class JsonlSink:
+    """Appends one JSON object per turn to `path`."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = json.dumps(record) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class SqliteSink:
+    """Writes each mark and span as a row of the `trace_spans` table in `path`.
+
+    Marks are stored as zero-length spans; times are milliseconds from the start of the turn.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS trace_spans (
+                    session TEXT NOT NULL,
+                    turn INTEGER NOT NULL,
+                    started_at TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    start_ms REAL NOT NULL,
+                    end_ms REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_trace_spans_session ON trace_spans (session, turn)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def write(self, record: dict):
+        rows = [(name, t, t) for name, t in record["marks"].items()]
+        rows += [(span["name"], span["start_ms"], span["end_ms"]) for span in record["spans"]]
+        with self._lock, contextlib.closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO trace_spans (session, turn, started_at, name, start_ms, end_ms) VALUES (?, ?, ?, ?, ?, ?)",
+                [(record["session"], record["turn"], record["started_at"], *row) for row in rows])
+
+
+def open_sink(path: str):
+    """JsonlSink for *.jsonl paths, SqliteSink for anything else (e.g. *.db)."""
+    return JsonlSink(path) if path.endswith(".jsonl") else SqliteSink(path)
+
+
+class Tracer:
+    """Hands out Turns and aggregates the finished ones.
+
+    `percentiles` holds rolling windows for every interval (see INTERVALS) and every
+    span name; `summary()` returns their p50/p95/p99 in seconds.
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, sink=None, session: str | None = None,
+                 window: int = TRACE_WINDOW):
+        self.enabled = enabled
+        self.sink = sink
+        self.session = session or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.percentiles = RollingPercentiles(window)
+        self.turns = 0
+        self.current = NULL_TURN
+
+    def start_turn(self):
+        if not self.enabled:
+            return NULL_TURN
+        self.turns += 1
+        self.current = Turn(self, self.turns)
+        return self.current
+
+    def _finish(self, turn: Turn):
+        for name, seconds in turn.intervals().items():
+            self.percentiles.add(name, seconds)
+        for name, start, end in turn.spans:
+            self.percentiles.add(name, end - start)
+        if self.sink is not None:
+            try:
+                self.sink.write(turn.to_record(self.session))
+            except Exception as e:
+                print(f"ERROR: Could not export trace for turn {turn.number}: {e}")
+
+    def summary(self) -> dict[str, dict]:
+        return self.percentiles.summary()
+
+
+def format_summary(summary: dict[str, dict], scale: float = 1000.0) -> str:
+    """Formats {name: {count, p50, p95, p99}} as a table (values multiplied by `scale`, i.e. ms)."""
+    interval_names = [name for name, _, _ in INTERVALS]
+    order = interval_names + sorted(set(summary) - set(interval_names))
+    lines = [f"{'metric':<24} {'count':>6} {'p50':>10} {'p95':>10} {'p99':>10}"]
+    for name in order:
+        if name in summary:
+            s = summary[name]
+            lines.append(f"{name:<24} {s['count']:>6} {s['p50'] * scale:8.1f}ms {s['p95'] * scale:8.1f}ms "
+                         f"{s['p99'] * scale:8.1f}ms")
+    return "\n".join(lines)
+
+
+# --- Session Summary CLI ---
+
+def load_records(path: str, session: str | None = None) -> list[dict]:
+    """Reads turn records back from a JSONL file or a SQLite trace table."""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    else:
+        with contextlib.closing(sqlite3.connect(path)) as conn:
+            rows = conn.execute("SELECT session, turn, started_at, name, start_ms, end_ms FROM trace_spans "
+                                "ORDER BY session, turn, start_ms").fetchall()
+        by_turn: dict[tuple, dict] = {}
+        for sess, turn, started_at, name, start_ms, end_ms in rows:
+            record = by_turn.setdefault((sess, turn), {"session": sess, "turn": turn, "started_at": started_at,
+                                                       "marks": {}, "spans": []})
+            if name in MARKS and start_ms == end_ms:
+                record["marks"][name] = start_ms
+            else:
+                record["spans"].append({"name": name, "start_ms": start_ms, "end_ms": end_ms})
+        records = list(by_turn.values())
+        for record in records:
+            marks = record["marks"]
+            record["intervals"] = {name: marks[end] - marks[start]
+                                   for name, start, end in INTERVALS if start in marks and end in marks}
+    if session is not None:
+        records = [r for r in records if r["session"] == session]
+    return records
+
+
+def summarize_records(records: list[dict]) -> dict[str, dict]:
+    """Percentiles (in seconds) of every interval and span across the given turn records."""
+    values: dict[str, list[float]] = {}
+    for record in records:
+        for name, ms in record["intervals"].items():
+            values.setdefault(name, []).append(ms / 1000)
+        for span in record["spans"]:
+            values.setdefault(span["name"], []).append((span["end_ms"] - span["start_ms"]) / 1000)
+    return {name: _percentiles(v) for name, v in values.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize per-turn latency traces.")
+    parser.add_argument("path", help="trace file (.jsonl) or SQLite database with a trace_spans table")
+    parser.add_argument("--session", help="only this session id")
+    args = parser.parse_args()
+    records = load_records(args.path, args.session)
+    if not records:
+        raise SystemExit("No traced turns found.")
+    sessions = sorted({r["session"] for r in records})
+    print(f"{len(records)} turns in {len(sessions)} session(s): {', '.join(sessions)}\n")
+    print(format_summary(summarize_records(records)))
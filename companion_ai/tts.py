@@ -0,0 +1,309 @@
+# companion_ai/tts.py
+#
+# Text-to-speech engines behind one interface, plus a cache of synthesized audio.
+#
+# - AzureTTSEngine keeps a small pool of SpeechSynthesizers with their connections
+#   opened up front, instead of building a config, stream and synthesizer (and
+#   paying the handshake) for every utterance.
+# - PhraseCache stores finished PCM keyed by a hash of voice + output format + text,
+#   in memory and optionally on disk, both LRU and size-bounded. Fixed phrases
+#   (the error fallback, greetings) are then played without a round trip.
+# - StubTTSEngine produces a tone locally with configurable latency, for benchmarks
+#   and offline runs.
+#
+# The Azure Speech SDK is imported by AzureTTSEngine.load(), not at import time.
+
+import hashlib
+import math
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TTSEngine:
+    """Interface for text-to-speech engines producing raw 16-bit mono PCM.
+
+    `synthesize(text, on_chunk)` blocks until the whole text has been synthesized,
+    calling `on_chunk(pcm_bytes)` as audio arrives. `voice` and `output_format`
+    identify what the audio sounds like, and are part of the cache key.
+    """
+
+    voice = ""
+    output_format = ""
+    sample_rate = 48000
+
+    def load(self):
+        """Connects / loads the engine (slow; meant to run once, possibly in a background thread)."""
+
+    def warmup(self):
+        """Synthesizes a short phrase so the first real reply doesn't pay one-off setup costs."""
+        self.synthesize("Hello.", lambda chunk: None)
+
+    def synthesize(self, text: str, on_chunk) -> None:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class AzureTTSEngine(TTSEngine):
+    """Azure Speech synthesis with a pool of reused, pre-connected synthesizers.
+
+    Each synthesizer is created without an audio output (audio_config=None) and its
+    `synthesizing` event forwards PCM chunks to whoever is using it. `pool_size`
+    bounds how many segments can be synthesized at once.
+    """
+
+    def __init__(self, key: str, region: str, voice: str = "en-US-AvaMultilingualNeural",
+                 output_format: str = "Raw48Khz16BitMonoPcm", pool_size: int = 2):
+        self.key = key
+        self.region = region
+        self.voice = voice
+        self.output_format = output_format
+        self.sample_rate = 48000 if "48Khz" in output_format else 24000 if "24Khz" in output_format else 16000
+        self.pool_size = pool_size
+        self._sdk = None
+        self._pool = queue.Queue()
+        self._synthesizers = []
+
+    def load(self):
+        import azure.cognitiveservices.speech as speechsdk
+        self._sdk = speechsdk
+        speech_config = speechsdk.SpeechConfig(subscription=self.key, region=self.region)
+        # Raw PCM (no RIFF header), so back-to-back segments don't play a header as a click.
+        speech_config.set_speech_synthesis_output_format(getattr(speechsdk.SpeechSynthesisOutputFormat, self.output_format))
+        speech_config.speech_synthesis_voice_name = self.voice
+        for _ in range(self.pool_size):
+            synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+            slot = {"synthesizer": synthesizer, "on_chunk": None}
+            synthesizer.synthesizing.connect(lambda evt, slot=slot: slot["on_chunk"] and slot["on_chunk"](evt.result.audio_data))
+            # Open the service connection now rather than on the first reply.
+            connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+            connection.open(True)
+            slot["connection"] = connection
+            self._synthesizers.append(slot)
+            self._pool.put(slot)
+
+    def _ssml(self, text: str) -> str:
+        text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        return (f"<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='en-US'>"
+                f"<voice name='{self.voice}'>{text}</voice></speak>")
+
+    def synthesize(self, text: str, on_chunk) -> None:
+        slot = self._pool.get()
+        try:
+            slot["on_chunk"] = on_chunk
+            result = slot["synthesizer"].speak_ssml_async(self._ssml(text)).get()
+            if result.reason == self._sdk.ResultReason.Canceled:
+                details = result.cancellation_details
+                raise RuntimeError(f"Azure synthesis canceled: {details.reason} {details.error_details or ''}".strip())
+        finally:
+            slot["on_chunk"] = None
+            self._pool.put(slot)
+
+    def close(self):
+        for slot in self._synthesizers:
+            slot["connection"].close()
+
+
+class StubTTSEngine(TTSEngine):
+    """Local stand-in for a cloud TTS: a fixed startup latency, then a tone whose length
+    and pitch depend on the text, delivered in chunks at `speed` times real time."""
+
+    def __init__(self, latency: float = 0.15, chars_per_second: float = 15.0, speed: float = 4.0,
+                 sample_rate: int = 48000, chunk_seconds: float = 0.1, voice: str = "stub"):
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self.speed = speed
+        self.sample_rate = sample_rate
+        self.chunk_seconds = chunk_seconds
+        self.voice = voice
+        self.output_format = f"raw-{sample_rate}-16bit-mono"
+        self.calls = 0
+
+    def synthesize(self, text: str, on_chunk) -> None:
+        self.calls += 1
+        time.sleep(self.latency)
+        seconds = max(0.2, len(text) / self.chars_per_second)
+        pitch = 200 + int(hashlib.md5(text.encode("utf-8")).hexdigest()[:4], 16) % 200
+        t = np.arange(int(seconds * self.sample_rate)) / self.sample_rate
+        pcm = (np.sin(2 * math.pi * pitch * t) * 8000).astype(np.int16).tobytes()
+        step = int(self.chunk_seconds * self.sample_rate) * 2
+        for i in range(0, len(pcm), step):
+            time.sleep(self.chunk_seconds / self.speed)
+            on_chunk(pcm[i:i + step])
+
+
+class PhraseCache:
+    """Content-addressed LRU cache of synthesized PCM, in memory and optionally on disk.
+
+    Entries are keyed by sha256(voice, output format, text). The memory tier holds up
+    to `max_memory_bytes`; the disk tier (one file per phrase in `disk_dir`) up to
+    `max_disk_bytes`, evicting the least recently used files (by mtime, which hits
+    refresh). Texts longer than `max_chars` are not cached: whole replies rarely repeat.
+
+    Only phrases that have shown they repeat reach the disk: those stored with
+    persist=True (prewarmed phrases) and those hit a second time while still in
+    memory. One-off reply sentences stay in the memory tier and age out of it.
+    """
+
+    def __init__(self, max_memory_bytes: int = 16 * 1024 * 1024, disk_dir: str | None = None,
+                 max_disk_bytes: int = 128 * 1024 * 1024, max_chars: int = 160):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_chars = max_chars
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._memory_only: set[str] = set()  # In memory, not (yet) on disk
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0,
+                      "disk_writes": 0, "memory_evictions": 0, "disk_evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, voice: str, output_format: str) -> str:
+        return hashlib.sha256(f"{voice}\0{output_format}\0{text.strip()}".encode("utf-8")).hexdigest()
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(text.strip()) <= self.max_chars
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + ".pcm")
+
+    def _remember(self, key: str, pcm: bytes):
+        # Caller holds the lock.
+        if len(pcm) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = pcm
+        self._memory_bytes += len(pcm)
+        while self._memory_bytes > self.max_memory_bytes:
+            evicted_key, evicted = self._memory.popitem(last=False)
+            self._memory_only.discard(evicted_key)
+            self._memory_bytes -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            pcm = self._memory.get(key)
+            admit = pcm is not None and key in self._memory_only
+            if admit:
+                self._memory_only.discard(key)
+            if pcm is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+        if pcm is not None:
+            if admit:  # Second hit: the phrase repeats, so keep it across restarts
+                self._write_disk(key, pcm)
+            return pcm
+        if self.disk_dir:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    pcm = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                pcm = None
+            if pcm is not None:
+                with self._lock:
+                    self._remember(key, pcm)
+                    self.stats["disk_hits"] += 1
+                return pcm
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, pcm: bytes, persist: bool = False):
+        """Stores a phrase in memory; on disk too if `persist` (otherwise only once it is hit again)."""
+        with self._lock:
+            self._remember(key, pcm)
+            self.stats["stores"] += 1
+            if self.disk_dir and not persist and key in self._memory:
+                self._memory_only.add(key)
+        if persist:
+            self._write_disk(key, pcm)
+
+    def _write_disk(self, key: str, pcm: bytes):
+        if not self.disk_dir or len(pcm) > self.max_disk_bytes:
+            return
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(pcm)
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            self.stats["disk_writes"] += 1
+        self._trim_disk(len(pcm))
+
+    def _trim_disk(self, added: int):
+        """Evicts old files once over budget, down to 90% of it so the scan isn't repeated on every write."""
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += added
+                if self._disk_bytes <= self.max_disk_bytes:
+                    return
+            entries = []
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".pcm"):
+                    st = os.stat(os.path.join(self.disk_dir, name))
+                    entries.append((st.st_mtime, st.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            target = self.max_disk_bytes if total <= self.max_disk_bytes else int(self.max_disk_bytes * 0.9)
+            for _, size, name in sorted(entries):
+                if total <= target:
+                    break
+                os.remove(os.path.join(self.disk_dir, name))
+                total -= size
+                self.stats["disk_evictions"] += 1
+            self._disk_bytes = total
+
+
+class CachedTTS:
+    """Wraps a TTSEngine with a PhraseCache. Cache hits are replayed in `chunk_seconds` slices."""
+
+    def __init__(self, engine: TTSEngine, cache: PhraseCache, chunk_seconds: float = 0.1):
+        self.engine = engine
+        self.cache = cache
+        self.chunk_bytes = int(chunk_seconds * engine.sample_rate) * 2
+
+    @property
+    def sample_rate(self) -> int:
+        return self.engine.sample_rate
+
+    def synthesize(self, text: str, on_chunk, persist: bool = False) -> None:
+        """Plays `text` from the cache, or synthesizes and caches it (on disk right away if `persist`)."""
+        if not self.cache.cacheable(text):
+            self.engine.synthesize(text, on_chunk)
+            return
+        key = self.cache.key(text, self.engine.voice, self.engine.output_format)
+        pcm = self.cache.get(key)
+        if pcm is not None:
+            for i in range(0, len(pcm), self.chunk_bytes):
+                on_chunk(pcm[i:i + self.chunk_bytes])
+            return
+        chunks = []
+        def collect(chunk):
+            chunks.append(chunk)
+            on_chunk(chunk)
+        self.engine.synthesize(text, collect)  # Raises on failure, so partial audio is never cached.
+        self.cache.put(key, b"".join(chunks), persist)
+
+    def prewarm(self, phrases):
+        """Synthesizes phrases into the cache (memory and disk) without playing them."""
+        for text in phrases:
+            if self.cache.cacheable(text):
+                self.synthesize(text, lambda chunk: None, persist=True)
+
+    def warmup(self):
+        self.engine.warmup()
+
+    def close(self):
+        self.engine.close()
@@ -1,20 +1,36 @@
 # main.py (v9.0 - The "Low Latency" Release with Streaming TTS)
 
+import time
+_PROCESS_START = time.perf_counter()
+
+import argparse
 import asyncio
 import os
 import sys
 import pyaudio
-import torch
-import whisper
 import traceback
 import numpy as np
 
-# Azure Cognitive Services
-import azure.cognitiveservices.speech as speechsdk
+# The STT engine and the Azure Speech SDK are imported by their loaders below, in
+# background threads, so the microphone can open before they are ready.
 
 # Project Specific Imports
 from companion_ai import llm_interface
 from companion_ai import memory
+from companion_ai import retrieval
+from companion_ai import compaction
+from companion_ai.dialogue import DialogueHistory
+from companion_ai.speculation import SpeculativeResponder
+from companion_ai.memory_jobs import MemoryJobQueue
+from companion_ai.streaming import StreamingSpeechPipeline
+from companion_ai.streaming_stt import IncrementalTranscriber
+from companion_ai.audio_capture import AdaptiveEnergyDetector, CaptureEngine
+from companion_ai.async_llm import iterate_in_thread
+from companion_ai.playback import LoopStallMonitor, PlaybackEngine
+from companion_ai.startup import Component, StartupProfile
+from companion_ai import stt
+from companion_ai import tts
+from companion_ai import tracing
 
 # --- NEW: Graceful Shutdown Event ---
 shutdown_event = asyncio.Event()
@@ -22,185 +38,480 @@ shutdown_event = asyncio.Event()
 # --- Configuration & Constants ---
 
 # 1. Voice Activity Detection (VAD)
+#    The threshold adapts to the room's noise floor; VAD_THRESHOLD is its minimum.
 VAD_THRESHOLD = 150
 VAD_SILENCE_SECONDS = 1.0
+VAD_PRE_ROLL_SECONDS = 0.3  # Audio kept from just before speech onset
 
 # 2. Whisper Model (STT) - Your "speed vs. accuracy" knob.
 #    - "tiny.en"   -> Fastest, lowest accuracy.
 #    - "base.en"   -> Good balance of speed and accuracy. (Recommended)
 #    - "medium.en" -> Slower, more accurate, requires more VRAM.
 WHISPER_MODEL = "medium.en"
+#    STT engine (see companion_ai/stt.py). STT_QUANTIZE=None quantizes the model to
+#    int8 when running on the CPU; STT_THREADS=None keeps torch's default thread count.
+STT_ENGINE = "whisper"
+STT_QUANTIZE = None
+STT_THREADS = None
+STT_FAST_DECODE = True  # Greedy decoding, no temperature fallback
+#    Streaming STT transcribes while the user is still talking, so only the last
+#    stretch of audio is left to decode once they stop.
+STREAMING_STT = True
+STREAMING_STT_STEP_SECONDS = 1.0
 
 # 3. Azure TTS Configuration
 AZURE_SPEECH_KEY = os.getenv("AZURE_SPEECH_KEY")
 AZURE_SPEECH_REGION = os.getenv("AZURE_SPEECH_REGION")
 AZURE_VOICE_NAME = "en-US-AvaMultilingualNeural" # Sticking with the reliable "Ava" voice
+#    TTS engine: "azure", or "stub" for a local tone generator (no credentials needed).
+TTS_ENGINE = "azure"
+TTS_POOL_SIZE = 2
+#    Synthesized short phrases are cached in memory and in data/tts_cache.
+TTS_CACHE_MEMORY_MB = 16
+TTS_CACHE_DISK_MB = 128
+TTS_CACHE_DIR = os.path.join(memory.DATA_DIR, "tts_cache")
+#    Phrases synthesized into the cache at startup.
+TTS_PREWARM_PHRASES = [llm_interface.RESPONSE_ERROR_MESSAGE]
+
+# 4. Response Streaming - speak each sentence as soon as the LLM has produced it.
+STREAM_RESPONSES = True
+#    Speculative replies (needs STREAMING_STT and STREAM_RESPONSES): after
+#    SPECULATION_PAUSE_SECONDS of silence the reply starts from the partial transcript,
+#    and is kept if the final transcript matches (see companion_ai/speculation.py).
+#    With it on, VAD_SILENCE_SECONDS can be lowered less cautiously.
+SPECULATIVE_RESPONSES = True
+SPECULATION_PAUSE_SECONDS = 0.35
+
+# 5. Playback & Barge-in - with BARGE_IN, talking over the companion stops its speech
+#    and the new utterance is captured; without it, the mic is ignored while it speaks.
+BARGE_IN = True
+PLAYBACK_PERIOD_FRAMES = 1024     # ~21 ms at 48 kHz; cancel() takes effect within one period
+PLAYBACK_BUFFER_SECONDS = 4.0
+
+# 6. Tracing - per-turn latency marks and spans, exported to TRACE_PATH ("{session}"
+#    is replaced by the session id; use a .db path for SQLite). Enable with --trace or
+#    COMPANION_TRACING=1, then: python -m companion_ai.tracing <file>
+TRACE_PATH = os.path.join(memory.DATA_DIR, "traces", "{session}.jsonl")
 
-# 4. Audio Settings
+# 7. Memory Updates - queued durably in the database and coalesced when turns come
+#    quickly (see companion_ai/memory_jobs.py). On exit, pending updates get up to
+#    MEMORY_JOB_DRAIN_SECONDS to finish; the rest run on the next start.
+MEMORY_JOB_DRAIN_SECONDS = 5.0
+
+# 8. User - the persona prompt names no one; the user's name is a profile fact.
+#    COMPANION_USER_NAME seeds it on first run (later conversations may update it).
+USER_NAME = os.getenv("COMPANION_USER_NAME")
+
+# 9. Audio Settings
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 16000
 CHUNK = 1024
-VAD_SILENCE_CHUNKS = int(VAD_SILENCE_SECONDS * (RATE / CHUNK))
 
 # --- Model & Client Initializations ---
-if not all([AZURE_SPEECH_KEY, AZURE_SPEECH_REGION]):
-    print("FATAL: Azure credentials not found in .env file.")
-    sys.exit(1)
+# Nothing heavy happens at import time. startup() opens the microphone right away and
+# loads everything else in background threads; callers block on a component only
+# when they first need it (e.g. the first transcription waits for Whisper).
+profile = StartupProfile(_PROCESS_START)
+profile.record("imports", _PROCESS_START, time.perf_counter())
 
-print("INFO: Initializing models...")
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"INFO: Using device: {DEVICE}")
+db = memory
+pya = None
+capture = None
 
-print(f"INFO: Loading Whisper model '{WHISPER_MODEL}'...")
-whisper_model = whisper.load_model(WHISPER_MODEL, device=DEVICE)
-print("INFO: Whisper model loaded.")
+def _load_stt():
+    print(f"INFO: Loading STT engine '{STT_ENGINE}' with model '{WHISPER_MODEL}'...")
+    engine = stt.load_engine(STT_ENGINE, model_name=WHISPER_MODEL, quantize=STT_QUANTIZE,
+                             threads=STT_THREADS, fast_decode=STT_FAST_DECODE)
+    print(f"INFO: STT engine ready ({engine.describe()}).")
+    return engine
 
-db = memory
-db.init_db()
-pya = pyaudio.PyAudio()
-
-# --- Dedicated Audio Playback Class ---
-class AudioPlayer:
-    def __init__(self):
-        self.audio_queue = asyncio.Queue()
-        self.playback_stream = pya.open(format=pyaudio.paInt16, channels=1, rate=48000, output=True)
-        self._is_speaking = False
-
-    async def run(self):
-        while not shutdown_event.is_set():
-            try:
-                audio_data = await asyncio.wait_for(self.audio_queue.get(), timeout=1.0)
-                if audio_data is None: continue # Skip sentinel values
-                self._is_speaking = True
-                self.playback_stream.write(audio_data)
-                self.audio_queue.task_done()
-            except asyncio.TimeoutError:
-                if self._is_speaking and self.audio_queue.empty():
-                    self._is_speaking = False
-            except asyncio.CancelledError:
-                break
-        self.playback_stream.stop_stream()
-        self.playback_stream.close()
-
-    def play_chunk(self, audio_chunk):
-        self.audio_queue.put_nowait(audio_chunk)
-
-    def is_speaking(self):
-        return self._is_speaking
+def _load_tts():
+    if TTS_ENGINE == "stub":
+        engine = tts.StubTTSEngine()
+    else:
+        engine = tts.AzureTTSEngine(AZURE_SPEECH_KEY, AZURE_SPEECH_REGION, voice=AZURE_VOICE_NAME,
+                                    output_format="Raw48Khz16BitMonoPcm", pool_size=TTS_POOL_SIZE)
+    engine.load()
+    cache = tts.PhraseCache(max_memory_bytes=TTS_CACHE_MEMORY_MB * 1024 * 1024, disk_dir=TTS_CACHE_DIR,
+                            max_disk_bytes=TTS_CACHE_DISK_MB * 1024 * 1024)
+    cached = tts.CachedTTS(engine, cache)
+    cached.warmup()
+    cached.prewarm(TTS_PREWARM_PHRASES)
+    return cached
+
+compactor = None
+dialogue = None  # Recent turns + running summary of this conversation (see dialogue.py)
+
+def _load_memory():
+    global compactor, dialogue
+    db.init_db()
+    if USER_NAME and db.get_profile_fact("user_name") is None:
+        db.upsert_profile_fact("user_name", USER_NAME)
+    retrieval.get_index()  # Load (and backfill) the relevance index before the first turn
+    # Rolls old summaries/insights into daily and weekly digests (see compaction.py).
+    compactor = compaction.Compactor(db.get_store()).start()
+    dialogue = DialogueHistory(db.get_store()).load()  # Picks up the conversation from last time
+    return db
+
+def _load_llm():
+    llm_interface.configure()
+    return llm_interface
+
+tracer = tracing.Tracer(enabled=False)
+speaking_turn = tracing.NULL_TURN  # The turn whose reply is being spoken
+
+def enable_tracing():
+    tracer.enabled = True
+    tracer.sink = tracing.open_sink(TRACE_PATH.format(session=tracer.session))
+
+stt_component = Component("stt", _load_stt, profile)
+tts_component = Component("tts", _load_tts, profile)
+memory_component = Component("memory", _load_memory, profile)
+llm_component = Component("gemini", _load_llm, profile)
+COMPONENTS = (stt_component, tts_component, memory_component, llm_component)
+
+def startup():
+    """Starts the background loaders and opens the microphone."""
+    global pya, capture
+    if TTS_ENGINE == "azure" and not all([AZURE_SPEECH_KEY, AZURE_SPEECH_REGION]):
+        print("FATAL: Azure credentials not found in .env file.")
+        sys.exit(1)
+
+    print("INFO: Initializing models...")
+    for component in COMPONENTS:
+        component.start()
+    pya = profile.measure("pyaudio", pyaudio.PyAudio)
+    capture = CaptureEngine(
+        pya, rate=RATE, chunk=CHUNK,
+        detector=AdaptiveEnergyDetector(frame_size=CHUNK, min_threshold=VAD_THRESHOLD),
+        pre_roll_seconds=VAD_PRE_ROLL_SECONDS, silence_seconds=VAD_SILENCE_SECONDS,
+        pause_seconds=SPECULATION_PAUSE_SECONDS if speculation_enabled() else None,
+    )
+    profile.measure("microphone", capture.open)
+    print(f"INFO: Microphone open after {time.perf_counter() - _PROCESS_START:.2f}s; "
+          "models continue loading in the background.")
+
+def speculation_enabled():
+    return SPECULATIVE_RESPONSES and STREAMING_STT and STREAM_RESPONSES
+
+def shutdown():
+    if tts_component.ready():
+        try:
+            tts_component.get().close()
+        except Exception:
+            pass  # The engine never loaded; there is nothing to close.
+    if capture is not None: capture.close()
+    if pya is not None: pya.terminate()
+    if compactor is not None: compactor.stop()
+    if memory_component.ready(): db.close()
+
+# --- Audio Playback ---
+# PlaybackEngine (companion_ai/playback.py) writes to the output stream on its own
+# thread, so the event loop never blocks on audio. PLAYBACK_RATE matches Azure's
+# Raw48Khz16BitMonoPcm output.
+PLAYBACK_RATE = 48000
+
+def open_player():
+    stream = pya.open(format=pyaudio.paInt16, channels=1, rate=PLAYBACK_RATE, output=True,
+                      frames_per_buffer=PLAYBACK_PERIOD_FRAMES)
+    player = PlaybackEngine(stream, rate=PLAYBACK_RATE, period_frames=PLAYBACK_PERIOD_FRAMES,
+                            buffer_seconds=PLAYBACK_BUFFER_SECONDS)
+    player.on_start = lambda: speaking_turn.mark("playback_start")
+    return player.start()
+
+_active_pipeline = None
+
+def interrupt_speech(player):
+    """Stops the companion mid-sentence: no more segments are synthesized and queued audio is dropped."""
+    pipeline = _active_pipeline
+    if pipeline is not None:
+        pipeline.cancel()
+    dropped = player.cancel()
+    print(f"INFO: Speech interrupted ({dropped / 2 / PLAYBACK_RATE:.1f}s of queued audio dropped).")
 
 # --- Core Application Logic ---
 
-def record_audio_with_vad(player):
-    stream = pya.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK)
+def record_audio_with_vad(player, on_frame=None, turn=tracing.NULL_TURN, on_pause=None, on_resume=None):
     print("\nINFO: Listening...")
-    frames, is_speaking, silent_chunks = [], False, 0
-    while not shutdown_event.is_set():
-        if player.is_speaking():
-            stream.read(CHUNK, exception_on_overflow=False); continue
-        data = stream.read(CHUNK)
-        audio_data_np = np.frombuffer(data, dtype=np.int16)
-        rms = np.sqrt(np.mean(np.square(audio_data_np.astype(np.float32))))
-        if rms > VAD_THRESHOLD:
-            if not is_speaking:
-                print("INFO: Speech detected, recording...")
-                is_speaking = True
-            silent_chunks = 0
-            frames.append(data)
-        elif is_speaking:
-            frames.append(data)
-            silent_chunks += 1
-            if silent_chunks > VAD_SILENCE_CHUNKS:
-                break
-    stream.stop_stream(); stream.close()
-    return b''.join(frames)
+    profile.mark("listening")
+
+    def on_start():
+        turn.mark("speech_start")
+        print("INFO: Speech detected, recording...")
+
+    audio = capture.read_utterance(
+        stop_event=shutdown_event,
+        discard=player.is_speaking,
+        on_start=on_start,
+        on_frame=on_frame,
+        on_barge_in=(lambda: interrupt_speech(player)) if BARGE_IN else None,
+        on_pause=on_pause,
+        on_resume=on_resume,
+    )
+    turn.mark("vad_endpoint")
+    return audio
 
 def transcribe_audio(audio_bytes):
     if not audio_bytes: return ""
     print("INFO: Transcribing audio...")
     try:
         audio_np = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
-        result = whisper_model.transcribe(audio_np, fp16=(DEVICE=="cuda"))
+        result = stt_component.get().transcribe(audio_np)
         return result["text"].strip()
     except Exception as e:
         print(f"ERROR: Transcription failed: {e}"); return ""
 
-def speak_text_azure_stream(text, player):
-    """Generates audio using Azure and streams it to the player for low latency."""
+def _transcribe_window(audio_np, prompt):
+    # Runs on the transcriber's worker thread, so waiting for the engine here doesn't
+    # hold up capture; audio keeps buffering until STT is ready.
+    return stt_component.get().transcribe(audio_np, prompt=prompt, word_timestamps=True)
+
+def make_incremental_transcriber():
+    return IncrementalTranscriber(_transcribe_window, sample_rate=RATE, step_seconds=STREAMING_STT_STEP_SECONDS)
+
+def finish_incremental_transcription(transcriber):
+    print("INFO: Finishing transcription...")
+    try:
+        return transcriber.finalize()
+    except Exception as e:
+        print(f"ERROR: Transcription failed: {e}"); return ""
+
+def speak_text(text, player, on_audio=None, generation=None):
+    """Synthesizes `text` and streams the audio to the player, blocking until synthesis is done.
+
+    Consecutive calls therefore reach the player in order. `on_audio` is called for every
+    audio chunk. Audio is dropped once the player moves past `generation` (speech was
+    interrupted).
+    """
     if not text or shutdown_event.is_set(): return
-    print("INFO: Generating and streaming audio with Azure TTS...")
     try:
-        speech_config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
-        speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Riff48Khz16BitMonoPcm)
-        speech_config.speech_synthesis_voice_name = AZURE_VOICE_NAME
-        
-        # This stream will receive the audio data from Azure in chunks.
-        stream_callback = speechsdk.audio.PushAudioOutputStream()
-        
-        # This function will be called every time a new chunk of audio data is received.
-        def on_audio_chunk(evt):
-            player.play_chunk(evt.audio_data)
-        
-        stream_callback.write_ready_event.connect(on_audio_chunk)
-        
-        # Create a synthesizer that writes to our streaming callback.
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_stream=stream_callback)
-        
-        # Synthesize the SSML. This call is non-blocking.
-        ssml_string = f"<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='en-US'><voice name='{AZURE_VOICE_NAME}'>{text}</voice></speak>"
-        synthesizer.start_speaking_ssml_async(ssml_string)
+        def on_audio_chunk(chunk):
+            if on_audio: on_audio()
+            player.play(chunk, generation)
 
+        tts_component.get().synthesize(text, on_audio_chunk)
     except Exception as e:
-        print(f"ERROR: Azure TTS streaming call failed: {e}")
+        print(f"ERROR: TTS call failed: {e}")
+
+def _traced_chunks(text_chunks, turn):
+    for chunk in text_chunks:
+        turn.mark("llm_first_token")
+        yield chunk
+    turn.mark("llm_last_token")
+
+def speak_response_streaming(text_chunks, player, turn=tracing.NULL_TURN):
+    """Streams the LLM reply into TTS sentence by sentence. Returns the full reply text."""
+    global _active_pipeline
+    generation = player.generation
+
+    def on_audio():
+        pipeline.mark_first_audio()
+        turn.mark("tts_first_byte")
+
+    pipeline = StreamingSpeechPipeline(
+        lambda segment: speak_text(segment, player, on_audio=on_audio, generation=generation)
+    )
+    _active_pipeline = pipeline
+    try:
+        ai_message = pipeline.run(_traced_chunks(text_chunks, turn))
+    finally:
+        _active_pipeline = None
+    t = pipeline.timings
+    if t["first_audio"] is not None:
+        print(f"INFO: Time to first audio: {t['first_audio']:.2f}s (LLM finished at {t['llm_done']:.2f}s)")
+    return ai_message
+
+def build_memory_context(user_message):
+    memory_context = db.get_memory_context(n_summaries=3, n_insights=2)  # Trimmed to the token budget by the prompt builder
+    memory_context["relevant"] = retrieval.search_memories(user_message, k=3, memory_context=memory_context)
+    memory_context["dialogue"] = dialogue.context()
+    return memory_context
+
+async def respond(user_message, player, turn=tracing.NULL_TURN, speculation=None):
+    """Generates and speaks the reply to one user message, then queues the memory update.
+
+    `speculation` is a reply already started from the same words (see speculation.py).
+    """
+    global speaking_turn
+    print("INFO: Companion AI is thinking...")
+    if speculation is not None:
+        memory_context = speculation.context
+        reply_stream = speculation.replay()
+    else:
+        if not memory_component.ready():
+            await asyncio.to_thread(memory_component.get)
+        memory_context = build_memory_context(user_message)
+        reply_stream = llm_interface.generate_response_stream_async(user_message, memory_context)
+    speaking_turn = turn
+    if STREAM_RESPONSES:
+        # The reply streams on the event loop; the TTS pipeline reads it from a worker thread.
+        text_chunks = iterate_in_thread(reply_stream, asyncio.get_running_loop())
+        ai_message = await asyncio.to_thread(speak_response_streaming, text_chunks, player, turn)
+        if speculation is not None:
+            speculation.close()  # Stops generating if the reply was interrupted
+        print(f"INFO: AI Response: {ai_message}")
+    else:
+        generation = player.generation
+        ai_message = await llm_interface.generate_response_async(user_message, memory_context)
+        turn.mark("llm_first_token"); turn.mark("llm_last_token")
+        print(f"INFO: AI Response: {ai_message}")
+        await asyncio.to_thread(speak_text, ai_message, player, lambda: turn.mark("tts_first_byte"), generation)
+
+    await dialogue.add(user_message, ai_message)
+    turn.hold()  # Released when the memory update is done
+    # Persisted before any memory work starts; waits here if updates are far behind.
+    memory_jobs = await memory_jobs_task
+    await memory_jobs.enqueue(user_message, ai_message, memory_context, turn)
+    # The turn's playback ends when the audio has drained (or was interrupted).
+    await asyncio.to_thread(player.drain)
+    turn.mark("playback_end")
+    turn.release()
+
+memory_jobs_task = None  # Resolves to the MemoryJobQueue once the memory component has loaded
+
+async def start_memory_jobs():
+    await asyncio.to_thread(memory_component.get)
+    dialogue.schedule_fold()  # Turns the last run pushed out of the history but didn't fold
+    # Also resumes updates a previous run didn't finish.
+    return MemoryJobQueue(db.get_store()).start()
+
+async def stop_memory_jobs():
+    if memory_jobs_task is None or not memory_jobs_task.done() or memory_jobs_task.exception():
+        return
+    memory_jobs = memory_jobs_task.result()
+    await dialogue.stop(timeout=MEMORY_JOB_DRAIN_SECONDS)
+    left = await memory_jobs.stop(timeout=MEMORY_JOB_DRAIN_SECONDS)
+    metrics = memory_jobs.metrics()
+    job_latency = metrics["latency"].get("job_latency")
+    print(f"INFO: Memory updates: {metrics['completed']} done in {metrics['batches']} batches "
+          f"({metrics['coalesced']} coalesced)" +
+          (f", p95 latency {job_latency['p95']:.1f}s" if job_latency else ""))
+    if left:
+        print(f"INFO: {left} memory update(s) saved; they will finish on the next start.")
 
 async def main_loop():
+    global memory_jobs_task
     print("\n--- Project Companion AI Activated ---")
-    player = AudioPlayer()
-    player_task = asyncio.create_task(player.run())
+    memory_jobs_task = asyncio.create_task(start_memory_jobs())
+    try:
+        await run_conversation()
+    finally:
+        # Ctrl-C cancels the loop; capture stops and pending memory updates get a
+        # moment to finish (whatever doesn't is still in the queue for next time).
+        shutdown_event.set()
+        await stop_memory_jobs()
+
+async def run_conversation():
+    player = open_player()
+    stall_monitor = LoopStallMonitor().start()
+    reply_task = None
+
+    def start_speculation(partial_text):
+        # Not while the previous reply is still going: its turn isn't in the dialogue history yet.
+        if (reply_task is not None and not reply_task.done()) or not memory_component.ready():
+            return None
+        print(f"INFO: Pause detected, speculating on: {partial_text}")
+        memory_context = build_memory_context(partial_text)
+        prompt_tokens = llm_interface.prompt_builder.build(partial_text, memory_context)["total_tokens"]
+        return llm_interface.generate_response_stream_async(partial_text, memory_context), memory_context, prompt_tokens
+
+    speculator = SpeculativeResponder(start_speculation) if speculation_enabled() else None
 
     while not shutdown_event.is_set():
         try:
-            recorded_data = await asyncio.to_thread(record_audio_with_vad, player)
-            if shutdown_event.is_set(): break
-            
-            user_message = await asyncio.to_thread(transcribe_audio, recorded_data)
+            turn = tracer.start_turn()
+            if STREAMING_STT:
+                transcriber = make_incremental_transcriber()
+                on_pause = on_resume = None
+                if speculator is not None:
+                    on_pause = lambda: speculator.pause(transcriber.peek)
+                    on_resume = speculator.resume
+                recorded_data = await asyncio.to_thread(record_audio_with_vad, player, transcriber.feed, turn,
+                                                        on_pause, on_resume)
+                if shutdown_event.is_set(): break
+                user_message = await asyncio.to_thread(finish_incremental_transcription, transcriber)
+            else:
+                recorded_data = await asyncio.to_thread(record_audio_with_vad, player, None, turn)
+                if shutdown_event.is_set(): break
+                user_message = await asyncio.to_thread(transcribe_audio, recorded_data)
+            turn.mark("stt_done")
             if shutdown_event.is_set(): break
             
-            if not user_message: continue
+            speculation = speculator.take(user_message) if speculator is not None else None
+            if not user_message:
+                turn.discard()
+                continue
+            if speculation is not None:
+                print("INFO: Using the speculative reply.")
 
             print(f"INFO: User said: {user_message}")
-            print("INFO: Companion AI is thinking...")
-            memory_context = { "profile": db.get_all_profile_facts(), "summaries": db.get_latest_summary(), "insights": db.get_latest_insights() }
-            ai_message = llm_interface.generate_response(user_message, memory_context)
-            print(f"INFO: AI Response: {ai_message}")
-
-            await asyncio.to_thread(speak_text_azure_stream, ai_message, player)
-            
-            asyncio.create_task(update_memory_async(user_message, ai_message, memory_context))
+            if reply_task is not None and not reply_task.done():
+                # The user spoke before the previous reply finished (barge-in): cut it short.
+                interrupt_speech(player)
+            if reply_task is not None:
+                await reply_task
+            reply_task = asyncio.create_task(respond(user_message, player, turn, speculation))
+            if not BARGE_IN:
+                # Without barge-in the companion finishes its reply before listening again.
+                await reply_task
 
         except Exception as e:
             print(f"FATAL: An error occurred in the main loop: {e}")
             traceback.print_exc(); break
-            
-    player_task.cancel()
-    await asyncio.gather(player_task, return_exceptions=True)
-
-async def update_memory_async(user_msg, ai_msg, context):
-    summary = llm_interface.generate_summary(user_msg, ai_msg)
-    if summary: db.add_summary(summary)
-    facts = llm_interface.extract_profile_facts(user_msg, ai_msg)
-    if facts:
-        for key, value in facts.items(): db.upsert_profile_fact(key, value)
-    insight = llm_interface.generate_insight(user_msg, ai_msg, context)
-    if insight: db.add_insight(insight)
+
+    if reply_task is not None and not reply_task.done():
+        interrupt_speech(player)
+        await asyncio.gather(reply_task, return_exceptions=True)
+    if speculator is not None:
+        speculator.cancel()
+        s = speculator.metrics()
+        if s["started"]:
+            print(f"INFO: Speculative replies: {s['hits']}/{s['started']} used ({s['hit_rate']:.0%}), "
+                  f"{s['wasted_prompt_tokens'] + s['wasted_output_tokens']} tokens wasted")
+    await stall_monitor.stop()
+    stalls = stall_monitor.summary()
+    if stalls["samples"]:
+        print(f"INFO: Event loop stalls: p99 {stalls['p99'] * 1000:.1f} ms, max {stalls['max'] * 1000:.1f} ms")
+    if tracer.enabled and tracer.turns:
+        print("\n--- Turn Latency (this session) ---")
+        print(tracing.format_summary(tracer.summary()))
+    if player.cancel_latencies:
+        print(f"INFO: Speech cancel latency: max {max(player.cancel_latencies) * 1000:.1f} ms "
+              f"over {len(player.cancel_latencies)} interruptions")
+    player.close()
+
+def run_startup_profile():
+    """Starts up, waits for every component, prints per-stage timings and exits."""
+    startup()
+    profile.mark("listening")  # The microphone is open and capture could begin here.
+    for component in COMPONENTS:
+        try:
+            component.get()
+        except Exception as e:
+            print(f"WARNING: {component.name} failed to load: {e}")
+    profile.mark("all components ready")
+    print("\n--- Startup Profile ---")
+    print(profile.report())
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Project Companion AI")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print per-component import/load times and time-to-listening, then exit")
+    parser.add_argument("--trace", action="store_true", default=tracing.TRACING_ENABLED,
+                        help=f"record per-turn latency traces to {TRACE_PATH}")
+    args = parser.parse_args()
+    if args.trace:
+        enable_tracing()
     try:
-        asyncio.run(main_loop())
+        if args.startup_profile:
+            run_startup_profile()
+        else:
+            startup()
+            asyncio.run(main_loop())
     except KeyboardInterrupt:
         print("\nINFO: User requested shutdown. Cleaning up...")
         shutdown_event.set()
     finally:
-        asyncio.run(asyncio.sleep(0.5))
-        pya.terminate()
+        shutdown()
         print("\n--- Project Companion AI Deactivated ---")
\ No newline at end of file